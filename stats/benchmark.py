@@ -0,0 +1,509 @@
+"""Benchmarks for the System Monitoring API.
+
+Drives main.app in-process through a minimal ASGI client.
+
+The default run measures serialization on the live host, reporting the
+CPU time spent per request on the hot endpoints:
+
+    cold        body serialized on every request (snapshot caches cleared)
+    cached      body served from the per-snapshot cache
+    304         conditional GET with a matching If-None-Match
+
+It also compares the legacy encoder (jsonable_encoder + json.dumps, which
+is what FastAPI's response_model path costs) with encode_json() on the
+same payloads.
+
+With --load, main is instead pointed (through HOST_ROOT) at a synthetic
+host written under a temporary directory: a process table of each --pids
+size, many partitions, interfaces, disks and sensors, with counters that
+advance deterministically on every tick. Every endpoint is driven by
+--concurrency concurrent clients, first one endpoint at a time on a fresh
+snapshot and then all of them mixed. The run reports p50/p99 latency,
+requests/s and CPU per request. Results are compared with a stored
+baseline and the run exits non-zero when any of them regressed by more
+than --tolerance. Baselines depend on the machine, so record one with
+--save-baseline on the machine that runs the comparison; without one the
+run fails unless --no-compare asks for the numbers alone.
+
+Usage: python benchmark.py [--requests N]
+       python benchmark.py --load [--pids 100,1000,10000] [--concurrency N]
+                           [--requests N] [--baseline FILE]
+                           [--save-baseline | --no-compare]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+# main reads its configuration at import time, so it is imported by
+# import_app() once the environment for the chosen mode is in place
+main = None
+
+# Endpoints measured, with the query string used for each
+ENDPOINTS = [
+    "/all",
+    "/processes?limit=50",
+    "/statistics/servers?sosok=관리자&site=관리자",
+    "/cpu",
+]
+
+ADMIN = "sosok=관리자&site=관리자"
+
+# (method, url, body, expected status) driven by --load
+LOAD_ENDPOINTS = [
+    ("GET", "/", None, 200),
+    ("GET", "/health", None, 200),
+    ("GET", "/collectors", None, 200),
+    ("GET", "/peers", None, 200),
+    ("GET", "/alerts", None, 200),
+    ("GET", "/metrics", None, 200),
+    ("GET", "/debug/timings", None, 200),
+    ("GET", "/system", None, 200),
+    ("GET", "/cpu", None, 200),
+    ("GET", "/cpu/breakdown", None, 200),
+    ("GET", "/memory", None, 200),
+    ("GET", "/disk", None, 200),
+    ("GET", "/disk/io", None, 200),
+    ("GET", "/network", None, 200),
+    ("GET", "/network/interfaces", None, 200),
+    ("GET", "/processes?limit=50", None, 200),
+    ("GET", "/processes/groups?by=cgroup", None, 200),
+    ("GET", "/all", None, 200),
+    ("GET", "/temperature", None, 200),
+    ("GET", "/history/cpu?range=1h&step=1m", None, 200),
+    ("GET", f"/statistics/?{ADMIN}", None, 200),
+    ("POST", "/statistics/documents", "documents", 200),
+    ("DELETE", "/statistics/documents/benchmark-missing", None, 404),
+    ("GET", f"/statistics/uploads-by-date?{ADMIN}&days=365&bucket=week", None, 200),
+    ("GET", f"/statistics/storage?{ADMIN}", None, 200),
+    ("GET", f"/statistics/servers?{ADMIN}", None, 200),
+]
+
+# Routes --load leaves out, and why
+SKIPPED_ROUTES = {
+    "/stream": "server-sent event stream without an end",
+    "/stream/ws": "WebSocket stream",
+    "/debug/profile": "samples stacks for seconds by design",
+}
+
+# Regressions smaller than these are noise whatever the tolerance
+LATENCY_FLOOR_MS = 0.05
+CPU_FLOOR_US = 20.0
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+def import_app():
+    global main
+    import main
+    return main
+
+async def asgi_request(app, method: str, url: str, headers: dict = None, body: bytes = b""):
+    """Send one request to an ASGI app and return (status, headers, body)"""
+    path, _, query = url.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"benchmark")] + [
+            (name.lower().encode(), value.encode()) for name, value in (headers or {}).items()
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    response = {"status": None, "headers": {}, "body": b""}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], response["body"]
+
+async def asgi_get(app, url: str, headers: dict = None):
+    """Send one GET request to an ASGI app and return (status, headers, body)"""
+    return await asgi_request(app, "GET", url, headers)
+
+def clear_snapshot_caches():
+    snapshot = main.sampler.snapshot
+    snapshot["encoded"].clear()
+    snapshot["bodies"].clear()
+    snapshot.pop("process_groups", None)
+
+async def measure(url: str, requests: int, headers: dict = None, cold: bool = False) -> float:
+    """CPU microseconds per request"""
+    started = time.process_time()
+    for _ in range(requests):
+        if cold:
+            clear_snapshot_caches()
+        status, _, _ = await asgi_get(main.app, url, headers)
+        assert status in (200, 304), f"{url} returned {status}"
+    return (time.process_time() - started) / requests * 1e6
+
+def measure_encoder(encode, value, requests: int) -> float:
+    started = time.process_time()
+    for _ in range(requests):
+        encode(value)
+    return (time.process_time() - started) / requests * 1e6
+
+def legacy_encode(value) -> bytes:
+    return json.dumps(jsonable_encoder(value), ensure_ascii=False, separators=(",", ":")).encode()
+
+async def run(requests: int):
+    # Two samples so CPU and process percentages are populated
+    await main.sampler.refresh()
+    await asyncio.sleep(0.5)
+    snapshot = await main.sampler.refresh()
+
+    print(f"{'endpoint':48} {'cold':>10} {'cached':>10} {'304':>10}   (CPU us/request)")
+    for url in ENDPOINTS:
+        cold = await measure(url, requests, cold=True)
+        cached = await measure(url, requests)
+        _, headers, _ = await asgi_get(main.app, url)
+        revalidate = await measure(url, requests, {"If-None-Match": headers.get("etag", "")})
+        print(f"{url:48} {cold:10.1f} {cached:10.1f} {revalidate:10.1f}")
+
+    payloads = {
+        "/all payload": {key: snapshot[key] for key in main.ALL_STATS_KEYS},
+        "/processes payload (50 rows)": main.select_processes(snapshot["processes"], limit=50),
+        "web_server model": snapshot["web_server"],
+    }
+    print()
+    print(f"{'payload':48} {'legacy':>10} {'fast':>10} {'saved':>10}   (CPU us/encode)")
+    for name, value in payloads.items():
+        legacy = measure_encoder(legacy_encode, value, requests)
+        fast = measure_encoder(main.encode_json, value, requests)
+        print(f"{name:48} {legacy:10.1f} {fast:10.1f} {legacy - fast:10.1f}")
+
+# Synthetic process names, users' services and sensor chips
+PROCESS_NAMES = [
+    "nginx", "php-fpm8.2", "python3", "postgres", "node", "redis-server", "sshd", "systemd-journal",
+    "containerd", "dockerd", "uvicorn", "mariadbd", "cron", "rsyslogd", "chromium", "java",
+]
+SERVICES = ["nginx", "php8.2-fpm", "postgresql", "docker", "ai-server", "vector-store", "user@1000", "ssh"]
+SENSOR_CHIPS = ["cpu_thermal", "coretemp", "nvme", "acpitz"]
+SOSOKS = ["관리자", "본부", "연구소", "지사1", "지사2"]
+SITES = ["관리자", "서울", "부산", "대전"]
+FILE_TYPES = ["pdf", "docx", "hwp", "xlsx", "pptx", "txt"]
+TAGS = ["계약", "보고서", "회의록", "매뉴얼", "정책", "예산", "인사", "기술", "법무", "홍보"]
+
+# Synthetic PIDs start here, clear of the benchmark's own PID
+FAKE_PID_BASE = 1000000
+
+class FakeHost:
+    """A deterministic host written as procfs, sysfs and etc files under root.
+
+    main reads it through HOST_ROOT with the procfs backend. Every advance()
+    moves the CPU, process, disk, network and sensor counters forward by a
+    fixed amount, so two runs see the same values in the same order. The
+    benchmark's own /proc entry is linked in, since main samples its own
+    process for /metrics.
+    """
+
+    def __init__(self, root: str, partitions: int = 48, interfaces: int = 64, disks: int = 16, cpus: int = 8):
+        self.root = root
+        self.proc = os.path.join(root, "proc")
+        self.sys = os.path.join(root, "sys")
+        self.partitions = partitions
+        self.interfaces = interfaces
+        self.disks = disks
+        self.cpus = cpus
+        self.pids = [1]
+        self.tick = 0
+
+    def write(self, path: str, text: str):
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+
+    def build(self):
+        self.write("etc/os-release", 'PRETTY_NAME="Benchmark Linux 1.0"\nNAME="Benchmark Linux"\n')
+        self.write("etc/passwd", f"root:x:0:0:root:/root:/bin/sh\nbench:x:{os.getuid()}:{os.getgid()}::/:/bin/sh\n")
+        self.write("proc/cpuinfo", "".join(f"processor\t: {cpu}\ncpu MHz\t\t: 1800.000\n\n" for cpu in range(self.cpus)))
+        self.write("proc/filesystems", "nodev\tproc\nnodev\ttmpfs\nnodev\toverlay\n\text4\n\txfs\n")
+
+        mounts = ["overlay / overlay rw 0 0", "proc /proc proc rw 0 0", "tmpfs /run tmpfs rw 0 0"]
+        for index in range(self.partitions):
+            mountpoint = os.path.join(self.root, "mnt", f"disk{index}")
+            os.makedirs(mountpoint, exist_ok=True)
+            disk = self.disk_name(index % self.disks)
+            mounts.append(f"/dev/{disk}{index // self.disks + 1} {mountpoint} {'xfs' if index % 3 else 'ext4'} rw 0 0")
+        # Docker-style bind mounts of an already listed device
+        for index in range(4):
+            mounts.append(f"/dev/{self.disk_name(0)}1 {self.root}/mnt/disk0/bind{index} ext4 rw 0 0")
+        self.write("proc/self/mounts", "\n".join(mounts) + "\n")
+
+        for index in range(self.disks):
+            os.makedirs(os.path.join(self.sys, "block", self.disk_name(index)), exist_ok=True)
+        for chip_index, chip in enumerate(SENSOR_CHIPS):
+            self.write(f"sys/class/hwmon/hwmon{chip_index}/name", chip + "\n")
+            for sensor in range(1, 5):
+                self.write(f"sys/class/hwmon/hwmon{chip_index}/temp{sensor}_label", f"{chip} {sensor}\n")
+                self.write(f"sys/class/hwmon/hwmon{chip_index}/temp{sensor}_crit", "95000\n")
+
+        os.makedirs(self.proc, exist_ok=True)
+        self.set_pids(100)
+
+    @staticmethod
+    def disk_name(index: int) -> str:
+        return "sd" + chr(ord("a") + index % 26) + ("" if index < 26 else str(index // 26))
+
+    def set_pids(self, count: int):
+        """Resize the process table to count synthetic processes"""
+        wanted = [1] + [FAKE_PID_BASE + index for index in range(count - 1)]
+        for pid in set(self.pids) - set(wanted):
+            shutil.rmtree(os.path.join(self.proc, str(pid)))
+        for pid in wanted:
+            index = pid - FAKE_PID_BASE if pid != 1 else 0
+            name = "systemd" if pid == 1 else PROCESS_NAMES[index % len(PROCESS_NAMES)]
+            self.write(f"proc/{pid}/cmdline", f"/usr/bin/{name}\0--worker\0{index % 7}\0")
+            self.write(f"proc/{pid}/cgroup", f"0::/system.slice/{SERVICES[index % len(SERVICES)]}.service\n")
+        self.pids = wanted
+        self.write_pid_stats()
+
+    def write_pid_stats(self):
+        tick = self.tick
+        for pid in self.pids:
+            index = pid - FAKE_PID_BASE if pid != 1 else 0
+            name = "systemd" if pid == 1 else PROCESS_NAMES[index % len(PROCESS_NAMES)]
+            utime = tick * (index % 5)
+            stime = tick * (index % 3)
+            rss_pages = 2000 + (index * 37) % 50000
+            fields = ["S", "1", str(pid), str(pid), "0", "-1", "4194560", "0", "0", "0", "0",
+                      str(utime), str(stime), "0", "0", "20", "0", str(1 + index % 16), "0",
+                      str(1000 + index), str(rss_pages * 4096 * 4), str(rss_pages)] + ["0"] * 30
+            self.write(f"proc/{pid}/stat", f"{pid} ({name}) {' '.join(fields)}\n")
+
+    def advance(self):
+        """Move every counter one tick forward"""
+        self.tick += 1
+        tick = self.tick
+
+        busy = [tick * (20 + 10 * cpu) for cpu in range(self.cpus)]
+        lines = [f"cpu{cpu} {b} 0 {b // 2} {tick * 200 - b} {tick} 0 {tick // 4} 0 0 0" for cpu, b in enumerate(busy)]
+        user = sum(busy)
+        lines.insert(0, f"cpu  {user} 0 {user // 2} {tick * 200 * self.cpus - user} {tick * self.cpus} 0 {tick * self.cpus // 4} 0 0 0")
+        lines.append("btime 1700000000")
+        self.write("proc/stat", "\n".join(lines) + "\n")
+
+        total = 16 * 1024 * 1024
+        free = total // 4 + (tick % 10) * 1024
+        self.write("proc/meminfo", (
+            f"MemTotal: {total} kB\nMemFree: {free} kB\nMemAvailable: {free * 2} kB\n"
+            f"Buffers: 102400 kB\nCached: 2097152 kB\nSReclaimable: 65536 kB\n"
+        ))
+
+        lines = ["Inter-|   Receive", " face |bytes    packets errs drop fifo frame compressed multicast|bytes"]
+        names = ["lo", "docker0"] + [f"veth{index:04x}" for index in range(8)] + [f"eth{index}" for index in range(self.interfaces)]
+        for index, name in enumerate(names):
+            recv, sent = tick * 125000 * (index + 1), tick * 62500 * (index + 1)
+            lines.append(f"{name:>8}: {recv} {recv // 1000} {tick // 50} {tick // 20} 0 0 0 0 "
+                         f"{sent} {sent // 1000} 0 {tick // 100} 0 0 0 0")
+        self.write("proc/1/net/dev", "\n".join(lines) + "\n")
+
+        lines = []
+        for index in range(self.disks):
+            disk = self.disk_name(index)
+            reads, writes = tick * (50 + index), tick * (80 + index)
+            counters = [reads, 0, reads * 16, reads, writes, 0, writes * 32, writes * 2, 0, tick * 150, tick * 300]
+            lines.append(f"   8 {index * 16} {disk} {' '.join(map(str, counters))} 0 0 0 0")
+            lines.append(f"   8 {index * 16 + 1} {disk}1 {' '.join(map(str, counters))} 0 0 0 0")
+        self.write("proc/diskstats", "\n".join(lines) + "\n")
+
+        for chip_index in range(len(SENSOR_CHIPS)):
+            for sensor in range(1, 5):
+                degrees = 40000 + chip_index * 5000 + sensor * 1000 + (tick % 20) * 250
+                self.write(f"sys/class/hwmon/hwmon{chip_index}/temp{sensor}_input", f"{degrees}\n")
+
+        self.write_pid_stats()
+
+    def install(self):
+        """Point main's configuration at this host"""
+        os.environ.update({
+            "HOST_ROOT": self.root,
+            "COLLECTOR_BACKEND": "procfs",
+            "METRICS_STORE_DIR": "",
+            "DOCUMENT_CATALOG": ":memory:",
+            "FEDERATION_PEERS": "",
+            "STORAGE_SCAN_DIRS": "",
+        })
+
+def synthetic_documents(count: int, seed: int = 22) -> list:
+    """Deterministic document records spread over the last two years"""
+    rng = random.Random(seed)
+    today = time.time()
+    documents = []
+    for index in range(count):
+        uploaded = time.localtime(today - rng.randrange(730 * 86400))
+        documents.append({
+            "file_id": f"benchmark-{index}",
+            "filename": f"문서-{index}.{FILE_TYPES[index % len(FILE_TYPES)]}",
+            "file_type": FILE_TYPES[index % len(FILE_TYPES)],
+            "sosok": rng.choice(SOSOKS[1:]),
+            "site": rng.choice(SITES[1:]),
+            "tags": ",".join(rng.sample(TAGS, rng.randint(0, 3))),
+            "sections": rng.randint(1, 40),
+            "file_size": rng.randint(10_000, 50_000_000),
+            "upload_date": time.strftime("%Y-%m-%dT%H:%M:%S", uploaded),
+        })
+    return documents
+
+def check_route_coverage():
+    """Fail when main gained a route that --load neither drives nor skips"""
+    driven = {(method, url.partition("?")[0]) for method, url, _, _ in LOAD_ENDPOINTS}
+    missing = []
+    for route in main.app.routes:
+        if getattr(route, "endpoint", None) is None or route.endpoint.__module__ != main.__name__:
+            continue
+        if route.path in SKIPPED_ROUTES:
+            continue
+        for method in getattr(route, "methods", None) or ["GET"]:
+            if method == "HEAD":
+                continue
+            if not any(method == m and route.path_regex.match(path) for m, path in driven):
+                missing.append(f"{method} {route.path}")
+    if missing:
+        sys.exit(f"Routes not covered by LOAD_ENDPOINTS or SKIPPED_ROUTES: {', '.join(missing)}")
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def drive(requests: list, concurrency: int) -> dict:
+    """Send (method, url, body, status) requests from concurrency clients at once"""
+    latencies = []
+    queue = iter(requests)
+
+    async def client():
+        for method, url, body, expected in queue:
+            started = time.perf_counter()
+            status, _, _ = await asgi_request(main.app, method, url, {"Content-Type": "application/json"}, body or b"")
+            latencies.append(time.perf_counter() - started)
+            assert status == expected, f"{method} {url} returned {status}"
+
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    wall, cpu = time.perf_counter() - wall_started, time.process_time() - cpu_started
+    return {
+        "p50_ms": round(percentile(latencies, 0.50) * 1e3, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1e3, 3),
+        "rps": round(len(latencies) / wall, 1),
+        "cpu_us": round(cpu / len(latencies) * 1e6, 1),
+    }
+
+async def run_load(host: FakeHost, sizes: list, concurrency: int, requests: int) -> dict:
+    check_route_coverage()
+    main.document_statistics.record([main.DocumentRecord(**d) for d in synthetic_documents(10000)])
+    bodies = {"documents": json.dumps(synthetic_documents(20, seed=23), ensure_ascii=False).encode()}
+    endpoints = [(method, url, bodies.get(body), status) for method, url, body, status in LOAD_ENDPOINTS]
+
+    results = {}
+    print(f"{'pids':>6} {'endpoint':58} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'CPU us/req':>11}")
+    for size in sizes:
+        host.set_pids(size)
+        # Two ticks so every rate and percentage has a previous sample
+        for _ in range(2):
+            host.advance()
+            await main.sampler.refresh()
+
+        for endpoint in endpoints + [None]:
+            # A fresh snapshot, so each burst starts with the cold serialization
+            host.advance()
+            await main.sampler.refresh()
+            if endpoint is None:
+                name, batch = "mixed", endpoints * max(1, requests // len(endpoints))
+            else:
+                name, batch = f"{endpoint[0]} {endpoint[1]}", [endpoint] * requests
+            result = results[f"{size}:{name}"] = await drive(batch, concurrency)
+            print(f"{size:>6} {name:58} {result['p50_ms']:9.3f} {result['p99_ms']:9.3f} "
+                  f"{result['rps']:9.1f} {result['cpu_us']:11.1f}")
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Descriptions of every result that regressed past the tolerance"""
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        limits = {
+            "p50_ms": before["p50_ms"] * (1 + tolerance) + LATENCY_FLOOR_MS,
+            "p99_ms": before["p99_ms"] * (1 + tolerance) + LATENCY_FLOOR_MS,
+            "cpu_us": before["cpu_us"] * (1 + tolerance) + CPU_FLOOR_US,
+        }
+        for field, limit in limits.items():
+            if result[field] > limit:
+                regressions.append(f"{key} {field}: {result[field]} > {before[field]} (limit {limit:.3f})")
+        if result["rps"] < before["rps"] / (1 + tolerance):
+            regressions.append(f"{key} rps: {result['rps']} < {before['rps']}")
+    return regressions
+
+def main_load(args):
+    root = tempfile.mkdtemp(prefix="sysmon-benchmark-")
+    try:
+        host = FakeHost(root)
+        host.build()
+        host.advance()
+        host.install()
+        import_app()
+        sizes = [int(size) for size in args.pids.split(",")]
+        results = asyncio.run(run_load(host, sizes, args.concurrency, args.requests))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return
+    if args.no_compare:
+        return
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; record one with --save-baseline or pass --no-compare")
+        sys.exit(2)
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) past {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"\nNo regressions past {args.tolerance:.0%} of {args.baseline}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-request cost and latency of the API endpoints")
+    parser.add_argument("--requests", type=int, default=None, help="requests per measurement (default 500, 200 with --load)")
+    parser.add_argument("--load", action="store_true", help="drive every endpoint against a synthetic host")
+    parser.add_argument("--pids", default="100,1000,10000", help="process table sizes for --load")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients for --load")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="stored results to compare --load against")
+    baseline = parser.add_mutually_exclusive_group()
+    baseline.add_argument("--save-baseline", action="store_true", help="store the --load results as the baseline")
+    baseline.add_argument("--no-compare", action="store_true", help="report the --load results without a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed regression, as a fraction")
+    args = parser.parse_args()
+    if args.load:
+        args.requests = args.requests or 200
+        main_load(args)
+    else:
+        import_app()
+        asyncio.run(run(args.requests or 500))
@@ -1,23 +1,201 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit
+from array import array
+from collections import deque
+import asyncio
+import bisect
+import calendar
+import errno
+import fcntl
+import gzip
+import heapq
+import ipaddress
+import json
+import math
+import mmap
+import struct
+import sys
+import time
+import zlib
 import psutil
 import platform
+import re
+import secrets
 import socket
+import sqlite3
 import os
+import tempfile
+import threading
 import logging
-from pydantic import BaseModel
+from multiprocessing import resource_tracker, shared_memory
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    # Rust JSON serializer shipped with pydantic v2; handles models natively
+    from pydantic_core import to_json
+except ImportError:
+    to_json = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sampler configuration
+SAMPLE_INTERVAL = float(os.environ.get("SAMPLE_INTERVAL", "1"))
+# A snapshot older than this many seconds is reported as stale
+STALE_AFTER = float(os.environ.get("STALE_AFTER", str(SAMPLE_INTERVAL * 3)))
+# Seconds of metric history kept in memory
+HISTORY_RETENTION = float(os.environ.get("HISTORY_RETENTION", "86400"))
+# Upper bound on points returned by a single /history query
+HISTORY_MAX_POINTS = 5000
+# Directory for the persistent metrics store (disabled when empty)
+METRICS_STORE_DIR = os.environ.get("METRICS_STORE_DIR", "")
+# Seconds each store tier is kept on disk
+STORE_RAW_RETENTION = float(os.environ.get("STORE_RAW_RETENTION", str(2 * 86400)))
+STORE_MINUTE_RETENTION = float(os.environ.get("STORE_MINUTE_RETENTION", str(30 * 86400)))
+STORE_HOUR_RETENTION = float(os.environ.get("STORE_HOUR_RETENTION", str(730 * 86400)))
+# Seconds without a new snapshot before a stream sends a keepalive
+STREAM_KEEPALIVE = 15.0
+# Response bodies smaller than this are never compressed
+COMPRESS_MIN_SIZE = 512
+# Where the host's filesystem is mounted ("/host" in docker-compose); empty
+# reads the /proc and /etc seen by this process
+HOST_ROOT = os.environ.get("HOST_ROOT", "")
+HOST_PROC = os.path.join(HOST_ROOT or "/", "proc")
+HOST_ETC = os.path.join(HOST_ROOT or "/", "etc")
+HOST_SYS = os.path.join(HOST_ROOT or "/", "sys")
+# "procfs" reads HOST_PROC directly, "psutil" uses psutil only, "auto"
+# picks procfs whenever HOST_PROC is readable
+COLLECTOR_BACKEND = os.environ.get("COLLECTOR_BACKEND", "auto")
+
+# Peer agents polled for /statistics/servers, as a JSON list of
+# {"name", "role", "url", "timeout", "gpu_url", "collection"} objects
+FEDERATION_PEERS = os.environ.get("FEDERATION_PEERS", "")
+# Seconds between peer polls
+FEDERATION_INTERVAL = float(os.environ.get("FEDERATION_INTERVAL", "5"))
+# SQLite file holding the document catalog behind /statistics/; without
+# METRICS_STORE_DIR it lives in memory, private to each worker process
+DOCUMENT_CATALOG = os.environ.get(
+    "DOCUMENT_CATALOG", os.path.join(METRICS_STORE_DIR, "documents.sqlite3") if METRICS_STORE_DIR else ":memory:"
+)
+# Document directories scanned for /statistics/storage, separated by ":"
+STORAGE_SCAN_DIRS = [path for path in os.environ.get("STORAGE_SCAN_DIRS", "").split(os.pathsep) if path]
+# Seconds between incremental scans, and between full rescans
+STORAGE_SCAN_INTERVAL = float(os.environ.get("STORAGE_SCAN_INTERVAL", "300"))
+STORAGE_FULL_SCAN_INTERVAL = float(os.environ.get("STORAGE_FULL_SCAN_INTERVAL", "86400"))
+# Threads listing directories in parallel
+STORAGE_SCAN_WORKERS = int(os.environ.get("STORAGE_SCAN_WORKERS", "4"))
+# Seconds to wait for each filesystem's usage before reporting it as timed out
+DISK_USAGE_TIMEOUT = float(os.environ.get("DISK_USAGE_TIMEOUT", "1"))
+# Threads querying filesystem usage in parallel
+DISK_USAGE_WORKERS = int(os.environ.get("DISK_USAGE_WORKERS", "4"))
+# Longest quarantine, in seconds, of a filesystem that keeps timing out
+DISK_QUARANTINE_MAX = float(os.environ.get("DISK_QUARANTINE_MAX", "600"))
+# Time constant, in seconds, of the smoothing applied to network rates (0 disables it)
+NETWORK_SMOOTHING = float(os.environ.get("NETWORK_SMOOTHING", "10"))
+# Seconds of readings behind each temperature sensor's min, max and trend
+TEMPERATURE_WINDOW = float(os.environ.get("TEMPERATURE_WINDOW", "600"))
+# Seconds between the event-loop lag probe's wake-ups
+LOOP_LAG_INTERVAL = float(os.environ.get("LOOP_LAG_INTERVAL", "0.5"))
+# Alert rules, as a JSON list of rule strings or {"name", "rule", "severity"}
+# objects; unset uses DEFAULT_ALERT_RULES and "[]" disables alerting
+ALERT_RULES = os.environ.get("ALERT_RULES", "")
+# Webhook URLs notified when an alert fires or resolves, separated by spaces
+ALERT_WEBHOOKS = os.environ.get("ALERT_WEBHOOKS", "").split()
+# Per-attempt timeout and attempts per webhook notification
+ALERT_WEBHOOK_TIMEOUT = float(os.environ.get("ALERT_WEBHOOK_TIMEOUT", "5"))
+ALERT_WEBHOOK_ATTEMPTS = int(os.environ.get("ALERT_WEBHOOK_ATTEMPTS", "4"))
+# Secret required by /debug/profile in an X-Profile-Token header; unset
+# disables the endpoint
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+# Shared-memory segment through which one collector process feeds every
+# worker of `uvicorn --workers N`; unset samples in each process on its own
+SHARED_SNAPSHOT = os.environ.get("SHARED_SNAPSHOT", "")
+# Size in bytes of that segment
+SHARED_SNAPSHOT_SIZE = int(os.environ.get("SHARED_SNAPSHOT_SIZE", str(16 * 1024 * 1024)))
+
+if HOST_ROOT and hasattr(psutil, "PROCFS_PATH"):
+    # Collectors still going through psutil report host values as well
+    psutil.PROCFS_PATH = HOST_PROC
+
+def encode_json(value) -> bytes:
+    """Compact UTF-8 JSON for models, lists and dicts.
+    
+    Uses pydantic-core's serializer when available, which skips the
+    jsonable_encoder round trip; NaN and infinity become null.
+    """
+    if to_json is not None:
+        return to_json(value, inf_nan_mode="null")
+    return json.dumps(jsonable_encoder(value), ensure_ascii=False, separators=(",", ":")).encode()
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with encode_json()"""
+    
+    def render(self, content) -> bytes:
+        return encode_json(content)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the background sampler for the lifetime of the app"""
+    loop_monitor.start()
+    if shared_snapshot is not None:
+        # Collects only in the worker that wins the election
+        await shared_snapshot.start()
+    else:
+        start_collection()
+    yield
+    if shared_snapshot is not None:
+        await shared_snapshot.stop()
+    else:
+        await stop_collection()
+    await loop_monitor.stop()
+    if metrics_store is not None:
+        metrics_store.close()
+    document_statistics.close()
+    partition_collector.close()
+
+def start_collection():
+    """Start the sampler and the services only the collecting process runs"""
+    sampler.start()
+    federation.start()
+    storage_scanner.start()
+    alert_notifier.start()
+
+async def stop_collection():
+    await alert_notifier.stop()
+    await storage_scanner.stop()
+    await federation.stop()
+    await sampler.stop()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="System Monitoring API",
     description="Real-time system monitoring and statistics API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # Configure CORS
@@ -39,6 +217,26 @@ class CPUInfo(BaseModel):
     freq_min: Optional[float]
     freq_max: Optional[float]
 
+class CPUTimesPercent(BaseModel):
+    user: float
+    nice: float
+    system: float
+    idle: float
+    iowait: float
+    irq: float
+    softirq: float
+    steal: float
+    guest: float
+    guest_nice: float
+
+class CPUCoreBreakdown(CPUTimesPercent):
+    core: int
+
+class CPUBreakdownInfo(BaseModel):
+    interval: float
+    total: CPUTimesPercent
+    per_cpu: List[CPUCoreBreakdown]
+
 class MemoryInfo(BaseModel):
     total: int
     available: int
@@ -61,6 +259,19 @@ class DiskInfo(BaseModel):
     total_gb: float
     used_gb: float
     free_gb: float
+    timed_out: bool = False
+
+class DiskIOInfo(BaseModel):
+    device: str
+    interval: float
+    read_bytes_per_sec: float
+    write_bytes_per_sec: float
+    read_iops: float
+    write_iops: float
+    await_ms: float
+    util_percent: float
+    read_bytes: int
+    write_bytes: int
 
 class NetworkInfo(BaseModel):
     bytes_sent: int
@@ -76,6 +287,21 @@ class NetworkInfo(BaseModel):
     bytes_sent_gb: float
     bytes_recv_gb: float
 
+class NetworkInterfaceInfo(BaseModel):
+    interface: str
+    interval: float
+    bytes_sent_per_sec: float
+    bytes_recv_per_sec: float
+    packets_sent_per_sec: float
+    packets_recv_per_sec: float
+    errin_per_sec: float
+    errout_per_sec: float
+    dropin_per_sec: float
+    dropout_per_sec: float
+    bytes_sent: int
+    bytes_recv: int
+    resets: int
+
 class ProcessInfo(BaseModel):
     pid: int
     name: str
@@ -85,6 +311,13 @@ class ProcessInfo(BaseModel):
     status: str
     create_time: str
 
+class ProcessGroupInfo(BaseModel):
+    group: str
+    process_count: int
+    cpu_percent: float
+    memory_mb: float
+    num_threads: int
+
 class SystemInfo(BaseModel):
     hostname: str
     ip_address: str
@@ -136,6 +369,7 @@ class WebServerInfo(BaseModel):
     disk: ServerDiskInfo
     network: ServerNetworkInfo
     top_processes: List[ServerProcessInfo]
+    top_process_groups: List[ServerProcessInfo] = []
 
 class AIServerInfo(BaseModel):
     name: str = "AI Server"
@@ -151,6 +385,8 @@ class AIServerInfo(BaseModel):
     network: ServerNetworkInfo
     gpu: Optional[Dict] = None
     top_processes: List[ServerProcessInfo]
+    last_seen: Optional[str] = None
+    stale: bool = False
 
 class VectorStoreInfo(BaseModel):
     name: str = "Vector Store"
@@ -159,6 +395,8 @@ class VectorStoreInfo(BaseModel):
     unique_documents: int = 0
     total_vectors: int = 0
     collection: str = "documents"
+    last_seen: Optional[str] = None
+    stale: bool = False
 
 class ServerStatisticsResponse(BaseModel):
     access_level: Optional[str] = None
@@ -167,58 +405,105 @@ class ServerStatisticsResponse(BaseModel):
     web_server: Optional[WebServerInfo] = None
     vector_store: Optional[VectorStoreInfo] = None
 
-# Mock statistics data (replace with actual data source)
-MOCK_STATISTICS = {
-    "total_documents": 15234,
-    "total_sections": 45678,
-    "average_sections_per_document": 3.0,
-    "documents_by_type": {
-        "pdf": 8234,
-        "hwp": 4567,
-        "docx": 1234,
-        "txt": 890,
-        "pptx": 309
-    },
-    "documents_by_sosok": {
-        "관리자": 5000,
-        "개발팀": 3500,
-        "기획팀": 2500,
-        "디자인팀": 2234,
-        "운영팀": 2000
-    },
-    "documents_by_site": {
-        "본사": 6000,
-        "지사1": 3500,
-        "지사2": 2734,
-        "연구소": 1500,
-        "관리자": 1500
-    },
-    "popular_tags": [
-        {"name": "보고서", "count": 3456},
-        {"name": "회의록", "count": 2345},
-        {"name": "기획안", "count": 1234},
-        {"name": "매뉴얼", "count": 890},
-        {"name": "가이드", "count": 567}
-    ],
-    "recent_uploads": []
-}
+class DocumentRecord(BaseModel):
+    file_id: str
+    filename: str
+    file_type: Optional[str] = None
+    sosok: str = ""
+    site: str = ""
+    tags: str = ""
+    sections: int = 0
+    file_size: int = 0
+    upload_date: Optional[str] = None
 
 # Utility functions
+# The host's network tables; with HOST_ROOT set, /proc/net is the
+# container's namespace while init's is the host's
+HOST_NET = os.path.join(HOST_PROC, "1", "net") if HOST_ROOT else "/proc/net"
+
+def read_routes() -> List[tuple]:
+    """(interface, destination, mask) of every IPv4 route that is up"""
+    routes = []
+    try:
+        with open(os.path.join(HOST_NET, "route"), "r") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                # RTF_UP flag set; addresses are little-endian hex
+                if len(fields) > 7 and int(fields[3], 16) & 1:
+                    routes.append((
+                        fields[0],
+                        ipaddress.IPv4Address(int(fields[1], 16).to_bytes(4, "little")),
+                        ipaddress.IPv4Address(int(fields[7], 16).to_bytes(4, "little"))
+                    ))
+    except (OSError, StopIteration, ValueError):
+        pass
+    return routes
+
+def get_default_interface() -> Optional[str]:
+    """Interface of the IPv4 default route"""
+    return next((interface for interface, destination, mask in read_routes() if int(destination) == 0), None)
+
+def host_local_addresses() -> List[ipaddress.IPv4Address]:
+    """The host's own IPv4 addresses, from the LOCAL entries of its FIB"""
+    addresses = []
+    try:
+        with open(os.path.join(HOST_NET, "fib_trie"), "r") as f:
+            previous = ""
+            for line in f:
+                # "|-- 192.168.1.5" followed by "/32 host LOCAL"
+                if "/32 host LOCAL" in line and previous.lstrip().startswith("|--"):
+                    address = ipaddress.IPv4Address(previous.split()[-1])
+                    if address not in addresses:
+                        addresses.append(address)
+                previous = line
+    except (OSError, ValueError):
+        pass
+    return addresses
+
+def get_host_ip_address() -> Optional[str]:
+    """Host address on the default route's subnet, read through HOST_ROOT"""
+    routes = read_routes()
+    interface = next((interface for interface, destination, mask in routes if int(destination) == 0), None)
+    subnets = [
+        ipaddress.IPv4Network(f"{destination}/{mask}", strict=False)
+        for route_interface, destination, mask in routes
+        if route_interface == interface and int(destination) != 0
+    ]
+    for address in host_local_addresses():
+        if not address.is_loopback and any(address in subnet for subnet in subnets):
+            return str(address)
+    return None
+
 def get_ip_address():
-    """Get the primary IP address of the system"""
+    """Get the primary IP address of the system.
+    
+    Uses the address of the default-route interface, so no outside host
+    has to be reachable. With HOST_ROOT set the host's tables are used,
+    since this process's interfaces are the container's.
+    """
+    if HOST_ROOT:
+        address = get_host_ip_address()
+        if address is not None:
+            return address
+    
     try:
-        # Create a socket connection to determine the primary IP
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip_address = s.getsockname()[0]
-        s.close()
-        return ip_address
+        addresses = psutil.net_if_addrs()
+        candidates = [get_default_interface()] + sorted(addresses)
+        for interface in candidates:
+            if interface is None or interface == "lo":
+                continue
+            for address in addresses.get(interface, []):
+                if address.family == socket.AF_INET and not address.address.startswith("127."):
+                    return address.address
     except Exception:
-        try:
-            # Fallback to hostname resolution
-            return socket.gethostbyname(socket.gethostname())
-        except:
-            return "127.0.0.1"
+        pass
+    
+    try:
+        # Fallback to hostname resolution
+        return socket.gethostbyname(socket.gethostname())
+    except:
+        return "127.0.0.1"
 
 def format_bytes(bytes_value: int, unit: str = "GB") -> float:
     """Convert bytes to specified unit"""
@@ -230,9 +515,12 @@ def format_bytes(bytes_value: int, unit: str = "GB") -> float:
     }
     return round(bytes_value / units.get(unit, 1024 ** 3), 2)
 
-def get_uptime_string() -> str:
+def get_uptime_string(boot_timestamp: Optional[float] = None) -> str:
     """Get system uptime as a formatted string with days, hours, minutes, and seconds in Korean"""
-    boot_time = datetime.fromtimestamp(psutil.boot_time())
+    if boot_timestamp is None:
+        facts = host_facts.facts or host_facts.current()
+        boot_timestamp = facts["boot_time"]
+    boot_time = datetime.fromtimestamp(boot_timestamp)
     uptime = datetime.now() - boot_time
     
     days = uptime.days
@@ -324,8 +612,8 @@ def get_os_info() -> str:
         
         if system == "Linux":
             try:
-                # Try to read from /etc/os-release
-                with open("/etc/os-release", "r") as f:
+                # Try to read from the host's /etc/os-release
+                with open(os.path.join(HOST_ETC, "os-release"), "r") as f:
                     lines = f.readlines()
                     for line in lines:
                         if line.startswith("PRETTY_NAME="):
@@ -334,7 +622,7 @@ def get_os_info() -> str:
                 pass
             
             # Check if it's DietPi
-            if os.path.exists("/boot/dietpi"):
+            if os.path.exists(os.path.join(HOST_ROOT or "/", "boot", "dietpi")):
                 return "DietPi"
                 
         # Fallback to generic info
@@ -342,25 +630,18 @@ def get_os_info() -> str:
     except:
         return "Unknown OS"
 
-def get_top_processes(limit: int = 5) -> List[ServerProcessInfo]:
-    """Get top processes by CPU usage"""
-    processes = []
-    
-    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_info']):
-        try:
-            pinfo = proc.info
-            if pinfo['cpu_percent'] > 0:
-                processes.append(ServerProcessInfo(
-                    name=pinfo['name'],
-                    cpu_percent=round(pinfo['cpu_percent'], 2),
-                    memory_mb=round(pinfo['memory_info'].rss / (1024 ** 2), 2)
-                ))
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
+def get_top_processes(processes: List[Dict], limit: int = 5) -> List[ServerProcessInfo]:
+    """Get top processes by CPU usage from a sampled process list"""
+    busy = (p for p in processes if p['cpu_percent'] > 0)
     
-    # Sort by CPU usage and return top N
-    processes.sort(key=lambda x: x.cpu_percent, reverse=True)
-    return processes[:limit]
+    return [
+        ServerProcessInfo(
+            name=p['name'],
+            cpu_percent=round(p['cpu_percent'], 2),
+            memory_mb=round(p['rss'] / (1024 ** 2), 2)
+        )
+        for p in heapq.nlargest(limit, busy, key=lambda p: p['cpu_percent'])
+    ]
 
 def get_main_disk_usage():
     """Get usage of main disk partition"""
@@ -375,300 +656,3615 @@ def get_main_disk_usage():
     except:
         return ServerDiskInfo(percent=0.0, total_gb=0.0, used_gb=0.0)
 
-# API Endpoints
-@app.get("/", tags=["General"])
-async def root():
-    """Root endpoint with API information"""
-    return {
-        "message": "System Monitoring API",
-        "version": "1.0.0",
-        "endpoints": {
-            "system": "/system",
-            "cpu": "/cpu",
-            "memory": "/memory",
-            "disk": "/disk",
-            "network": "/network",
-            "processes": "/processes",
-            "all": "/all",
-            "health": "/health",
-            "statistics": {
-                "main": "/statistics/",
-                "servers": "/statistics/servers",
-                "uploads_by_date": "/statistics/uploads-by-date",
-                "storage": "/statistics/storage"
-            }
+# Seconds between checks of the slower-changing host facts (addresses, boot time)
+HOST_FACTS_POLL = 60.0
+
+class HostFacts:
+    """Host facts computed once and refreshed only when the host changes.
+    
+    Every call compares two cheap signals, the hostname and the contents of
+    the host's route table. The interface address list and the boot time are
+    compared every HOST_FACTS_POLL seconds. Facts are recomputed only when
+    one of these changed.
+    """
+    
+    def __init__(self):
+        self.facts: Optional[Dict] = None
+        self._signature = None
+        self._slow_signature = None
+        self._polled_at = 0.0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _read_routes() -> str:
+        try:
+            with open(os.path.join(HOST_NET, "route"), "r") as f:
+                return f.read()
+        except OSError:
+            return ""
+    
+    @staticmethod
+    def _slow_signals() -> tuple:
+        addresses = tuple(sorted(
+            (interface, address.address)
+            for interface, entries in psutil.net_if_addrs().items()
+            for address in entries
+        ))
+        if HOST_ROOT:
+            # net_if_addrs() only sees the container's interfaces
+            addresses += tuple(str(address) for address in host_local_addresses())
+        # boot_time() wobbles by a second with clock adjustments
+        return addresses, round(psutil.boot_time() / 10)
+    
+    def _compute(self) -> Dict:
+        logger.info("Refreshing host facts")
+        return {
+            "hostname": socket.gethostname(),
+            "ip_address": get_ip_address(),
+            "os_info": get_os_info(),
+            "platform": platform.system(),
+            "platform_release": platform.release(),
+            "platform_version": platform.version(),
+            "architecture": platform.machine(),
+            "processor": platform.processor() or "Unknown",
+            "python_version": platform.python_version(),
+            "boot_time": psutil.boot_time()
         }
-    }
+    
+    def current(self) -> Dict:
+        with self._lock:
+            return self._check()
+    
+    def _check(self) -> Dict:
+        signature = (socket.gethostname(), self._read_routes())
+        changed = self.facts is None or signature != self._signature
+        
+        now = time.monotonic()
+        if changed or now - self._polled_at >= HOST_FACTS_POLL:
+            slow_signature = self._slow_signals()
+            changed = changed or slow_signature != self._slow_signature
+            self._slow_signature = slow_signature
+            self._polled_at = now
+        
+        if changed:
+            self.facts = self._compute()
+            self._signature = signature
+        return self.facts
 
-@app.get("/health", tags=["General"])
-async def health_check():
-    """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "uptime": get_uptime_string()
-    }
+host_facts = HostFacts()
 
-@app.get("/system", response_model=SystemInfo, tags=["System"])
-async def get_system_info():
-    """Get general system information"""
-    try:
-        return SystemInfo(
-            hostname=socket.gethostname(),
-            ip_address=get_ip_address(),
-            platform=platform.system(),
-            platform_release=platform.release(),
-            platform_version=platform.version(),
-            architecture=platform.machine(),
-            processor=platform.processor() or "Unknown",
-            python_version=platform.python_version(),
-            boot_time=datetime.fromtimestamp(psutil.boot_time()).isoformat(),
-            uptime=get_uptime_string(),
-            current_time=datetime.now().isoformat()
+# cpu_times() fields reported in the breakdown (missing ones count as 0)
+CPU_TIME_FIELDS = ("user", "nice", "system", "idle", "iowait", "irq", "softirq", "steal", "guest", "guest_nice")
+# guest and guest_nice are already accounted in user and nice, so they are
+# left out of the elapsed time to avoid counting them twice
+CPU_ELAPSED_FIELDS = len(CPU_TIME_FIELDS) - 2
+
+# Process states as psutil reports them, by /proc/<pid>/stat state letter
+PROC_STATUS = {
+    "R": "running", "S": "sleeping", "D": "disk-sleep", "Z": "zombie", "T": "stopped",
+    "t": "tracing-stop", "X": "dead", "x": "dead", "K": "wake-kill", "W": "waking",
+    "P": "parked", "I": "idle",
+}
+
+# /proc/meminfo fields needed by ProcfsReader.virtual_memory()
+MEMINFO_FIELDS = frozenset((b"MemTotal", b"MemFree", b"MemAvailable", b"Buffers", b"Cached", b"SReclaimable"))
+
+class ProcfsReader:
+    """Reads procfs files under a configurable root with minimal parsing.
+
+    Every file is read whole with os.readv() into a buffer that is reused
+    by each thread, and only the fields the collectors need are decoded,
+    so a sample creates no per-call objects the way psutil's namedtuples
+    and Process instances do.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        # /proc/net follows the reader's network namespace; PID 1 sees the host's
+        self.net_dir = f"{root}/1/net" if HOST_ROOT else f"{root}/net"
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+        self.page_size = os.sysconf("SC_PAGE_SIZE")
+        self._local = threading.local()
+
+    def read(self, path: str) -> bytes:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = bytearray(65536)
+
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            size = 0
+            while True:
+                if size == len(buffer):
+                    buffer.extend(bytes(len(buffer)))
+                view = memoryview(buffer)
+                try:
+                    count = os.readv(fd, [view[size:]])
+                finally:
+                    view.release()
+                if count == 0:
+                    break
+                size += count
+        finally:
+            os.close(fd)
+        # One copy out of the shared buffer; slicing the bytearray would add another
+        with memoryview(buffer) as view:
+            return bytes(view[:size])
+
+    def stat(self) -> Dict:
+        """Aggregate and per-core CPU times in seconds, plus the boot time"""
+        ticks = self.clock_ticks
+        total, per_cpu, boot_time = None, [], 0
+        for line in self.read(f"{self.root}/stat").split(b"\n"):
+            if line.startswith(b"cpu"):
+                fields = line.split()
+                times = [int(value) / ticks for value in fields[1:len(CPU_TIME_FIELDS) + 1]]
+                times += [0.0] * (len(CPU_TIME_FIELDS) - len(times))
+                if fields[0] == b"cpu":
+                    total = tuple(times)
+                else:
+                    per_cpu.append(tuple(times))
+            elif line.startswith(b"btime"):
+                boot_time = int(line.split()[1])
+        return {"cpu": total, "per_cpu": per_cpu, "boot_time": boot_time}
+
+    def meminfo(self, names=MEMINFO_FIELDS) -> Dict[bytes, int]:
+        """Selected /proc/meminfo fields in bytes"""
+        values = {}
+        for line in self.read(f"{self.root}/meminfo").split(b"\n"):
+            name, _, rest = line.partition(b":")
+            if name in names:
+                values[name] = int(rest.split()[0]) * 1024
+        return values
+
+    def virtual_memory(self) -> tuple:
+        """(total, available, used, free, percent) computed the way psutil 6 does"""
+        info = self.meminfo()
+        total, free = info[b"MemTotal"], info[b"MemFree"]
+        buffers = info.get(b"Buffers", 0)
+        cached = info.get(b"Cached", 0) + info.get(b"SReclaimable", 0)
+        available = info.get(b"MemAvailable", free + buffers + cached)
+        used = total - available
+        percent = round((total - available) / total * 100, 1) if total else 0.0
+        return total, available, used, free, percent
+
+    def net_dev(self) -> Dict[str, tuple]:
+        """(bytes_recv, packets_recv, errin, dropin, bytes_sent, packets_sent,
+        errout, dropout) per interface"""
+        interfaces = {}
+        for line in self.read(f"{self.net_dir}/dev").split(b"\n")[2:]:
+            name, _, rest = line.partition(b":")
+            fields = rest.split()
+            if len(fields) >= 12:
+                interfaces[name.strip().decode()] = tuple(int(fields[i]) for i in (0, 1, 2, 3, 8, 9, 10, 11))
+        return interfaces
+
+    def net_io_counters(self) -> Dict[str, int]:
+        """Counters summed over all interfaces, named like psutil.net_io_counters()"""
+        totals = [sum(column) for column in zip(*self.net_dev().values())] or [0] * 8
+        recv, packets_recv, errin, dropin, sent, packets_sent, errout, dropout = totals
+        return {
+            "bytes_sent": sent, "bytes_recv": recv,
+            "packets_sent": packets_sent, "packets_recv": packets_recv,
+            "errin": errin, "errout": errout, "dropin": dropin, "dropout": dropout,
+        }
+
+    def diskstats(self) -> Dict[str, tuple]:
+        """Raw /proc/diskstats counters per device: reads, reads merged,
+        sectors read, read ms, writes, writes merged, sectors written,
+        write ms, in flight, busy ms, weighted ms"""
+        devices = {}
+        for line in self.read(f"{self.root}/diskstats").split(b"\n"):
+            fields = line.split()
+            if len(fields) >= 14:
+                devices[fields[2].decode()] = tuple(int(value) for value in fields[3:14])
+        return devices
+
+    def pids(self) -> List[int]:
+        return [int(name) for name in os.listdir(self.root) if name.isdigit()]
+
+    def pid_stat(self, pid: int) -> tuple:
+        """(name, state, cpu ticks, threads, start ticks, rss pages) of a process"""
+        data = self.read(f"{self.root}/{pid}/stat")
+        # The name may itself contain spaces and parentheses
+        open_paren, close_paren = data.index(b"("), data.rindex(b")")
+        fields = data[close_paren + 2:].split()
+        return (
+            data[open_paren + 1:close_paren].decode(errors="replace"),
+            fields[0].decode(),
+            int(fields[11]) + int(fields[12]),
+            int(fields[17]),
+            int(fields[19]),
+            int(fields[21]),
         )
-    except Exception as e:
-        logger.error(f"Error getting system info: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/cpu", response_model=CPUInfo, tags=["System"])
-async def get_cpu_info():
-    """Get CPU information and usage"""
+    def cmdline(self, pid: int) -> List[str]:
+        data = self.read(f"{self.root}/{pid}/cmdline")
+        return [arg.decode(errors="replace") for arg in data.rstrip(b"\0").split(b"\0") if arg]
+
+    def uid(self, pid: int) -> int:
+        return os.stat(f"{self.root}/{pid}").st_uid
+
+def read_passwd(path: str) -> Dict[int, str]:
+    """uid -> user name from a passwd file"""
+    users = {}
     try:
-        cpu_freq = psutil.cpu_freq()
-        
-        return CPUInfo(
-            count=psutil.cpu_count(logical=False) or 0,
-            count_logical=psutil.cpu_count(logical=True) or 0,
-            percent=psutil.cpu_percent(interval=1),
-            percent_per_cpu=psutil.cpu_percent(interval=1, percpu=True),
-            freq_current=round(cpu_freq.current, 2) if cpu_freq else None,
-            freq_min=round(cpu_freq.min, 2) if cpu_freq else None,
-            freq_max=round(cpu_freq.max, 2) if cpu_freq else None
+        with open(path, "r") as f:
+            for line in f:
+                fields = line.split(":")
+                if len(fields) > 2 and fields[2].isdigit():
+                    users[int(fields[2])] = fields[0]
+    except OSError:
+        pass
+    return users
+
+def select_procfs_reader() -> Optional[ProcfsReader]:
+    """The procfs reader for COLLECTOR_BACKEND, or None to use psutil"""
+    if COLLECTOR_BACKEND == "psutil":
+        return None
+    if COLLECTOR_BACKEND == "auto" and not os.access(f"{HOST_PROC}/stat", os.R_OK):
+        return None
+    return ProcfsReader(HOST_PROC)
+
+procfs = select_procfs_reader()
+
+# Collectors (called from the sampler thread, never from request handlers)
+def collect_system_info() -> SystemInfo:
+    """Collect general system information"""
+    facts = host_facts.current()
+    return SystemInfo(
+        hostname=facts["hostname"],
+        ip_address=facts["ip_address"],
+        platform=facts["platform"],
+        platform_release=facts["platform_release"],
+        platform_version=facts["platform_version"],
+        architecture=facts["architecture"],
+        processor=facts["processor"],
+        python_version=facts["python_version"],
+        boot_time=datetime.fromtimestamp(facts["boot_time"]).isoformat(),
+        uptime=get_uptime_string(facts["boot_time"]),
+        current_time=datetime.now().isoformat()
+    )
+
+class ProcStatCPUPercent:
+    """psutil.cpu_percent(interval=None) equivalent built on ProcfsReader.stat()"""
+    
+    def __init__(self, reader: ProcfsReader):
+        self.reader = reader
+        self._previous = reader.stat()
+    
+    @staticmethod
+    def _busy(now: tuple, before: tuple) -> float:
+        deltas = [max(0.0, cur - prev) for cur, prev in zip(now[:CPU_ELAPSED_FIELDS], before[:CPU_ELAPSED_FIELDS])]
+        elapsed = sum(deltas)
+        if elapsed <= 0:
+            return 0.0
+        # Idle and iowait are the 4th and 5th /proc/stat columns
+        return round(100.0 * (elapsed - deltas[3] - deltas[4]) / elapsed, 1)
+    
+    def sample(self) -> tuple:
+        """(total percent, per-core percents) since the previous call"""
+        current = self.reader.stat()
+        previous, self._previous = self._previous, current
+        before = previous["per_cpu"]
+        if len(before) != len(current["per_cpu"]):
+            before = current["per_cpu"]
+        return (
+            self._busy(current["cpu"], previous["cpu"]),
+            [self._busy(now, then) for now, then in zip(current["per_cpu"], before)]
         )
-    except Exception as e:
-        logger.error(f"Error getting CPU info: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/memory", response_model=MemoryInfo, tags=["System"])
-async def get_memory_info():
-    """Get memory information and usage"""
-    try:
-        mem = psutil.virtual_memory()
+cpu_percent_tracker = ProcStatCPUPercent(procfs) if procfs is not None else None
+
+def collect_cpu_info() -> CPUInfo:
+    """Collect CPU usage since the previous sample (non-blocking)"""
+    cpu_freq = psutil.cpu_freq()
+    if cpu_percent_tracker is not None:
+        percent, percent_per_cpu = cpu_percent_tracker.sample()
+    else:
+        percent = psutil.cpu_percent(interval=None)
+        percent_per_cpu = psutil.cpu_percent(interval=None, percpu=True)
+    
+    return CPUInfo(
+        count=psutil.cpu_count(logical=False) or 0,
+        count_logical=psutil.cpu_count(logical=True) or 0,
+        percent=percent,
+        percent_per_cpu=percent_per_cpu,
+        freq_current=round(cpu_freq.current, 2) if cpu_freq else None,
+        freq_min=round(cpu_freq.min, 2) if cpu_freq else None,
+        freq_max=round(cpu_freq.max, 2) if cpu_freq else None
+    )
+
+class CPUTimesTracker:
+    """Turns successive per-core cpu_times() vectors into time percentages.
+    
+    The previous vector is kept between samples, so each call costs one
+    cpu_times() read and no sleeping.
+    """
+    
+    def __init__(self):
+        self._previous = self._read()
+        self._previous_at = time.monotonic()
+    
+    @staticmethod
+    def _read() -> List[tuple]:
+        if procfs is not None:
+            return procfs.stat()["per_cpu"]
+        return [
+            tuple(getattr(times, field, 0.0) for field in CPU_TIME_FIELDS)
+            for times in psutil.cpu_times(percpu=True)
+        ]
+    
+    @staticmethod
+    def _percentages(deltas) -> Dict[str, float]:
+        elapsed = sum(deltas[:CPU_ELAPSED_FIELDS])
+        if elapsed <= 0:
+            return dict.fromkeys(CPU_TIME_FIELDS, 0.0)
+        scale = 100.0 / elapsed
+        return {field: round(delta * scale, 2) for field, delta in zip(CPU_TIME_FIELDS, deltas)}
+    
+    def sample(self) -> CPUBreakdownInfo:
+        current = self._read()
+        now = time.monotonic()
+        previous, previous_at = self._previous, self._previous_at
+        self._previous, self._previous_at = current, now
+        
+        # Core hotplug changes the vector shape; start over from this sample
+        if len(previous) != len(current):
+            previous = current
         
-        return MemoryInfo(
-            total=mem.total,
-            available=mem.available,
-            used=mem.used,
-            free=mem.free,
-            percent=mem.percent,
-            total_gb=format_bytes(mem.total),
-            used_gb=format_bytes(mem.used),
-            available_gb=format_bytes(mem.available),
-            free_gb=format_bytes(mem.free)
+        # Counters can step backwards after a core comes back online
+        deltas = [
+            [max(0.0, cur - prev) for cur, prev in zip(core_now, core_before)]
+            for core_now, core_before in zip(current, previous)
+        ]
+        totals = [sum(column) for column in zip(*deltas)] or [0.0] * len(CPU_TIME_FIELDS)
+        
+        return CPUBreakdownInfo(
+            interval=round(now - previous_at, 3),
+            total=CPUTimesPercent(**self._percentages(totals)),
+            per_cpu=[
+                CPUCoreBreakdown(core=index, **self._percentages(core_deltas))
+                for index, core_deltas in enumerate(deltas)
+            ]
         )
-    except Exception as e:
-        logger.error(f"Error getting memory info: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/disk", response_model=List[DiskInfo], tags=["System"])
-async def get_disk_info():
-    """Get disk usage information for all mounted partitions"""
-    try:
-        disk_info = []
-        
-        for partition in psutil.disk_partitions():
-            try:
-                usage = psutil.disk_usage(partition.mountpoint)
-                disk_info.append(DiskInfo(
-                    device=partition.device,
-                    mountpoint=partition.mountpoint,
-                    fstype=partition.fstype,
-                    total=usage.total,
-                    used=usage.used,
-                    free=usage.free,
-                    percent=usage.percent,
-                    total_gb=format_bytes(usage.total),
-                    used_gb=format_bytes(usage.used),
-                    free_gb=format_bytes(usage.free)
-                ))
-            except PermissionError:
-                # Skip partitions that can't be accessed
-                continue
-                
-        return disk_info
-    except Exception as e:
-        logger.error(f"Error getting disk info: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+cpu_times_tracker = CPUTimesTracker()
 
-@app.get("/network", response_model=NetworkInfo, tags=["System"])
-async def get_network_info():
-    """Get network I/O statistics"""
-    try:
-        net_io = psutil.net_io_counters()
-        
-        return NetworkInfo(
-            bytes_sent=net_io.bytes_sent,
-            bytes_recv=net_io.bytes_recv,
-            packets_sent=net_io.packets_sent,
-            packets_recv=net_io.packets_recv,
-            errin=net_io.errin,
-            errout=net_io.errout,
-            dropin=net_io.dropin,
-            dropout=net_io.dropout,
-            bytes_sent_mb=format_bytes(net_io.bytes_sent, "MB"),
-            bytes_recv_mb=format_bytes(net_io.bytes_recv, "MB"),
-            bytes_sent_gb=format_bytes(net_io.bytes_sent, "GB"),
-            bytes_recv_gb=format_bytes(net_io.bytes_recv, "GB")
-        )
-    except Exception as e:
-        logger.error(f"Error getting network info: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+def collect_memory_info() -> MemoryInfo:
+    """Collect memory usage"""
+    if procfs is not None:
+        total, available, used, free, percent = procfs.virtual_memory()
+    else:
+        mem = psutil.virtual_memory()
+        total, available, used, free, percent = mem.total, mem.available, mem.used, mem.free, mem.percent
+    
+    return MemoryInfo(
+        total=total,
+        available=available,
+        used=used,
+        free=free,
+        percent=percent,
+        total_gb=format_bytes(total),
+        used_gb=format_bytes(used),
+        available_gb=format_bytes(available),
+        free_gb=format_bytes(free)
+    )
 
-@app.get("/processes", response_model=List[ProcessInfo], tags=["System"])
-async def get_processes(
-    sort_by: str = "cpu_percent",
-    limit: int = 10,
-    min_cpu: float = 0.0,
-    min_memory: float = 0.0
-):
-    """Get top processes sorted by CPU or memory usage"""
-    try:
-        processes = []
+# Pseudo, image and overlay filesystems left out of /disk
+DISK_PSEUDO_FSTYPES = {
+    "autofs", "binfmt_misc", "bpf", "cgroup", "cgroup2", "configfs", "debugfs", "devpts",
+    "devtmpfs", "efivarfs", "fusectl", "hugetlbfs", "mqueue", "nsfs", "overlay", "proc",
+    "pstore", "ramfs", "rpc_pipefs", "securityfs", "selinuxfs", "squashfs", "sysfs",
+    "tmpfs", "tracefs", "erofs",
+}
+# Network filesystems, listed even though they have no block device
+DISK_NETWORK_FSTYPES = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "9p", "ceph", "glusterfs"}
+# First quarantine of a filesystem that timed out, doubled on each repeat
+DISK_QUARANTINE_BASE = 30.0
+
+class PartitionCollector:
+    """Filesystem usage that a hung mount cannot block.
+    
+    Each mountpoint's disk_usage() runs on a bounded thread pool and is
+    awaited for at most DISK_USAGE_TIMEOUT. A mount that does not answer in
+    time is reported with its last known usage and timed_out set, and is
+    quarantined (DISK_QUARANTINE_BASE doubling up to DISK_QUARANTINE_MAX)
+    so it is not queried again until the backoff expires. A query still
+    running from an earlier sample is never submitted twice; its result is
+    still used when it finishes, but only a timely answer lifts the
+    quarantine. A query that never got a worker, stuck behind hung ones, is
+    withdrawn and the mount stays timed_out until it answers again.
+    """
+    
+    def __init__(self, workers: int, timeout: float, quarantine_max: float):
+        self.workers = workers
+        self.timeout = timeout
+        self.quarantine_max = quarantine_max
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, Any] = {}
+        self._last: Dict[str, Any] = {}
+        self._strikes: Dict[str, int] = {}
+        self._quarantined: Dict[str, float] = {}
+        # Mounts whose last query was withdrawn unanswered; _last is stale
+        self._stale: set = set()
+    
+    @staticmethod
+    def partitions() -> list:
+        """Mounted filesystems, without pseudo filesystems and repeated bind mounts"""
+        by_device = {}
+        for partition in psutil.disk_partitions(all=True):
+            if partition.fstype in DISK_PSEUDO_FSTYPES:
+                continue
+            if not partition.device.startswith("/dev/") and partition.fstype not in DISK_NETWORK_FSTYPES \
+                    and partition.fstype != "zfs":
+                continue
+            # A device mounted several times (docker binds) is reported once, at its shortest path
+            seen = by_device.get(partition.device)
+            if seen is None or len(partition.mountpoint) < len(seen.mountpoint):
+                by_device[partition.device] = partition
+        return list(by_device.values())
+    
+    def _strike(self, mountpoint: str, now: float):
+        strikes = self._strikes[mountpoint] = self._strikes.get(mountpoint, 0) + 1
+        backoff = min(self.quarantine_max, DISK_QUARANTINE_BASE * 2 ** (strikes - 1))
+        self._quarantined[mountpoint] = now + backoff
+        logger.warning(f"Disk usage of {mountpoint} timed out, skipping it for {backoff:.0f}s")
+    
+    def sample(self) -> List[DiskInfo]:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="disk-usage")
+        partitions = self.partitions()
+        now = time.monotonic()
         
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent', 'memory_info', 'status', 'create_time']):
-            try:
-                pinfo = proc.info
-                
-                # Skip if below thresholds
-                if pinfo['cpu_percent'] < min_cpu and pinfo['memory_percent'] < min_memory:
-                    continue
-                
-                processes.append(ProcessInfo(
-                    pid=pinfo['pid'],
-                    name=pinfo['name'],
-                    cpu_percent=round(pinfo['cpu_percent'], 2),
-                    memory_percent=round(pinfo['memory_percent'], 2),
-                    memory_mb=round(pinfo['memory_info'].rss / (1024 ** 2), 2),
-                    status=pinfo['status'],
-                    create_time=datetime.fromtimestamp(pinfo['create_time']).isoformat()
-                ))
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
+        submitted = []
+        for partition in partitions:
+            mountpoint = partition.mountpoint
+            if mountpoint in self._pending or self._quarantined.get(mountpoint, 0) > now:
                 continue
+            self._pending[mountpoint] = self._pool.submit(psutil.disk_usage, mountpoint)
+            submitted.append(self._pending[mountpoint])
+        if submitted:
+            wait(submitted, timeout=self.timeout)
         
-        # Sort processes
-        if sort_by == "memory_percent":
-            processes.sort(key=lambda x: x.memory_percent, reverse=True)
-        else:
-            processes.sort(key=lambda x: x.cpu_percent, reverse=True)
+        now = time.monotonic()
+        for mountpoint, future in list(self._pending.items()):
+            if future.done():
+                del self._pending[mountpoint]
+                self._stale.discard(mountpoint)
+                try:
+                    self._last[mountpoint] = future.result()
+                except OSError:
+                    # Skip partitions that can't be accessed
+                    self._last.pop(mountpoint, None)
+                else:
+                    # Only an answer within the timeout lifts the quarantine
+                    if future in submitted:
+                        self._strikes.pop(mountpoint, None)
+                        self._quarantined.pop(mountpoint, None)
+            elif future.running():
+                if self._quarantined.get(mountpoint, 0) <= now:
+                    self._strike(mountpoint, now)
+            elif future.cancel():
+                # Queued behind hung queries; not this mount's fault, retry next sample
+                del self._pending[mountpoint]
+                self._stale.add(mountpoint)
         
-        return processes[:limit]
-    except Exception as e:
-        logger.error(f"Error getting process info: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        disk_info = []
+        for partition in partitions:
+            mountpoint = partition.mountpoint
+            timed_out = mountpoint in self._pending or mountpoint in self._quarantined or mountpoint in self._stale
+            usage = self._last.get(mountpoint)
+            if usage is None and not timed_out:
+                continue
+            total, used, free, percent = usage[:4] if usage is not None else (0, 0, 0, 0.0)
+            disk_info.append(DiskInfo(
+                device=partition.device,
+                mountpoint=mountpoint,
+                fstype=partition.fstype,
+                total=total,
+                used=used,
+                free=free,
+                percent=percent,
+                total_gb=format_bytes(total),
+                used_gb=format_bytes(used),
+                free_gb=format_bytes(free),
+                timed_out=timed_out
+            ))
+        
+        mounted = {partition.mountpoint for partition in partitions}
+        for state in (self._last, self._strikes, self._quarantined):
+            for mountpoint in state.keys() - mounted:
+                del state[mountpoint]
+        self._stale &= mounted
+        return disk_info
+    
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
 
-@app.get("/all", tags=["System"])
-async def get_all_stats():
-    """Get all system statistics in one call"""
-    try:
-        return {
-            "system": await get_system_info(),
-            "cpu": await get_cpu_info(),
-            "memory": await get_memory_info(),
-            "disk": await get_disk_info(),
-            "network": await get_network_info(),
-            "top_processes": await get_processes(limit=5)
-        }
-    except Exception as e:
-        logger.error(f"Error getting all stats: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+partition_collector = PartitionCollector(DISK_USAGE_WORKERS, DISK_USAGE_TIMEOUT, DISK_QUARANTINE_MAX)
 
-@app.get("/temperature", tags=["System"])
-async def get_temperature():
-    """Get system temperature sensors (if available)"""
-    try:
-        temps = psutil.sensors_temperatures()
-        if not temps:
-            return {"message": "Temperature sensors not available on this system"}
-        
-        result = {}
-        for name, entries in temps.items():
-            result[name] = []
-            for entry in entries:
-                result[name].append({
-                    "label": entry.label or "Unknown",
-                    "current": round(entry.current, 2),
-                    "high": round(entry.high, 2) if entry.high else None,
-                    "critical": round(entry.critical, 2) if entry.critical else None
-                })
+# Virtual block devices left out of /disk/io
+DISK_IO_IGNORED_PREFIXES = ("loop", "ram")
+
+class DiskIOTracker:
+    """Per-device I/O rates from successive disk counter readings.
+    
+    Counters come from /proc/diskstats (or psutil.disk_io_counters) as
+    (reads, writes, read bytes, write bytes, read ms, write ms, busy ms).
+    Only whole disks are reported, since partitions would count the same
+    I/O twice. A counter that went backwards (device reset or re-added)
+    restarts that device's deltas from the current reading.
+    """
+    
+    def __init__(self):
+        self._whole_disk: Dict[str, bool] = {}
+        self._previous = self._read()
+        self._previous_at = time.monotonic()
+    
+    def _is_whole_disk(self, device: str) -> bool:
+        whole = self._whole_disk.get(device)
+        if whole is None:
+            # Partitions have no /sys/block entry of their own
+            whole = self._whole_disk[device] = (
+                not device.startswith(DISK_IO_IGNORED_PREFIXES)
+                and (os.path.exists(f"{HOST_SYS}/block/{device}") or not os.path.isdir(f"{HOST_SYS}/block"))
+            )
+        return whole
+    
+    def _read(self) -> Dict[str, tuple]:
+        if procfs is not None:
+            counters = {
+                device: (fields[0], fields[4], fields[2] * 512, fields[6] * 512, fields[3], fields[7], fields[9])
+                for device, fields in procfs.diskstats().items()
+            }
+        else:
+            counters = {
+                device: (c.read_count, c.write_count, c.read_bytes, c.write_bytes,
+                         c.read_time, c.write_time, getattr(c, "busy_time", 0))
+                for device, c in (psutil.disk_io_counters(perdisk=True) or {}).items()
+            }
+        return {device: values for device, values in counters.items() if self._is_whole_disk(device)}
+    
+    def sample(self) -> List[DiskIOInfo]:
+        current = self._read()
+        now = time.monotonic()
+        previous, elapsed = self._previous, now - self._previous_at
+        self._previous, self._previous_at = current, now
         
+        result = []
+        for device, values in sorted(current.items()):
+            before = previous.get(device)
+            deltas = [cur - prev for cur, prev in zip(values, before)] if before else None
+            if deltas is None or elapsed <= 0 or min(deltas) < 0:
+                deltas, rate = [0] * len(values), 0.0
+            else:
+                rate = 1.0 / elapsed
+            reads, writes, read_bytes, write_bytes, read_ms, write_ms, busy_ms = deltas
+            ios = reads + writes
+            result.append(DiskIOInfo(
+                device=device,
+                interval=round(elapsed, 3),
+                read_bytes_per_sec=round(read_bytes * rate, 1),
+                write_bytes_per_sec=round(write_bytes * rate, 1),
+                read_iops=round(reads * rate, 2),
+                write_iops=round(writes * rate, 2),
+                await_ms=round((read_ms + write_ms) / ios, 2) if ios else 0.0,
+                util_percent=round(min(100.0, busy_ms * rate / 10), 2),
+                read_bytes=values[2],
+                write_bytes=values[3]
+            ))
         return result
-    except AttributeError:
-        return {"message": "Temperature monitoring not supported on this platform"}
-    except Exception as e:
-        logger.error(f"Error getting temperature info: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
 
-# Statistics endpoints for WordPress integration
-@app.get("/statistics/", tags=["Statistics"])
-async def get_statistics(
-    sosok: Optional[str] = None,
-    site: Optional[str] = None
-):
-    """Get document statistics"""
-    try:
-        # For demo purposes, return mock data
-        # In production, this would query your actual database
-        stats = MOCK_STATISTICS.copy()
-        
-        # Add some recent uploads with current timestamps
-        now = datetime.now()
-        for i in range(10):
-            upload_date = now - timedelta(days=i)
-            stats["recent_uploads"].append({
-                "filename": f"문서_{i+1}.pdf",
-                "sosok": "관리자" if i % 3 == 0 else "개발팀",
-                "site": "본사" if i % 2 == 0 else "지사1",
-                "upload_date": upload_date.strftime("%Y%m%d"),
-                "tags": "보고서,기획안" if i % 2 == 0 else "회의록"
-            })
-        
-        return stats
-    except Exception as e:
-        logger.error(f"Error getting statistics: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+disk_io_tracker = DiskIOTracker()
 
-@app.get("/statistics/uploads-by-date", tags=["Statistics"])
-async def get_uploads_by_date(
-    days: int = 30,
-    sosok: Optional[str] = None,
-    site: Optional[str] = None
-):
-    """Get upload statistics by date"""
-    try:
-        # Generate mock data for the requested period
-        dates = []
-        counts = []
-        total = 0
-        
-        now = datetime.now()
-        for i in range(days):
-            date = now - timedelta(days=i)
-            dates.insert(0, date.strftime("%Y%m%d"))
-            # Random count between 5 and 50
-            count = 20 + (i % 10) * 3
-            counts.insert(0, count)
-            total += count
+def collect_network_info() -> NetworkInfo:
+    """Collect network I/O counters"""
+    if procfs is not None:
+        net_io = procfs.net_io_counters()
+    else:
+        net_io = psutil.net_io_counters()._asdict()
+    
+    return NetworkInfo(
+        **net_io,
+        bytes_sent_mb=format_bytes(net_io["bytes_sent"], "MB"),
+        bytes_recv_mb=format_bytes(net_io["bytes_recv"], "MB"),
+        bytes_sent_gb=format_bytes(net_io["bytes_sent"], "GB"),
+        bytes_recv_gb=format_bytes(net_io["bytes_recv"], "GB")
+    )
+
+# Loopback and container plumbing left out of /network/interfaces
+NETWORK_IGNORED_PREFIXES = ("lo", "veth", "docker", "br-", "virbr", "cni", "flannel", "cali", "vxlan", "tun", "tap")
+# Counter order of net_io_counters(pernic=True); each feeds a <counter>_per_sec rate
+NETWORK_COUNTERS = ("bytes_sent", "bytes_recv", "packets_sent", "packets_recv", "errin", "errout", "dropin", "dropout")
+
+class NetworkRateTracker:
+    """Smoothed per-interface rates from successive interface counters.
+    
+    Each sample's deltas are turned into per-second rates and blended into
+    an exponentially weighted moving average whose weight follows the real
+    elapsed time (time constant NETWORK_SMOOTHING), so irregular sample
+    intervals don't skew it. A counter that went backwards (interface reset,
+    driver reload or 32-bit wraparound) is not turned into a rate: the
+    interface keeps its previous averages and counts a reset.
+    """
+    
+    def __init__(self, smoothing: float):
+        self.smoothing = smoothing
+        self._previous: Dict[str, tuple] = {}
+        self._previous_at = time.monotonic()
+        self._rates: Dict[str, List[float]] = {}
+        self._resets: Dict[str, int] = {}
+    
+    @staticmethod
+    def _read() -> Dict[str, tuple]:
+        if procfs is not None:
+            counters = {
+                name: (sent, recv, packets_sent, packets_recv, errin, errout, dropin, dropout)
+                for name, (recv, packets_recv, errin, dropin, sent, packets_sent, errout, dropout)
+                in procfs.net_dev().items()
+            }
+        else:
+            counters = {name: tuple(c) for name, c in psutil.net_io_counters(pernic=True).items()}
+        return {name: values for name, values in counters.items() if not name.startswith(NETWORK_IGNORED_PREFIXES)}
+    
+    def sample(self) -> List[NetworkInterfaceInfo]:
+        current = self._read()
+        now = time.monotonic()
+        elapsed = now - self._previous_at
+        weight = 1.0 - math.exp(-elapsed / self.smoothing) if self.smoothing > 0 else 1.0
         
-        return {
-            "dates": dates,
-            "counts": counts,
-            "total": total
-        }
-    except Exception as e:
-        logger.error(f"Error getting uploads by date: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        result = []
+        for name, values in sorted(current.items()):
+            before = self._previous.get(name)
+            rates = self._rates.get(name)
+            if before is not None and elapsed > 0:
+                deltas = [cur - prev for cur, prev in zip(values, before)]
+                if min(deltas) < 0:
+                    self._resets[name] = self._resets.get(name, 0) + 1
+                elif rates is None:
+                    rates = self._rates[name] = [delta / elapsed for delta in deltas]
+                else:
+                    for i, delta in enumerate(deltas):
+                        rates[i] += weight * (delta / elapsed - rates[i])
+            rates = rates or [0.0] * len(NETWORK_COUNTERS)
+            result.append(NetworkInterfaceInfo(
+                interface=name,
+                interval=round(elapsed, 3),
+                **{f"{counter}_per_sec": round(rate, 2) for counter, rate in zip(NETWORK_COUNTERS, rates)},
+                bytes_sent=values[0],
+                bytes_recv=values[1],
+                resets=self._resets.get(name, 0)
+            ))
+        
+        # Interfaces that went away start over if they come back
+        for state in (self._rates, self._resets):
+            for name in state.keys() - current.keys():
+                del state[name]
+        self._previous, self._previous_at = current, now
+        return result
 
-@app.get("/statistics/storage", tags=["Statistics"])
+network_rate_tracker = NetworkRateTracker(NETWORK_SMOOTHING)
+
+def read_cgroup(pid: int) -> str:
+    """Cgroup path of a process (the unified v2 path, or the systemd v1 one)"""
+    try:
+        with open(f"{HOST_PROC}/{pid}/cgroup", "r") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return "unknown"
+    
+    paths = {}
+    for line in lines:
+        hierarchy, controllers, path = line.split(":", 2)
+        paths[controllers] = path
+    return paths.get("") or paths.get("name=systemd") or next(iter(paths.values()), "unknown")
+
+def cmdline_prefix(cmdline: List[str], max_length: int = 64) -> str:
+    """Executable name plus its first argument, e.g. 'python3 main.py'"""
+    if not cmdline:
+        return "-"
+    parts = [os.path.basename(cmdline[0])] + cmdline[1:2]
+    return " ".join(parts)[:max_length]
+
+# Fields of a process row that /processes/groups can group by
+PROCESS_GROUP_FIELDS = ["name", "user", "cgroup", "cmdline_prefix"]
+
+def group_processes(processes: List[Dict], by: str) -> List[Dict]:
+    """Sum CPU, RSS, threads and process count per group in one pass"""
+    groups: Dict[str, list] = {}
+    for p in processes:
+        label = p[by] or "unknown"
+        totals = groups.get(label)
+        if totals is None:
+            totals = groups[label] = [0, 0.0, 0, 0]
+        totals[0] += 1
+        totals[1] += p['cpu_percent']
+        totals[2] += p['rss']
+        totals[3] += p['num_threads']
+    
+    return [
+        {'group': label, 'process_count': count, 'cpu_percent': cpu, 'rss': rss, 'num_threads': threads}
+        for label, (count, cpu, rss, threads) in groups.items()
+    ]
+
+def get_process_groups(snapshot: Dict, by: str) -> List[Dict]:
+    """Process groups of a snapshot, computed at most once per grouping"""
+    cache = snapshot.setdefault("process_groups", {})
+    groups = cache.get(by)
+    if groups is None:
+        groups = cache[by] = group_processes(snapshot["processes"] or [], by)
+    return groups
+
+class ProcessTracker:
+    """Process table that lives across samples, keyed by (pid, create_time).
+    
+    Each psutil.Process is created once and primed, so cpu_percent is
+    measured over the interval since the previous sample instead of being
+    0.0 on a fresh object. Exited processes and reused PIDs are dropped on
+    the next sample.
+    """
+    
+    def __init__(self):
+        self._procs: Dict[tuple, psutil.Process] = {}
+        self._keys: Dict[int, tuple] = {}
+        # Attributes that never change for a process, read once per process
+        self._static: Dict[tuple, tuple] = {}
+    
+    def _track(self, pid: int) -> tuple:
+        proc = psutil.Process(pid)
+        key = (pid, proc.create_time())
+        proc.cpu_percent(interval=None)
+        self._procs[key] = proc
+        self._keys[pid] = key
+        self._static[key] = self._read_static(proc)
+        return key
+    
+    @staticmethod
+    def _read_static(proc: psutil.Process) -> tuple:
+        """(username, cgroup, cmdline_prefix) of a newly seen process"""
+        try:
+            username = proc.username()
+        except (psutil.AccessDenied, KeyError):
+            username = "unknown"
+        try:
+            cmdline = proc.cmdline()
+        except psutil.AccessDenied:
+            cmdline = []
+        return username, read_cgroup(proc.pid), cmdline_prefix(cmdline)
+    
+    def _forget(self, key: tuple):
+        self._procs.pop(key, None)
+        self._static.pop(key, None)
+        if self._keys.get(key[0]) == key:
+            del self._keys[key[0]]
+    
+    def sample(self) -> List[Dict]:
+        """Update the table and return one lightweight row per process"""
+        rows = []
+        pids = psutil.pids()
+        
+        for gone in set(self._keys) - set(pids):
+            self._forget(self._keys[gone])
+        
+        for pid in pids:
+            try:
+                key = self._keys.get(pid)
+                if key is None:
+                    key = self._track(pid)
+                elif not self._procs[key].is_running():
+                    # The PID now belongs to a different process
+                    self._forget(key)
+                    key = self._track(pid)
+                
+                proc = self._procs[key]
+                username, cgroup, prefix = self._static[key]
+                with proc.oneshot():
+                    rows.append({
+                        'pid': pid,
+                        'name': proc.name(),
+                        'cpu_percent': proc.cpu_percent(interval=None),
+                        'memory_percent': proc.memory_percent(),
+                        'rss': proc.memory_info().rss,
+                        'num_threads': proc.num_threads(),
+                        'status': proc.status(),
+                        'create_time': key[1],
+                        'user': username,
+                        'cgroup': cgroup,
+                        'cmdline_prefix': prefix
+                    })
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                if key is not None:
+                    self._forget(key)
+                continue
+            except psutil.AccessDenied:
+                continue
+        
+        return rows
+
+class ProcfsProcessTracker:
+    """ProcessTracker that reads /proc/<pid>/stat directly.
+
+    One stat read per process per sample yields name, state, CPU ticks,
+    threads, start time and RSS. CPU percent is the tick delta since the
+    previous sample, so no Process objects are kept. User names come from
+    the host's /etc/passwd.
+    """
+
+    def __init__(self, reader: ProcfsReader):
+        self.reader = reader
+        self.boot_time = reader.stat()["boot_time"]
+        self._ticks: Dict[tuple, int] = {}
+        self._sampled_at: Optional[float] = None
+        # (username, cgroup, cmdline_prefix) per process, read once
+        self._static: Dict[tuple, tuple] = {}
+        self._users: Dict[int, str] = {}
+
+    def _username(self, uid: int) -> str:
+        name = self._users.get(uid)
+        if name is None:
+            # Reload once per unknown uid, which also picks up new accounts
+            self._users = read_passwd(os.path.join(HOST_ETC, "passwd"))
+            name = self._users.setdefault(uid, str(uid))
+        return name
+
+    def _read_static(self, pid: int) -> tuple:
+        try:
+            username = self._username(self.reader.uid(pid))
+        except OSError:
+            username = "unknown"
+        try:
+            cmdline = self.reader.cmdline(pid)
+        except OSError:
+            cmdline = []
+        return username, read_cgroup(pid), cmdline_prefix(cmdline)
+
+    def sample(self) -> List[Dict]:
+        """Read every process and return one lightweight row per process"""
+        reader = self.reader
+        now = time.monotonic()
+        elapsed = now - self._sampled_at if self._sampled_at is not None else 0.0
+        # Percent of one CPU, like psutil.Process.cpu_percent()
+        cpu_scale = 100.0 / (reader.clock_ticks * elapsed) if elapsed > 0 else 0.0
+        total_memory = reader.virtual_memory()[0] or 1
+        page_size = reader.page_size
+
+        rows = []
+        ticks_by_key = {}
+        for pid in reader.pids():
+            try:
+                name, state, ticks, threads, start, rss_pages = reader.pid_stat(pid)
+            except (OSError, ValueError, IndexError):
+                # Exited between listing and reading
+                continue
+
+            create_time = self.boot_time + start / reader.clock_ticks
+            key = (pid, create_time)
+            static = self._static.get(key)
+            if static is None:
+                static = self._static[key] = self._read_static(pid)
+            previous = self._ticks.get(key)
+            ticks_by_key[key] = ticks
+            rss = rss_pages * page_size
+
+            rows.append({
+                'pid': pid,
+                'name': name,
+                'cpu_percent': round((ticks - previous) * cpu_scale, 1) if previous is not None else 0.0,
+                'memory_percent': rss / total_memory * 100,
+                'rss': rss,
+                'num_threads': threads,
+                'status': PROC_STATUS.get(state, state),
+                'create_time': create_time,
+                'user': static[0],
+                'cgroup': static[1],
+                'cmdline_prefix': static[2]
+            })
+
+        # Exited processes and reused PIDs drop out here
+        for key in self._static.keys() - ticks_by_key.keys():
+            del self._static[key]
+        self._ticks = ticks_by_key
+        self._sampled_at = now
+        return rows
+
+process_tracker = ProcfsProcessTracker(procfs) if procfs is not None else ProcessTracker()
+
+def psutil_temperatures() -> Dict:
+    """Collect temperature sensors through psutil, where sysfs isn't available"""
+    try:
+        temps = psutil.sensors_temperatures()
+    except AttributeError:
+        return {"message": "Temperature monitoring not supported on this platform"}
+    
+    if not temps:
+        return {"message": "Temperature sensors not available on this system"}
+    
+    result = {}
+    for name, entries in temps.items():
+        result[name] = []
+        for index, entry in enumerate(entries):
+            result[name].append({
+                "label": entry.label or "Unknown",
+                # psutil lists same-named chips together; the position tells them apart
+                "input": f"{name}/{index}",
+                "current": round(entry.current, 2),
+                "high": round(entry.high, 2) if entry.high else None,
+                "critical": round(entry.critical, 2) if entry.critical else None
+            })
+    
+    return result
+
+class TemperatureSensor:
+    """One sysfs temperature input, kept open, and its recent readings"""
+    
+    def __init__(self, chip: str, label: str, path: str, high: Optional[float], critical: Optional[float]):
+        self.chip = chip
+        self.label = label
+        self.path = path
+        self.high = high
+        self.critical = critical
+        self.fd = os.open(path, os.O_RDONLY)
+        self.readings = deque()
+    
+    def read(self) -> float:
+        return int(os.pread(self.fd, 32, 0)) / 1000.0
+    
+    def add(self, now: float, current: float, window: float) -> Dict:
+        readings = self.readings
+        readings.append((now, current))
+        while readings[0][0] < now - window:
+            readings.popleft()
+        
+        # Least-squares slope of the window, in degrees per minute
+        count = len(readings)
+        mean_t = math.fsum(t for t, _ in readings) / count
+        mean_v = math.fsum(v for _, v in readings) / count
+        spread = math.fsum((t - mean_t) ** 2 for t, _ in readings)
+        slope = math.fsum((t - mean_t) * (v - mean_v) for t, v in readings) / spread if spread else 0.0
+        return {
+            "label": self.label or "Unknown",
+            # Unique per sensor, unlike chip names and labels
+            "input": os.path.join(os.path.basename(os.path.dirname(self.path)), os.path.basename(self.path)),
+            "current": round(current, 2),
+            "high": round(self.high, 2) if self.high else None,
+            "critical": round(self.critical, 2) if self.critical else None,
+            "min": round(min(v for _, v in readings), 2),
+            "max": round(max(v for _, v in readings), 2),
+            "trend": round(slope * 60, 3),
+        }
+    
+    def close(self):
+        os.close(self.fd)
+
+class TemperatureReader:
+    """Temperature sensors read from sysfs with one pread per sensor per tick.
+    
+    The hwmon inputs (or, when there are none, the thermal zones, as psutil
+    does) are discovered once and kept open. Each tick lists the two class
+    directories to notice hotplugged or removed chips and rediscovers only
+    when that listing changed or a read failed with the device gone. Each
+    sensor also reports the min, max and trend (°C/min) of the last
+    TEMPERATURE_WINDOW seconds.
+    """
+    
+    def __init__(self, root: str, window: float):
+        self.hwmon_dir = os.path.join(root, "class", "hwmon")
+        self.thermal_dir = os.path.join(root, "class", "thermal")
+        self.window = window
+        self.sensors: List[TemperatureSensor] = []
+        self._signature = None
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _read_value(path: str, scale: float = 1000.0) -> Optional[float]:
+        try:
+            with open(path, "r") as f:
+                return int(f.read().strip()) / scale
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def _read_text(path: str) -> str:
+        try:
+            with open(path, "r") as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+    
+    def _listing(self):
+        listing = []
+        for directory in (self.hwmon_dir, self.thermal_dir):
+            try:
+                listing.append(tuple(sorted(os.listdir(directory))))
+            except OSError:
+                listing.append(None)
+        return tuple(listing)
+    
+    def _discover_hwmon(self) -> List[tuple]:
+        found = []
+        for hwmon in sorted(os.listdir(self.hwmon_dir)):
+            base = os.path.join(self.hwmon_dir, hwmon)
+            chip = self._read_text(os.path.join(base, "name")) or hwmon
+            try:
+                inputs = sorted(name for name in os.listdir(base) if name.startswith("temp") and name.endswith("_input"))
+            except OSError:
+                continue
+            for name in inputs:
+                prefix = os.path.join(base, name[:-len("_input")])
+                found.append((
+                    chip,
+                    self._read_text(f"{prefix}_label"),
+                    os.path.join(base, name),
+                    self._read_value(f"{prefix}_max"),
+                    self._read_value(f"{prefix}_crit"),
+                ))
+        return found
+    
+    def _discover_thermal(self) -> List[tuple]:
+        found = []
+        for zone in sorted(os.listdir(self.thermal_dir)):
+            if not zone.startswith("thermal_zone"):
+                continue
+            base = os.path.join(self.thermal_dir, zone)
+            thresholds = {}
+            for name in os.listdir(base):
+                if name.startswith("trip_point_") and name.endswith("_type"):
+                    kind = self._read_text(os.path.join(base, name))
+                    thresholds[kind] = self._read_value(os.path.join(base, name[:-len("_type")] + "_temp"))
+            found.append((
+                self._read_text(os.path.join(base, "type")) or zone,
+                "",
+                os.path.join(base, "temp"),
+                thresholds.get("high"),
+                thresholds.get("critical"),
+            ))
+        return found
+    
+    def _discover(self):
+        previous = {sensor.path: sensor for sensor in self.sensors}
+        found = self._discover_hwmon() if os.path.isdir(self.hwmon_dir) else []
+        if not found and os.path.isdir(self.thermal_dir):
+            found = self._discover_thermal()
+        
+        sensors = []
+        for chip, label, path, high, critical in found:
+            try:
+                sensor = TemperatureSensor(chip, label, path, high, critical)
+            except OSError:
+                continue
+            # A sensor that survived the rediscovery keeps its window
+            old = previous.get(path)
+            if old is not None:
+                sensor.readings = old.readings
+            sensors.append(sensor)
+        for sensor in previous.values():
+            sensor.close()
+        self.sensors = sensors
+    
+    def sample(self) -> Dict:
+        with self._lock:
+            listing = self._listing()
+            if listing == (None, None):
+                return psutil_temperatures()
+            if listing != self._signature:
+                self._discover()
+                self._signature = listing
+            
+            now = time.monotonic()
+            result = {}
+            for sensor in self.sensors:
+                try:
+                    current = sensor.read()
+                except (OSError, ValueError) as e:
+                    # The chip went away; rediscover on the next tick
+                    if isinstance(e, OSError) and e.errno in (errno.ENODEV, errno.ENOENT, errno.ENXIO):
+                        self._signature = None
+                    continue
+                result.setdefault(sensor.chip, []).append(sensor.add(now, current, self.window))
+            
+            if not result:
+                return {"message": "Temperature sensors not available on this system"}
+            return result
+
+temperature_reader = TemperatureReader(HOST_SYS, TEMPERATURE_WINDOW)
+
+def build_web_server_info(snapshot: Dict) -> WebServerInfo:
+    """Build the WEB Server entry of /statistics/servers from a snapshot"""
+    system_info = snapshot["system"]
+    cpu_info = snapshot["cpu"]
+    memory_info = snapshot["memory"]
+    network_info = snapshot["network"]
+    
+    return WebServerInfo(
+        name="WEB Server",
+        status="online",
+        hostname=system_info.hostname,
+        ip_address=system_info.ip_address,
+        os_info=host_facts.current()["os_info"],
+        platform=f"{system_info.platform} {system_info.platform_release}",
+        uptime=system_info.uptime,
+        cpu=ServerCPUInfo(
+            percent=cpu_info.percent,
+            count=cpu_info.count or cpu_info.count_logical,
+            freq_current=cpu_info.freq_current
+        ),
+        memory=ServerMemoryInfo(
+            percent=memory_info.percent,
+            total_gb=memory_info.total_gb,
+            used_gb=memory_info.used_gb
+        ),
+        disk=snapshot["main_disk"],
+        network=ServerNetworkInfo(
+            bytes_sent_mb=network_info.bytes_sent_mb,
+            bytes_recv_mb=network_info.bytes_recv_mb
+        ),
+        top_processes=get_top_processes(snapshot["processes"], 5),
+        top_process_groups=[
+            ServerProcessInfo(
+                name=g['group'],
+                cpu_percent=round(g['cpu_percent'], 2),
+                memory_mb=round(g['rss'] / (1024 ** 2), 2)
+            )
+            for g in heapq.nlargest(5, get_process_groups(snapshot, "name"), key=lambda g: g['cpu_percent'])
+        ]
+    )
+
+# Snapshot keys and the collector that fills each of them
+SNAPSHOT_COLLECTORS = {
+    "system": collect_system_info,
+    "cpu": collect_cpu_info,
+    "cpu_breakdown": cpu_times_tracker.sample,
+    "memory": collect_memory_info,
+    "disk": partition_collector.sample,
+    "main_disk": get_main_disk_usage,
+    "disk_io": disk_io_tracker.sample,
+    "network": collect_network_info,
+    "network_interfaces": network_rate_tracker.sample,
+    "processes": process_tracker.sample,
+    "temperature": temperature_reader.sample,
+}
+
+# Upper bounds, in seconds, of the self-instrumentation latency buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Self-instrumentation timers: help text, label names, and help text of
+# the matching errors counter (None when another family already counts them)
+SELF_TIMERS = {
+    "http_request_duration": ("HTTP request duration by route.", ("method", "route"), "Requests answered with a 5xx status or an exception."),
+    "collector_duration": ("Collector run duration.", ("collector",), None),
+    "peer_fetch_duration": ("Federation peer fetch duration.", ("peer",), "Peer fetches that failed."),
+    "storage_scan_duration": ("Storage scan duration.", ("kind",), "Storage scans that failed."),
+    "event_loop_lag": ("How late the event loop ran a scheduled wake-up.", (), None),
+}
+
+class LatencyHistogram:
+    """Counts of observed durations per LATENCY_BUCKETS bucket, plus an overflow bucket"""
+    
+    __slots__ = ("counts", "sum", "count", "errors", "max")
+    
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+        self.max = 0.0
+    
+    def observe(self, seconds: float, error: bool = False):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.errors += error
+        if seconds > self.max:
+            self.max = seconds
+    
+    def quantile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the quantile (the maximum past the last bucket)"""
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+    
+    def report(self) -> Dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.sum / self.count * 1e3, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1e3, 3),
+            "p99_ms": round(self.quantile(0.99) * 1e3, 3),
+            "max_ms": round(self.max * 1e3, 3),
+        }
+
+class SelfTimings:
+    """Latency histograms of the API's own work, per SELF_TIMERS timer and label values"""
+    
+    def __init__(self):
+        self.histograms: Dict[str, Dict[tuple, LatencyHistogram]] = {timer: {} for timer in SELF_TIMERS}
+    
+    def observe(self, timer: str, labels: tuple, seconds: float, error: bool = False):
+        histograms = self.histograms[timer]
+        histogram = histograms.get(labels)
+        if histogram is None:
+            histogram = histograms[labels] = LatencyHistogram()
+        histogram.observe(seconds, error)
+    
+    def report(self) -> Dict[str, Dict]:
+        return {
+            timer: {"|".join(labels) or "all": histogram.report() for labels, histogram in sorted(histograms.items())}
+            for timer, histograms in self.histograms.items()
+        }
+
+self_timings = SelfTimings()
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight computation.
+    
+    The first caller runs the coroutine; callers arriving while it is in
+    flight await the same result. Per-key counters record how often work
+    was executed, joined or served from a cache by the caller. Work that
+    only one caller can ever start goes through measure() instead, which
+    keeps the counters but has nothing to coalesce.
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats: Dict[str, Dict[str, float]] = {}
+    
+    def _stats(self, key: str) -> Dict[str, float]:
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = {
+                "calls": 0, "executions": 0, "hits": 0, "errors": 0, "last_duration": 0.0
+            }
+        return stats
+    
+    def hit(self, key: str):
+        """Record a call answered from already collected data"""
+        stats = self._stats(key)
+        stats["calls"] += 1
+        stats["hits"] += 1
+    
+    async def run(self, key: str, work: Callable[[], Awaitable]):
+        stats = self._stats(key)
+        stats.setdefault("coalesced", 0)
+        
+        future = self._inflight.get(key)
+        if future is not None:
+            stats["calls"] += 1
+            stats["coalesced"] += 1
+            # A cancelled waiter must not cancel the shared computation
+            return await asyncio.shield(future)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self.measure(key, work)
+        except asyncio.CancelledError:
+            # The runner's cancellation is its own; waiters get an error instead
+            future.set_exception(RuntimeError(f"{key} run was cancelled"))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+    
+    async def measure(self, key: str, work: Callable[[], Awaitable]):
+        """Run work and record its execution, duration and failure under key"""
+        stats = self._stats(key)
+        stats["calls"] += 1
+        stats["executions"] += 1
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await work()
+        except Exception:
+            failed = True
+            stats["errors"] += 1
+            raise
+        finally:
+            stats["last_duration"] = time.perf_counter() - started
+            self_timings.observe("collector_duration", (key,), stats["last_duration"], failed)
+    
+    def report(self) -> Dict[str, Dict]:
+        report = {}
+        for key, stats in sorted(self.stats.items()):
+            calls = stats["calls"] or 1
+            report[key] = {
+                **stats,
+                "last_duration": round(stats["last_duration"], 6),
+                "hit_ratio": round(stats["hits"] / calls, 4)
+            }
+            if "coalesced" in stats:
+                report[key]["coalesce_ratio"] = round(stats["coalesced"] / calls, 4)
+        return report
+
+collector_flights = SingleFlight()
+
+class EventLoopMonitor:
+    """Measures event-loop lag: how much later than scheduled a sleep wakes up.
+    
+    Anything that blocks the loop (a synchronous call in a coroutine, a
+    long serialization) delays every request; the lag shows by how much.
+    """
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(0.0, loop.time() - scheduled)
+            self_timings.observe("event_loop_lag", (), self.last_lag)
+
+loop_monitor = EventLoopMonitor(LOOP_LAG_INTERVAL)
+
+class RouteTimingMiddleware:
+    """ASGI middleware recording each HTTP request's duration by route template.
+    
+    Requests that match no route share the "unmatched" label, and event
+    streams are left out, since their duration is the connection's lifetime.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        started = time.perf_counter()
+        response = {"status": 500, "stream": False}
+        
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["stream"] = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            if not response["stream"]:
+                route = scope.get("route")
+                self_timings.observe(
+                    "http_request_duration",
+                    (scope["method"], getattr(route, "path", "unmatched")),
+                    time.perf_counter() - started,
+                    response["status"] >= 500
+                )
+
+app.add_middleware(RouteTimingMiddleware)
+
+class MetricsSampler:
+    """Samples all collectors on a fixed interval into an in-memory snapshot.
+    
+    Each collector runs in a worker thread so psutil never blocks the event
+    loop, and through collector_flights so concurrent refreshes share one
+    collection pass; request handlers only read the latest snapshot.
+    """
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.snapshot: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[tuple] = []
+        # False in workers that read the shared snapshot instead of sampling
+        self.collecting = True
+        # Snapshot ids are unique across restarts: start time plus a counter
+        self._epoch = format(int(time.time() * 1000), "x")
+        self._sequence = 0
+        
+        # Prime the non-blocking CPU counters so the first sample is meaningful
+        psutil.cpu_percent(interval=None)
+        psutil.cpu_percent(interval=None, percpu=True)
+    
+    def add_listener(self, listener: Callable[[Dict], None], collector_only: bool = False):
+        """Call listener(snapshot) on the event loop after every new sample.
+        
+        collector_only listeners keep state that must exist once per host
+        (alerts, the persistent store), so they are skipped in workers that
+        read the shared snapshot.
+        """
+        self._listeners.append((listener, collector_only))
+    
+    def _publish(self, snapshot: Dict):
+        for listener, collector_only in self._listeners:
+            if collector_only and not self.collecting:
+                continue
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error(f"Error in sampler listener {getattr(listener, '__qualname__', listener)}: {str(e)}")
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error sampling metrics: {str(e)}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+    
+    async def refresh(self) -> Dict:
+        """Take a new sample and publish it; concurrent calls share one pass"""
+        return await collector_flights.run("snapshot", self._sample)
+    
+    def install(self, snapshot: Dict):
+        """Serve and publish a snapshot sampled by the collector process"""
+        self.snapshot = snapshot
+        self._publish(snapshot)
+    
+    async def current(self) -> Dict:
+        """Return the latest snapshot, sampling once if none exists yet"""
+        if self.snapshot is None:
+            return await self.refresh()
+        return self.snapshot
+    
+    async def _sample(self) -> Dict:
+        previous = self.snapshot
+        self._sequence += 1
+        snapshot = {"id": f"{self._epoch}-{self._sequence}", "sampled_at": time.time()}
+        
+        for key, collector in SNAPSHOT_COLLECTORS.items():
+            try:
+                snapshot[key] = await collector_flights.measure(key, lambda collector=collector: asyncio.to_thread(collector))
+            except Exception as e:
+                # Keep serving the last good value for this subsystem
+                logger.error(f"Error collecting {key}: {str(e)}")
+                snapshot[key] = previous.get(key) if previous else None
+        
+        await asyncio.to_thread(self._derive, snapshot, previous)
+        self.snapshot = snapshot
+        self._publish(snapshot)
+        return snapshot
+    
+    def _derive(self, snapshot: Dict, previous: Optional[Dict]):
+        """Build the views computed from several collectors"""
+        try:
+            snapshot["web_server"] = build_web_server_info(snapshot)
+        except Exception as e:
+            logger.error(f"Error building web server info: {str(e)}")
+            snapshot["web_server"] = previous.get("web_server") if previous else None
+        
+        snapshot["top_processes"] = select_processes(snapshot["processes"] or [], limit=5)
+        # JSON fragments per key, filled lazily by encode_snapshot_value()
+        snapshot["encoded"] = {}
+        # Full response bodies per encoding, filled lazily by snapshot_response()
+        snapshot["bodies"] = {}
+
+sampler = MetricsSampler(SAMPLE_INTERVAL)
+
+# History
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def parse_duration(value: str) -> float:
+    """Parse a duration such as '90s', '5m', '6h' or '1d' into seconds"""
+    text = value.strip().lower()
+    try:
+        if text and text[-1] in DURATION_UNITS:
+            seconds = float(text[:-1]) * DURATION_UNITS[text[-1]]
+        else:
+            seconds = float(text)
+    except ValueError:
+        raise ValueError(f"Invalid duration: {value}")
+    
+    if not seconds > 0:
+        raise ValueError(f"Duration must be positive: {value}")
+    return seconds
+
+def percentile(values, fraction: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+HISTORY_AGGREGATIONS = {
+    "avg": lambda values: math.fsum(values) / len(values),
+    "min": min,
+    "max": max,
+    "p95": lambda values: percentile(values, 0.95),
+}
+
+# Recorded metrics and their units
+HISTORY_METRICS = {
+    "cpu": "%",
+    "memory": "%",
+    "disk": "%",
+    "net_sent": "B/s",
+    "net_recv": "B/s",
+    "temperature": "°C",
+    "disk_read": "B/s",
+    "disk_write": "B/s",
+    "disk_iops": "IO/s",
+    "disk_util": "%",
+    "net_packets": "packets/s",
+    "net_errors": "errors/s",
+    "net_drops": "drops/s",
+}
+
+def max_temperature(temperature: Optional[Dict]) -> float:
+    """Highest current reading across all sensors, NaN when there are none"""
+    readings = [
+        entry["current"]
+        for entries in (temperature or {}).values() if isinstance(entries, list)
+        for entry in entries
+    ]
+    return max(readings) if readings else math.nan
+
+def bucket_series(timestamps, values, start: float, end: float, step: float, agg: str) -> Dict:
+    """Aggregate a time-ordered series into fixed-width buckets covering [start, end)"""
+    aggregate = HISTORY_AGGREGATIONS[agg]
+    
+    bucket_count = math.ceil((end - start) / step)
+    starts = [start + i * step for i in range(bucket_count)]
+    # Samples are in time order, so each bucket is one contiguous slice
+    edges = [bisect.bisect_left(timestamps, edge) for edge in starts]
+    edges.append(bisect.bisect_left(timestamps, end))
+    
+    points = []
+    for i in range(bucket_count):
+        bucket = [v for v in values[edges[i]:edges[i + 1]] if v == v]
+        points.append(round(aggregate(bucket), 2) if bucket else None)
+    
+    return {"starts": starts, "values": points}
+
+class MetricsHistory:
+    """Fixed-size ring buffers of sampled metric values.
+    
+    One timestamp ring is shared by a value ring per metric; all of them are
+    flat arrays of doubles, so the memory cost is fixed at
+    8 * capacity * (metrics + 1) bytes. Missing values are stored as NaN.
+    """
+    
+    def __init__(self, capacity: int, metrics: Dict[str, str]):
+        self.capacity = capacity
+        self.metrics = metrics
+        self.timestamps = array('d', [0.0]) * capacity
+        self.values = {name: array('d', [math.nan]) * capacity for name in metrics}
+        self.head = 0
+        self.count = 0
+    
+    def append(self, timestamp: float, values: Dict[str, float]):
+        index = self.head
+        self.timestamps[index] = timestamp
+        for name, ring in self.values.items():
+            ring[index] = values.get(name, math.nan)
+        self.head = (index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+    
+    def _halves(self) -> List[tuple]:
+        """(first, last) index ranges of the ring, oldest first; each is in time order"""
+        if self.count < self.capacity:
+            return [(0, self.count)]
+        return [(self.head, self.capacity), (0, self.head)]
+    
+    def query(self, metric: str, start: float, end: float, step: float, agg: str) -> Dict:
+        # Bisect each half in place and copy only the samples in range
+        ring = self.values[metric]
+        timestamps = array('d')
+        values = array('d')
+        for first, last in self._halves():
+            low = bisect.bisect_left(self.timestamps, start, first, last)
+            high = bisect.bisect_left(self.timestamps, end, low, last)
+            timestamps += self.timestamps[low:high]
+            values += ring[low:high]
+        return bucket_series(timestamps, values, start, end, step, agg)
+
+class StoreTier:
+    """One resolution of the on-disk store, split into fixed-span segment files.
+    
+    Every segment is a preallocated, memory-mapped array of fixed-width
+    records of doubles. The slot of a record is derived from its timestamp,
+    so writing is a single in-place store and reopening a segment needs no
+    parsing. A zero timestamp marks an empty slot.
+    """
+    
+    def __init__(self, directory: str, name: str, layout: str, resolution: float,
+                 span: float, retention: float, fields: int):
+        self.directory = directory
+        self.name = name
+        self.layout = layout
+        self.resolution = resolution
+        self.span = span
+        self.retention = retention
+        self.fields = fields
+        self.slots = math.ceil(span / resolution)
+        self._segments: Dict[int, tuple] = {}
+    
+    def _path(self, segment_start: int) -> str:
+        return os.path.join(self.directory, f"{self.name}-{self.layout}-{segment_start}.seg")
+    
+    def _segment_start(self, timestamp: float) -> int:
+        return int(timestamp // self.span * self.span)
+    
+    def _open(self, segment_start: int, create: bool) -> Optional[memoryview]:
+        """Map a segment file: read-only to query it, or writable (created
+        and preallocated when missing) to store into it"""
+        segment = self._segments.get(segment_start)
+        if segment is not None:
+            if segment[3] or not create:
+                return segment[2]
+            # Mapped read-only by a query; map it again for writing
+            self._release(segment_start)
+        
+        path = self._path(segment_start)
+        size = self.slots * self.fields * 8
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT if create else os.O_RDONLY, 0o644)
+        except FileNotFoundError:
+            return None
+        try:
+            if os.fstat(fd).st_size != size:
+                if not create:
+                    # Still being preallocated by the writer
+                    return None
+                os.ftruncate(fd, size)
+            mapped = mmap.mmap(fd, size, access=mmap.ACCESS_WRITE if create else mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        
+        view = memoryview(mapped).cast('d')
+        self._segments[segment_start] = (path, mapped, view, create)
+        if create:
+            self.expire(time.time())
+        return view
+    
+    def _release(self, segment_start: int):
+        segment = self._segments.pop(segment_start, None)
+        if segment is not None:
+            segment[2].release()
+            segment[1].close()
+    
+    def write(self, record: List[float]):
+        """Store one record, record[0] being its timestamp"""
+        timestamp = record[0]
+        segment_start = self._segment_start(timestamp)
+        view = self._open(segment_start, create=True)
+        offset = int((timestamp - segment_start) // self.resolution) * self.fields
+        view[offset:offset + self.fields] = array('d', record)
+    
+    def read(self, column: int, start: float, end: float):
+        """Return (timestamps, values) of one column for records in [start, end)"""
+        timestamps = array('d')
+        values = array('d')
+        self._unmap_expired(time.time())
+        segment_start = self._segment_start(start)
+        
+        while segment_start < end:
+            view = self._open(segment_start, create=False)
+            if view is not None:
+                low = max(0, int((start - segment_start) // self.resolution))
+                high = min(self.slots, math.ceil((end - segment_start) / self.resolution))
+                if low < high:
+                    first, last = low * self.fields, high * self.fields
+                    # Strided views pull one column out without unpacking records
+                    for ts, value in zip(view[first:last:self.fields], view[first + column:last:self.fields]):
+                        if start <= ts < end:
+                            timestamps.append(ts)
+                            values.append(value)
+            segment_start += int(self.span)
+        
+        return timestamps, values
+    
+    def _unmap_expired(self, now: float):
+        """Drop read-only mappings of segments past retention.
+        
+        Workers that only query never run expire(), so without this they
+        would keep segments the writer has since deleted mapped for good.
+        """
+        for segment_start, segment in list(self._segments.items()):
+            if not segment[3] and segment_start + self.span < now - self.retention:
+                self._release(segment_start)
+    
+    def expire(self, now: float):
+        """Delete segments that ended before the retention window"""
+        prefix = f"{self.name}-"
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith(prefix) and filename.endswith(".seg")):
+                continue
+            try:
+                segment_start = int(filename[:-4].rsplit("-", 1)[1])
+            except ValueError:
+                continue
+            if segment_start + self.span >= now - self.retention:
+                continue
+            
+            if filename.startswith(f"{prefix}{self.layout}-"):
+                self._release(segment_start)
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError as e:
+                logger.error(f"Error removing expired segment {filename}: {str(e)}")
+    
+    def close(self):
+        for path, mapped, view, writable in self._segments.values():
+            view.release()
+            if writable:
+                mapped.flush()
+            mapped.close()
+        self._segments.clear()
+
+class RollupAccumulator:
+    """Running count/sum/min/max per metric for the bucket currently being filled"""
+    
+    def __init__(self, resolution: float, metric_count: int):
+        self.resolution = resolution
+        self.metric_count = metric_count
+        self.bucket_start: Optional[float] = None
+        self._reset()
+    
+    def _reset(self):
+        self.counts = [0.0] * self.metric_count
+        self.sums = [0.0] * self.metric_count
+        self.mins = [math.inf] * self.metric_count
+        self.maxs = [-math.inf] * self.metric_count
+    
+    def add(self, timestamp: float, avgs, mins, maxs, weights) -> Optional[List[float]]:
+        """Fold values into the current bucket.
+        
+        Returns the finished record of the previous bucket when timestamp
+        starts a new one.
+        """
+        bucket_start = timestamp // self.resolution * self.resolution
+        finished = None
+        if self.bucket_start is not None and bucket_start != self.bucket_start:
+            finished = self.record()
+            self._reset()
+        self.bucket_start = bucket_start
+        
+        for i in range(self.metric_count):
+            if avgs[i] == avgs[i] and weights[i] > 0:
+                self.counts[i] += weights[i]
+                self.sums[i] += avgs[i] * weights[i]
+                self.mins[i] = min(self.mins[i], mins[i])
+                self.maxs[i] = max(self.maxs[i], maxs[i])
+        
+        return finished
+    
+    def record(self) -> List[float]:
+        """[bucket_start, samples, avg0, min0, max0, avg1, ...]"""
+        record = [self.bucket_start, max(self.counts)]
+        for i in range(self.metric_count):
+            if self.counts[i]:
+                record += [self.sums[i] / self.counts[i], self.mins[i], self.maxs[i]]
+            else:
+                record += [math.nan, math.nan, math.nan]
+        return record
+
+# Column offset of each aggregation within a rollup metric triple; p95 has
+# none, since a percentile can't be rebuilt from rollups
+ROLLUP_COLUMNS = {"avg": 0, "min": 1, "max": 2}
+
+class MetricsStore:
+    """Persistent time-series store: raw samples rolled up into 1 min and 1 h tiers.
+    
+    Each sample costs one record write in the raw tier; a rollup record is
+    written only when a minute (or hour) closes. The rollup bucket in
+    progress lives in memory and is lost on restart, while the raw tier
+    still covers that period.
+    """
+    
+    def __init__(self, directory: str, metrics: Dict[str, str]):
+        os.makedirs(directory, exist_ok=True)
+        self.metrics = list(metrics)
+        count = len(self.metrics)
+        # Segment names carry the record layout (metric set and slot size), so
+        # changing either never misreads older files; those simply age out
+        def layout(resolution: float) -> str:
+            return format(zlib.crc32(f"{','.join(self.metrics)}|{resolution:g}".encode()), "08x")
+        
+        self.raw = StoreTier(directory, "raw", layout(SAMPLE_INTERVAL), SAMPLE_INTERVAL, 3600, STORE_RAW_RETENTION, 1 + count)
+        self.minute = StoreTier(directory, "1m", layout(60), 60, 86400, STORE_MINUTE_RETENTION, 2 + 3 * count)
+        self.hour = StoreTier(directory, "1h", layout(3600), 3600, 30 * 86400, STORE_HOUR_RETENTION, 2 + 3 * count)
+        self.tiers = [self.raw, self.minute, self.hour]
+        
+        self._minute_rollup = RollupAccumulator(60, count)
+        self._hour_rollup = RollupAccumulator(3600, count)
+        
+        now = time.time()
+        for tier in self.tiers:
+            tier.expire(now)
+    
+    def append(self, timestamp: float, values: Dict[str, float]):
+        row = [values.get(name, math.nan) for name in self.metrics]
+        self.raw.write([timestamp] + row)
+        
+        weights = [1.0] * len(row)
+        minute = self._minute_rollup.add(timestamp, row, row, row, weights)
+        if minute is not None:
+            self.minute.write(minute)
+            avgs, mins, maxs = minute[2::3], minute[3::3], minute[4::3]
+            hour = self._hour_rollup.add(minute[0], avgs, mins, maxs, [minute[1]] * len(row))
+            if hour is not None:
+                self.hour.write(hour)
+    
+    def select_tier(self, start: float, step: float) -> StoreTier:
+        """Finest tier no finer than step whose retention still covers start"""
+        candidates = [tier for tier in self.tiers if tier.resolution <= step] or [self.raw]
+        oldest = time.time() - start
+        for tier in candidates:
+            if tier.retention >= oldest:
+                return tier
+        return candidates[-1]
+    
+    def query(self, metric: str, start: float, end: float, step: float, agg: str) -> Dict:
+        index = self.metrics.index(metric)
+        if agg in ROLLUP_COLUMNS:
+            tier = self.select_tier(start, step)
+        elif start < time.time() - self.raw.retention:
+            raise ValueError(f"{agg} is only available for the last {self.raw.retention:g}s of raw samples")
+        else:
+            tier = self.raw
+        if tier is self.raw:
+            column = 1 + index
+        else:
+            column = 2 + 3 * index + ROLLUP_COLUMNS[agg]
+        
+        timestamps, values = tier.read(column, start, end)
+        result = bucket_series(timestamps, values, start, end, step, agg)
+        result["tier"] = tier.name
+        return result
+    
+    def close(self):
+        for tier in self.tiers:
+            tier.close()
+
+class HistoryRecorder:
+    """Sampler listener that extracts the history metrics once per snapshot
+    and appends them to every history sink"""
+    
+    def __init__(self, sinks: List):
+        self.sinks = sinks
+    
+    def extract(self, snapshot: Dict) -> Dict[str, float]:
+        """History values of a snapshot, computed once and kept in it"""
+        values = snapshot.get("history")
+        if values is not None:
+            return values
+        
+        values = snapshot["history"] = {}
+        if snapshot.get("cpu") is not None:
+            values["cpu"] = snapshot["cpu"].percent
+        if snapshot.get("memory") is not None:
+            values["memory"] = snapshot["memory"].percent
+        if snapshot.get("main_disk") is not None:
+            values["disk"] = snapshot["main_disk"].percent
+        values["temperature"] = max_temperature(snapshot.get("temperature"))
+        
+        disk_io = snapshot.get("disk_io")
+        if disk_io:
+            values["disk_read"] = sum(d.read_bytes_per_sec for d in disk_io)
+            values["disk_write"] = sum(d.write_bytes_per_sec for d in disk_io)
+            values["disk_iops"] = sum(d.read_iops + d.write_iops for d in disk_io)
+            # The busiest device is the one that slows everything down
+            values["disk_util"] = max(d.util_percent for d in disk_io)
+        
+        interfaces = snapshot.get("network_interfaces")
+        if interfaces:
+            values["net_sent"] = sum(i.bytes_sent_per_sec for i in interfaces)
+            values["net_recv"] = sum(i.bytes_recv_per_sec for i in interfaces)
+            values["net_packets"] = sum(i.packets_sent_per_sec + i.packets_recv_per_sec for i in interfaces)
+            values["net_errors"] = sum(i.errin_per_sec + i.errout_per_sec for i in interfaces)
+            values["net_drops"] = sum(i.dropin_per_sec + i.dropout_per_sec for i in interfaces)
+        
+        return values
+    
+    def record(self, snapshot: Dict):
+        values = self.extract(snapshot)
+        for sink in self.sinks:
+            sink.append(snapshot["sampled_at"], values)
+
+metrics_history = MetricsHistory(max(1, math.ceil(HISTORY_RETENTION / SAMPLE_INTERVAL)), HISTORY_METRICS)
+
+metrics_store: Optional[MetricsStore] = None
+if METRICS_STORE_DIR:
+    try:
+        metrics_store = MetricsStore(METRICS_STORE_DIR, HISTORY_METRICS)
+    except OSError as e:
+        logger.error(f"Error opening metrics store at {METRICS_STORE_DIR}, keeping history in memory only: {str(e)}")
+
+history_recorder = HistoryRecorder([metrics_history])
+sampler.add_listener(history_recorder.record)
+if metrics_store is not None:
+    # Every worker maps the same segment files, so one writer serves them all
+    sampler.add_listener(HistoryRecorder([metrics_store]).record, collector_only=True)
+
+def snapshot_meta(snapshot: Dict) -> Dict:
+    """Describe when a snapshot was taken and whether it is stale"""
+    age = max(0.0, time.time() - snapshot["sampled_at"])
+    return {
+        "sampled_at": datetime.fromtimestamp(snapshot["sampled_at"]).isoformat(),
+        "age_seconds": round(age, 3),
+        "stale": age > STALE_AFTER
+    }
+
+def encode_snapshot_value(snapshot: Dict, key: str) -> bytes:
+    """JSON for one snapshot key, encoded at most once per snapshot"""
+    encoded = snapshot["encoded"]
+    fragment = encoded.get(key)
+    if fragment is None:
+        fragment = encoded[key] = encode_json(snapshot.get(key))
+    return fragment
+
+def negotiate_encoding(accept_encoding: str, codings: tuple = ("br", "gzip")) -> str:
+    """Pick one of codings, in order of preference, or identity from an Accept-Encoding header"""
+    offered = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[coding.strip()] = quality
+    
+    for coding in codings:
+        if coding == "br" and brotli is None:
+            continue
+        if offered.get(coding, offered.get("*", 0.0)) > 0:
+            return coding
+    return "identity"
+
+# Accept header values that select a MessagePack body
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+def wants_msgpack(accept: str) -> bool:
+    """Whether the client asked for MessagePack (and it can be produced)"""
+    return msgpack is not None and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+def compress_body(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+def etag_matches(if_none_match: Optional[str], base_tag: str) -> bool:
+    """Whether If-None-Match names any encoding variant of base_tag"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        if tag == base_tag or tag.startswith(base_tag + "-"):
+            return True
+    return False
+
+async def snapshot_response(
+    request: Request,
+    key: str,
+    build: Optional[Callable[[Dict], bytes]] = None,
+    variant: str = ""
+) -> Response:
+    """Serve a JSON body derived from the latest snapshot.
+    
+    The body is serialized, and compressed per content coding, at most
+    once per snapshot. Its strong ETag is derived from the snapshot id, so
+    a matching If-None-Match is answered with 304 before any of that work.
+    build(snapshot) returns the JSON body; by default the snapshot key
+    itself is encoded. variant separates bodies that depend on query
+    parameters. Clients sending Accept: application/msgpack get the same
+    document as MessagePack.
+    """
+    snapshot = await sampler.current()
+    meta = snapshot_meta(snapshot)
+    # Staleness is part of the key so a stalled sampler changes the ETag
+    cache_key = f"{key}?{variant}|{'stale' if meta['stale'] else 'fresh'}"
+    base_tag = f"{snapshot['id']}-{zlib.crc32(cache_key.encode()):08x}"
+    remaining = snapshot["sampled_at"] + sampler.interval - time.time()
+    headers = {
+        "Cache-Control": f"max-age={max(0, int(remaining))}",
+        "Vary": "Accept, Accept-Encoding",
+        "X-Sampled-At": meta["sampled_at"],
+        "X-Snapshot-Age": str(meta["age_seconds"]),
+        "X-Snapshot-Stale": "true" if meta["stale"] else "false"
+    }
+    
+    if etag_matches(request.headers.get("if-none-match"), base_tag):
+        collector_flights.hit(key)
+        headers["ETag"] = f'"{base_tag}"'
+        return Response(status_code=304, headers=headers)
+    
+    bodies = snapshot["bodies"].get(cache_key)
+    collector_flights.hit(key)
+    if bodies is None:
+        if build is None:
+            body = encode_snapshot_value(snapshot, key)
+            if body == b"null":
+                raise HTTPException(status_code=503, detail=f"{key} metrics are not available yet")
+        else:
+            body = build(snapshot)
+        bodies = snapshot["bodies"][cache_key] = {"identity": body}
+    
+    if wants_msgpack(request.headers.get("accept", "")):
+        content = bodies.get("msgpack")
+        if content is None:
+            content = bodies["msgpack"] = msgpack.packb(json.loads(bodies["identity"]))
+        headers["ETag"] = f'"{base_tag}-msgpack"'
+        return Response(content=content, media_type="application/msgpack", headers=headers)
+    
+    coding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    if coding != "identity" and len(bodies["identity"]) >= COMPRESS_MIN_SIZE:
+        content = bodies.get(coding)
+        if content is None:
+            content = bodies[coding] = compress_body(bodies["identity"], coding)
+        headers["Content-Encoding"] = coding
+        headers["ETag"] = f'"{base_tag}-{coding}"'
+    else:
+        content = bodies["identity"]
+        headers["ETag"] = f'"{base_tag}"'
+    
+    return Response(content=content, media_type="application/json", headers=headers)
+
+# Snapshot keys that can be subscribed to on /stream
+STREAM_SUBSYSTEMS = ["system", "cpu", "cpu_breakdown", "memory", "disk", "network", "top_processes", "temperature"]
+
+class SnapshotBroadcaster:
+    """Fans every new sampler snapshot out to any number of stream subscribers.
+    
+    Subscribers wait on a shared event instead of polling, and each
+    subsystem is encoded once per snapshot no matter how many clients
+    receive it.
+    """
+    
+    def __init__(self):
+        self.snapshot: Optional[Dict] = None
+        self.version = 0
+        self.subscribers = 0
+        self._event = asyncio.Event()
+    
+    def publish(self, snapshot: Dict):
+        """Sampler listener"""
+        self.snapshot = snapshot
+        self.version += 1
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+    
+    async def wait_newer(self, version: int, timeout: float) -> bool:
+        """Wait until a snapshot newer than version exists; False on timeout"""
+        if self.version > version:
+            return True
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    def render(self, subsystems: List[str]) -> bytes:
+        """JSON message for the current snapshot with the requested subsystems"""
+        snapshot = self.snapshot
+        parts = [encode_json(snapshot_meta(snapshot))[:-1]]
+        for key in subsystems:
+            parts.append(b',"' + key.encode() + b'":' + encode_snapshot_value(snapshot, key))
+        parts.append(b"}")
+        return b"".join(parts)
+    
+    async def messages(self, subsystems: List[str], interval: float):
+        """Yield rendered messages at most every interval seconds, None as keepalive"""
+        loop = asyncio.get_running_loop()
+        version = 0
+        next_due = 0.0
+        self.subscribers += 1
+        try:
+            while True:
+                delay = next_due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if not await self.wait_newer(version, STREAM_KEEPALIVE):
+                    yield None
+                    continue
+                version = self.version
+                yield self.render(subsystems)
+                next_due = loop.time() + interval
+        finally:
+            self.subscribers -= 1
+
+snapshot_broadcaster = SnapshotBroadcaster()
+sampler.add_listener(snapshot_broadcaster.publish)
+
+def parse_stream_options(subsystems: Optional[str], interval: Optional[float]):
+    """Validate /stream query parameters"""
+    if subsystems:
+        selected = [key.strip() for key in subsystems.split(",") if key.strip()]
+        unknown = [key for key in selected if key not in STREAM_SUBSYSTEMS]
+        if unknown:
+            raise ValueError(f"Unknown subsystems: {', '.join(unknown)}. Available: {', '.join(STREAM_SUBSYSTEMS)}")
+    else:
+        selected = list(STREAM_SUBSYSTEMS)
+    
+    # Pushing faster than the sampler would only repeat snapshots
+    return selected, max(interval or SAMPLE_INTERVAL, SAMPLE_INTERVAL)
+
+# Prometheus exposition
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# gzip member header: deflate, no flags, no mtime, unknown OS
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+# Prefix of every exported metric name
+PROMETHEUS_NAMESPACE = "sysmon"
+
+def prometheus_value(value) -> str:
+    if value is None:
+        return "NaN"
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+def prometheus_escape(value) -> str:
+    """Escape a label value (backslash, double quote and newline)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def prometheus_labels(labels: Optional[Dict[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{prometheus_escape(value)}"' for name, value in labels.items()) + "}"
+
+def metric_family(name: str, kind: str, help_text: str, samples) -> str:
+    """One metric family: HELP and TYPE lines followed by (labels, value) samples"""
+    name = f"{PROMETHEUS_NAMESPACE}_{name}"
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{prometheus_labels(labels)} {prometheus_value(value)}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+def histogram_family(name: str, help_text: str, histograms) -> str:
+    """One histogram family from (labels, LatencyHistogram) pairs"""
+    name = f"{PROMETHEUS_NAMESPACE}_{name}"
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in histograms:
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + (math.inf,), histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{prometheus_labels({**labels, 'le': prometheus_value(bound)})} {cumulative}")
+        lines.append(f"{name}_sum{prometheus_labels(labels)} {prometheus_value(histogram.sum)}")
+        lines.append(f"{name}_count{prometheus_labels(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+def render_self_timings() -> str:
+    text = ""
+    for timer, (help_text, label_names, errors_help) in SELF_TIMERS.items():
+        histograms = [
+            (dict(zip(label_names, labels)), histogram)
+            for labels, histogram in sorted(self_timings.histograms[timer].items())
+        ]
+        text += histogram_family(f"{timer}_seconds", help_text, histograms)
+        if errors_help is not None:
+            text += metric_family(f"{timer.removesuffix('_duration')}_errors_total", "counter", errors_help, [
+                (labels, histogram.errors) for labels, histogram in histograms
+            ])
+    return text
+
+def system_source(snapshot: Dict) -> Optional[tuple]:
+    """The fields of SystemInfo that are exported (uptime is derived from boot time)"""
+    info = snapshot.get("system")
+    if info is None:
+        return None
+    facts = host_facts.facts or {}
+    return (info.hostname, info.platform_release, info.architecture, facts.get("os_info", ""), facts.get("boot_time", 0.0))
+
+def render_system_metrics(source: tuple) -> str:
+    hostname, release, architecture, os_info, boot_time = source
+    return (
+        metric_family("info", "gauge", "Host identity, always 1.", [
+            ({"hostname": hostname, "release": release, "architecture": architecture, "os": os_info}, 1)
+        ])
+        + metric_family("boot_time_seconds", "gauge", "Host boot time in seconds since the epoch.", [(None, boot_time)])
+    )
+
+def render_cpu_metrics(cpu: CPUInfo) -> str:
+    return (
+        metric_family("cpu_usage_percent", "gauge", "CPU usage since the previous sample.", [(None, cpu.percent)])
+        + metric_family("cpu_core_usage_percent", "gauge", "Per-core CPU usage since the previous sample.", [
+            ({"core": str(core)}, percent) for core, percent in enumerate(cpu.percent_per_cpu)
+        ])
+        + metric_family("cpu_count", "gauge", "Number of CPUs.", [
+            ({"type": "physical"}, cpu.count), ({"type": "logical"}, cpu.count_logical)
+        ])
+        + metric_family("cpu_frequency_mhz", "gauge", "Current CPU frequency.", [(None, cpu.freq_current)])
+    )
+
+def render_cpu_breakdown_metrics(breakdown: CPUBreakdownInfo) -> str:
+    total = breakdown.total
+    return metric_family("cpu_mode_percent", "gauge", "Share of CPU time spent in each mode since the previous sample.", [
+        ({"mode": mode}, getattr(total, mode)) for mode in CPU_TIME_FIELDS
+    ])
+
+def render_memory_metrics(memory: MemoryInfo) -> str:
+    return (
+        metric_family("memory_bytes", "gauge", "Physical memory by state.", [
+            ({"state": state}, getattr(memory, state)) for state in ("total", "available", "used", "free")
+        ])
+        + metric_family("memory_usage_percent", "gauge", "Physical memory in use.", [(None, memory.percent)])
+    )
+
+def render_disk_metrics(disks: List[DiskInfo]) -> str:
+    labels = [{"device": d.device, "mountpoint": d.mountpoint, "fstype": d.fstype} for d in disks]
+    return (
+        metric_family("filesystem_size_bytes", "gauge", "Filesystem size.", zip(labels, (d.total for d in disks)))
+        + metric_family("filesystem_used_bytes", "gauge", "Filesystem space used.", zip(labels, (d.used for d in disks)))
+        + metric_family("filesystem_free_bytes", "gauge", "Filesystem space free.", zip(labels, (d.free for d in disks)))
+        + metric_family("filesystem_usage_percent", "gauge", "Filesystem space used.", zip(labels, (d.percent for d in disks)))
+        + metric_family("filesystem_timed_out", "gauge", "Whether the filesystem's usage query timed out.", zip(labels, (int(d.timed_out) for d in disks)))
+    )
+
+def render_disk_io_metrics(devices: List[DiskIOInfo]) -> str:
+    labels = [{"device": d.device} for d in devices]
+    return (
+        metric_family("disk_read_bytes_per_second", "gauge", "Bytes read per second.", zip(labels, (d.read_bytes_per_sec for d in devices)))
+        + metric_family("disk_write_bytes_per_second", "gauge", "Bytes written per second.", zip(labels, (d.write_bytes_per_sec for d in devices)))
+        + metric_family("disk_read_iops", "gauge", "Read operations per second.", zip(labels, (d.read_iops for d in devices)))
+        + metric_family("disk_write_iops", "gauge", "Write operations per second.", zip(labels, (d.write_iops for d in devices)))
+        + metric_family("disk_await_milliseconds", "gauge", "Average time per I/O operation.", zip(labels, (d.await_ms for d in devices)))
+        + metric_family("disk_utilization_percent", "gauge", "Share of time the device was busy.", zip(labels, (d.util_percent for d in devices)))
+    )
+
+def render_network_metrics(network: NetworkInfo) -> str:
+    sent, recv = {"direction": "sent"}, {"direction": "recv"}
+    return (
+        metric_family("network_bytes_total", "counter", "Bytes moved over all interfaces.", [
+            (sent, network.bytes_sent), (recv, network.bytes_recv)
+        ])
+        + metric_family("network_packets_total", "counter", "Packets moved over all interfaces.", [
+            (sent, network.packets_sent), (recv, network.packets_recv)
+        ])
+        + metric_family("network_errors_total", "counter", "Interface errors.", [
+            (sent, network.errout), (recv, network.errin)
+        ])
+        + metric_family("network_drops_total", "counter", "Dropped packets.", [
+            (sent, network.dropout), (recv, network.dropin)
+        ])
+    )
+
+def render_network_interface_metrics(interfaces: List[NetworkInterfaceInfo]) -> str:
+    def per_direction(sent, recv):
+        return [
+            sample
+            for i in interfaces
+            for sample in (({"interface": i.interface, "direction": "sent"}, sent(i)),
+                           ({"interface": i.interface, "direction": "recv"}, recv(i)))
+        ]
+    return (
+        metric_family("network_interface_bytes_per_second", "gauge", "Bytes moved per second, smoothed.",
+                      per_direction(lambda i: i.bytes_sent_per_sec, lambda i: i.bytes_recv_per_sec))
+        + metric_family("network_interface_packets_per_second", "gauge", "Packets moved per second, smoothed.",
+                        per_direction(lambda i: i.packets_sent_per_sec, lambda i: i.packets_recv_per_sec))
+        + metric_family("network_interface_errors_per_second", "gauge", "Interface errors per second, smoothed.",
+                        per_direction(lambda i: i.errout_per_sec, lambda i: i.errin_per_sec))
+        + metric_family("network_interface_drops_per_second", "gauge", "Dropped packets per second, smoothed.",
+                        per_direction(lambda i: i.dropout_per_sec, lambda i: i.dropin_per_sec))
+        + metric_family("network_interface_resets_total", "counter", "Counter resets seen on the interface.", [
+            ({"interface": i.interface}, i.resets) for i in interfaces
+        ])
+    )
+
+def render_temperature_metrics(temperature: Dict) -> str:
+    readings = [
+        ({"chip": chip, "sensor": entry["label"], "input": entry["input"]}, entry)
+        for chip, entries in temperature.items() if isinstance(entries, list)
+        for entry in entries
+    ]
+    if not readings:
+        return ""
+    return (
+        metric_family("temperature_celsius", "gauge", "Sensor temperature.", [
+            (labels, entry["current"]) for labels, entry in readings
+        ])
+        + metric_family("temperature_high_celsius", "gauge", "Sensor high threshold.", [
+            (labels, entry["high"]) for labels, entry in readings if entry["high"] is not None
+        ])
+        + metric_family("temperature_critical_celsius", "gauge", "Sensor critical threshold.", [
+            (labels, entry["critical"]) for labels, entry in readings if entry["critical"] is not None
+        ])
+        + metric_family("temperature_trend_celsius_per_minute", "gauge", "Sensor temperature trend over the recent window.", [
+            (labels, entry["trend"]) for labels, entry in readings if "trend" in entry
+        ])
+    )
+
+# Process names exported with their own series: the top ones by CPU and
+# the top ones by resident memory. The rest are summed into "other" so a
+# host spawning many short-lived names can't grow /metrics without bound
+PROMETHEUS_PROCESS_GROUPS_LIMIT = 20
+
+def process_group_source(snapshot: Dict) -> Optional[List[Dict]]:
+    if snapshot.get("processes") is None:
+        return None
+    groups = get_process_groups(snapshot, "name")
+    # A process actually named "other" always lands in the folded group
+    named = [g for g in groups if g['group'] != "other"]
+    kept = {
+        g['group']
+        for key in ('cpu_percent', 'rss')
+        for g in heapq.nlargest(PROMETHEUS_PROCESS_GROUPS_LIMIT, named, key=lambda g: g[key])
+    }
+    other = {'group': "other", 'process_count': 0, 'cpu_percent': 0.0, 'rss': 0, 'num_threads': 0}
+    for g in groups:
+        if g['group'] not in kept:
+            for key in ('process_count', 'cpu_percent', 'rss', 'num_threads'):
+                other[key] += g[key]
+    return [g for g in named if g['group'] in kept] + ([other] if other['process_count'] else [])
+
+def render_process_group_metrics(groups: List[Dict]) -> str:
+    labels = [{"group": g['group']} for g in groups]
+    return (
+        metric_family("processes", "gauge", "Number of processes.", [(None, sum(g['process_count'] for g in groups))])
+        + metric_family("process_group_count", "gauge", "Processes per name.", zip(labels, (g['process_count'] for g in groups)))
+        + metric_family("process_group_cpu_percent", "gauge", "CPU usage per process name.", zip(labels, (round(g['cpu_percent'], 2) for g in groups)))
+        + metric_family("process_group_resident_bytes", "gauge", "Resident memory per process name.", zip(labels, (g['rss'] for g in groups)))
+        + metric_family("process_group_threads", "gauge", "Threads per process name.", zip(labels, (g['num_threads'] for g in groups)))
+    )
+
+# (section, source(snapshot), render(source)); a section is re-rendered
+# only when its source differs from the previous snapshot's
+PROMETHEUS_SECTIONS = [
+    ("system", system_source, render_system_metrics),
+    ("cpu", lambda snapshot: snapshot.get("cpu"), render_cpu_metrics),
+    ("cpu_breakdown", lambda snapshot: snapshot.get("cpu_breakdown"), render_cpu_breakdown_metrics),
+    ("memory", lambda snapshot: snapshot.get("memory"), render_memory_metrics),
+    ("disk", lambda snapshot: snapshot.get("disk"), render_disk_metrics),
+    ("disk_io", lambda snapshot: snapshot.get("disk_io"), render_disk_io_metrics),
+    ("network", lambda snapshot: snapshot.get("network"), render_network_metrics),
+    ("network_interfaces", lambda snapshot: snapshot.get("network_interfaces"), render_network_interface_metrics),
+    ("temperature", lambda snapshot: snapshot.get("temperature"), render_temperature_metrics),
+    ("process_groups", process_group_source, render_process_group_metrics),
+]
+
+class PrometheusExposition:
+    """Prometheus text exposition built incrementally from sampler snapshots.
+
+    The snapshot part is assembled once per snapshot from cached sections
+    and compressed at most once. Only the self-metrics are rendered and
+    compressed per scrape.
+    """
+
+    def __init__(self, sections: List[tuple]):
+        self.sections = sections
+        self.scrapes = 0
+        self.render_seconds = 0.0
+        self._rendered: Dict[str, tuple] = {}
+        self._snapshot_id = None
+        self._body = b""
+        self._deflate = None
+        self._gzip_head = b""
+        self._crc = 0
+
+    def snapshot_part(self, snapshot: Dict) -> bytes:
+        if snapshot["id"] != self._snapshot_id:
+            started = time.perf_counter()
+            parts = []
+            for name, source_of, render in self.sections:
+                source = source_of(snapshot)
+                cached = self._rendered.get(name)
+                if cached is None or cached[0] != source:
+                    try:
+                        text = render(source).encode() if source is not None else b""
+                    except Exception as e:
+                        logger.error(f"Error rendering {name} metrics: {str(e)}")
+                        text = b""
+                    cached = self._rendered[name] = (source, text)
+                parts.append(cached[1])
+            self._body = b"".join(parts)
+            self._deflate = None
+            self._snapshot_id = snapshot["id"]
+            self.render_seconds = time.perf_counter() - started
+        return self._body
+
+    def gzipped(self, snapshot: Dict, live: bytes) -> bytes:
+        """gzip of snapshot_part() + live that only compresses live per call"""
+        body = self.snapshot_part(snapshot)
+        if self._deflate is None:
+            # Raw deflate flushed to a byte boundary, so a copy of the
+            # compressor can continue the stream with the live part
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+            self._gzip_head = GZIP_HEADER + compressor.compress(body) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._deflate = compressor
+            self._crc = zlib.crc32(body)
+        compressor = self._deflate.copy()
+        tail = compressor.compress(live) + compressor.flush()
+        trailer = struct.pack("<II", zlib.crc32(live, self._crc), (len(body) + len(live)) & 0xFFFFFFFF)
+        return self._gzip_head + tail + trailer
+
+    def self_metrics(self, snapshot: Dict) -> bytes:
+        """API self-metrics, which change on every scrape"""
+        stats = collector_flights.stats
+        collectors = sorted(stats)
+        cpu = os.times()
+        rss = self_rss()
+        alerts = collector_report("alerts", alert_engine.report)
+        text = (
+            metric_family("snapshot_timestamp_seconds", "gauge", "When the served snapshot was sampled.", [(None, snapshot["sampled_at"])])
+            + metric_family("snapshot_age_seconds", "gauge", "Age of the served snapshot.", [(None, round(time.time() - snapshot["sampled_at"], 3))])
+            + metric_family("collector_calls_total", "counter", "Collector and endpoint calls.", [({"collector": key}, stats[key]["calls"]) for key in collectors])
+            + metric_family("collector_executions_total", "counter", "Calls that ran the collector.", [({"collector": key}, stats[key]["executions"]) for key in collectors])
+            + metric_family("collector_coalesced_total", "counter", "Calls that joined an in-flight run.", [({"collector": key}, stats[key]["coalesced"]) for key in collectors if "coalesced" in stats[key]])
+            + metric_family("collector_cache_hits_total", "counter", "Calls answered from the snapshot.", [({"collector": key}, stats[key]["hits"]) for key in collectors])
+            + metric_family("collector_errors_total", "counter", "Collector runs that failed.", [({"collector": key}, stats[key]["errors"]) for key in collectors])
+            + metric_family("collector_last_duration_seconds", "gauge", "Duration of the last collector run.", [({"collector": key}, stats[key]["last_duration"]) for key in collectors])
+            + metric_family("stream_subscribers", "gauge", "Open /stream and /stream/ws connections.", [(None, snapshot_broadcaster.subscribers)])
+            + metric_family("metrics_scrapes_total", "counter", "Requests to /metrics.", [(None, self.scrapes)])
+            + metric_family("metrics_render_seconds", "gauge", "Time spent rendering the last snapshot part.", [(None, self.render_seconds)])
+            + metric_family("process_cpu_seconds_total", "counter", "CPU time used by the API process.", [(None, cpu.user + cpu.system)])
+            + metric_family("process_resident_memory_bytes", "gauge", "Resident memory of the API process.", [(None, rss)])
+            + metric_family("alert_firing", "gauge", "Whether the alert rule is firing.", [
+                ({"alert": rule["name"], "severity": rule["severity"]}, int(rule["state"] == "firing")) for rule in alerts["alerts"]
+            ])
+            + metric_family("alert_notifications_total", "counter", "Webhook alert deliveries by result.", [
+                ({"result": result}, count) for result, count in alerts["notifications"].items() if result != "webhooks"
+            ])
+            + render_self_timings()
+        )
+        return text.encode()
+
+def self_rss() -> int:
+    """Resident memory of this process.
+    
+    Read from the real /proc/self: with HOST_ROOT set, psutil.Process()
+    would look our container PID up in the host's procfs.
+    """
+    with open("/proc/self/statm", "rb") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+prometheus_exposition = PrometheusExposition(PROMETHEUS_SECTIONS)
+
+# API Endpoints
+@app.get("/", tags=["General"])
+async def root():
+    """Root endpoint with API information"""
+    return {
+        "message": "System Monitoring API",
+        "version": "1.0.0",
+        "endpoints": {
+            "system": "/system",
+            "cpu": "/cpu",
+            "cpu_breakdown": "/cpu/breakdown",
+            "memory": "/memory",
+            "disk": "/disk",
+            "disk_io": "/disk/io",
+            "network": "/network",
+            "network_interfaces": "/network/interfaces",
+            "processes": "/processes",
+            "process_groups": "/processes/groups",
+            "all": "/all",
+            "health": "/health",
+            "collectors": "/collectors",
+            "metrics": "/metrics",
+            "peers": "/peers",
+            "alerts": "/alerts",
+            "debug_timings": "/debug/timings",
+            "debug_profile": "/debug/profile?seconds=N",
+            "history": "/history/{metric}",
+            "stream": "/stream",
+            "stream_ws": "/stream/ws",
+            "statistics": {
+                "main": "/statistics/",
+                "documents": "/statistics/documents",
+                "servers": "/statistics/servers",
+                "uploads_by_date": "/statistics/uploads-by-date",
+                "storage": "/statistics/storage"
+            }
+        }
+    }
+
+@app.get("/health", tags=["General"])
+async def health_check():
+    """Health check endpoint"""
+    snapshot = sampler.snapshot
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "uptime": get_uptime_string(),
+        "sampler": snapshot_meta(snapshot) if snapshot else None,
+        "stream_subscribers": snapshot_broadcaster.subscribers,
+        "collector_backend": "procfs" if procfs is not None else "psutil",
+        "shared_snapshot": shared_snapshot.report() if shared_snapshot is not None else None
+    }
+
+@app.get("/collectors", tags=["General"])
+async def get_collector_stats():
+    """Get per-collector execution, coalescing and cache-hit counters"""
+    return collector_flights.report()
+
+@app.get("/peers", tags=["General"])
+async def get_peers():
+    """Get the state of every federation peer polled for /statistics/servers"""
+    return collector_report("peers", federation.report)
+
+@app.get("/metrics", tags=["General"], response_class=Response)
+async def get_prometheus_metrics(request: Request):
+    """Prometheus text exposition of the latest snapshot and API self-metrics"""
+    snapshot = await sampler.current()
+    prometheus_exposition.scrapes += 1
+    collector_flights.hit("metrics")
+    body = prometheus_exposition.snapshot_part(snapshot)
+    live = prometheus_exposition.self_metrics(snapshot)
+    
+    if negotiate_encoding(request.headers.get("accept-encoding", ""), ("gzip",)) == "gzip":
+        content = prometheus_exposition.gzipped(snapshot, live)
+        headers = {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+    else:
+        content = body + live
+        headers = {"Vary": "Accept-Encoding"}
+    return Response(content=content, media_type=PROMETHEUS_CONTENT_TYPE, headers=headers)
+
+@app.get("/debug/timings", tags=["Debug"])
+async def get_self_timings():
+    """Get latency histograms of requests, collectors, peer fetches and storage scans, and event-loop lag"""
+    return {
+        "event_loop_lag_ms": round(loop_monitor.last_lag * 1e3, 3),
+        "timers": self_timings.report()
+    }
+
+# Longest /debug/profile run, and the profiler's sampling interval, in seconds
+PROFILE_MAX_SECONDS = 60
+PROFILE_INTERVAL = 0.005
+
+profile_lock = threading.Lock()
+
+def sample_stacks(seconds: float, interval: float = PROFILE_INTERVAL) -> Dict[str, int]:
+    """Sample every other thread's stack each interval for seconds.
+    
+    Returns collapsed stacks (thread name first, then the outermost frame
+    down to the innermost, joined by ";") and how often each was seen,
+    which is the input flamegraph.pl and speedscope take.
+    """
+    me = threading.get_ident()
+    counts: Dict[str, int] = {}
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            frames.append(names.get(ident, str(ident)).replace(";", ":"))
+            stack = ";".join(reversed(frames))
+            counts[stack] = counts.get(stack, 0) + 1
+        time.sleep(interval)
+    return counts
+
+@app.get("/debug/profile", tags=["Debug"], response_class=PlainTextResponse)
+async def get_profile(
+    request: Request,
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS)
+):
+    """Profile every thread by stack sampling for N seconds and return collapsed stacks for a flamegraph"""
+    if not PROFILE_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling is disabled; set PROFILE_TOKEN to enable it")
+    token = request.headers.get("x-profile-token", "")
+    if not secrets.compare_digest(token.encode(), PROFILE_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="A valid X-Profile-Token header is required")
+    if not profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        counts = await asyncio.to_thread(sample_stacks, seconds)
+    finally:
+        profile_lock.release()
+    
+    lines = [f"{stack} {count}" for stack, count in sorted(counts.items(), key=lambda item: -item[1])]
+    return PlainTextResponse("\n".join(lines) + "\n")
+
+@app.get("/system", response_model=SystemInfo, tags=["System"])
+async def get_system_info(request: Request):
+    """Get general system information"""
+    return await snapshot_response(request, "system")
+
+@app.get("/cpu", response_model=CPUInfo, tags=["System"])
+async def get_cpu_info(request: Request):
+    """Get CPU information and usage"""
+    return await snapshot_response(request, "cpu")
+
+@app.get("/cpu/breakdown", response_model=CPUBreakdownInfo, tags=["System"])
+async def get_cpu_breakdown(request: Request):
+    """Get per-core CPU time percentages (user/system/iowait/irq/softirq/steal/guest)"""
+    return await snapshot_response(request, "cpu_breakdown")
+
+@app.get("/memory", response_model=MemoryInfo, tags=["System"])
+async def get_memory_info(request: Request):
+    """Get memory information and usage"""
+    return await snapshot_response(request, "memory")
+
+@app.get("/disk", response_model=List[DiskInfo], tags=["System"])
+async def get_disk_info(request: Request):
+    """Get disk usage information for all mounted partitions"""
+    return await snapshot_response(request, "disk")
+
+@app.get("/disk/io", response_model=List[DiskIOInfo], tags=["System"])
+async def get_disk_io(request: Request):
+    """Get per-device read/write throughput, IOPS, await and utilization"""
+    return await snapshot_response(request, "disk_io")
+
+@app.get("/network", response_model=NetworkInfo, tags=["System"])
+async def get_network_info(request: Request):
+    """Get network I/O statistics"""
+    return await snapshot_response(request, "network")
+
+@app.get("/network/interfaces", response_model=List[NetworkInterfaceInfo], tags=["System"])
+async def get_network_interfaces(request: Request):
+    """Get smoothed per-interface byte, packet, error and drop rates"""
+    return await snapshot_response(request, "network_interfaces")
+
+# Sortable /processes columns and the row field each one orders by
+PROCESS_SORT_KEYS = {
+    "cpu_percent": "cpu_percent",
+    "memory_percent": "memory_percent",
+    "memory_mb": "rss",
+}
+
+def select_processes(
+    processes: List[Dict],
+    sort_by: str = "cpu_percent",
+    limit: int = 10,
+    min_cpu: float = 0.0,
+    min_memory: float = 0.0
+) -> List[ProcessInfo]:
+    """Pick the top processes, building models only for the returned rows"""
+    rows = (
+        p for p in processes
+        if not (p['cpu_percent'] < min_cpu and p['memory_percent'] < min_memory)
+    )
+    field = PROCESS_SORT_KEYS.get(sort_by, "cpu_percent")
+    
+    return [
+        ProcessInfo(
+            pid=p['pid'],
+            name=p['name'],
+            cpu_percent=round(p['cpu_percent'], 2),
+            memory_percent=round(p['memory_percent'], 2),
+            memory_mb=round(p['rss'] / (1024 ** 2), 2),
+            status=p['status'],
+            create_time=datetime.fromtimestamp(p['create_time']).isoformat()
+        )
+        for p in heapq.nlargest(max(0, limit), rows, key=lambda p: p[field])
+    ]
+
+@app.get("/processes", response_model=List[ProcessInfo], tags=["System"])
+async def get_processes(
+    request: Request,
+    sort_by: str = "cpu_percent",
+    limit: int = 10,
+    min_cpu: float = 0.0,
+    min_memory: float = 0.0
+):
+    """Get top processes sorted by CPU or memory usage"""
+    return await snapshot_response(
+        request, "processes",
+        lambda snapshot: encode_json(select_processes(snapshot["processes"] or [], sort_by, limit, min_cpu, min_memory)),
+        variant=f"{sort_by}|{limit}|{min_cpu}|{min_memory}"
+    )
+
+# Sortable /processes/groups columns and the group field each one orders by
+PROCESS_GROUP_SORT_KEYS = {
+    "cpu_percent": "cpu_percent",
+    "memory_mb": "rss",
+    "process_count": "process_count",
+    "num_threads": "num_threads",
+}
+
+@app.get("/processes/groups", response_model=List[ProcessGroupInfo], tags=["System"])
+async def get_process_groups_info(
+    request: Request,
+    by: str = "name",
+    sort_by: str = "cpu_percent",
+    limit: int = 10
+):
+    """Get processes aggregated by name, user, cgroup or cmdline prefix"""
+    if by not in PROCESS_GROUP_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unknown grouping '{by}'. Available: {', '.join(PROCESS_GROUP_FIELDS)}")
+    field = PROCESS_GROUP_SORT_KEYS.get(sort_by, "cpu_percent")
+    
+    def build(snapshot: Dict) -> str:
+        groups = get_process_groups(snapshot, by)
+        return encode_json([
+            ProcessGroupInfo(
+                group=g['group'],
+                process_count=g['process_count'],
+                cpu_percent=round(g['cpu_percent'], 2),
+                memory_mb=round(g['rss'] / (1024 ** 2), 2),
+                num_threads=g['num_threads']
+            )
+            for g in heapq.nlargest(max(0, limit), groups, key=lambda g: g[field])
+        ])
+    
+    return await snapshot_response(request, "process_groups", build, variant=f"{by}|{field}|{limit}")
+
+# Snapshot keys included in /all
+ALL_STATS_KEYS = ["system", "cpu", "cpu_breakdown", "memory", "disk", "disk_io", "network", "network_interfaces", "top_processes"]
+
+def render_all_stats(snapshot: Dict) -> bytes:
+    """/all body assembled from the per-key JSON fragments of a snapshot"""
+    meta = snapshot_meta(snapshot)
+    parts = [b'"' + key.encode() + b'":' + encode_snapshot_value(snapshot, key) for key in ALL_STATS_KEYS]
+    parts.append(b'"sampled_at":' + encode_json(meta["sampled_at"]))
+    parts.append(b'"stale":' + (b"true" if meta["stale"] else b"false"))
+    return b"{" + b",".join(parts) + b"}"
+
+@app.get("/all", tags=["System"], summary="Get all system statistics")
+async def get_all_stats(request: Request):
+    """Get all system statistics in one call"""
+    try:
+        return await snapshot_response(request, "all", render_all_stats)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting all stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/temperature", tags=["System"])
+async def get_temperature(request: Request):
+    """Get system temperature sensors (if available), with each sensor's recent min, max and trend"""
+    return await snapshot_response(request, "temperature")
+
+@app.get("/stream", tags=["Stream"])
+async def stream_snapshots(
+    request: Request,
+    subsystems: Optional[str] = None,
+    interval: Optional[float] = None
+):
+    """Server-Sent Events stream of sampler snapshots.
+    
+    subsystems is a comma separated subset of the /all keys and interval
+    the minimum number of seconds between pushes.
+    """
+    try:
+        selected, push_interval = parse_stream_options(subsystems, interval)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    await sampler.current()
+    
+    async def events():
+        yield f"retry: {int(push_interval * 1000)}\n\n".encode()
+        async for message in snapshot_broadcaster.messages(selected, push_interval):
+            if await request.is_disconnected():
+                break
+            if message is None:
+                yield b": keepalive\n\n"
+            else:
+                yield f"id: {snapshot_broadcaster.version}\nevent: snapshot\ndata: ".encode() + message + b"\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/stream/ws")
+async def stream_snapshots_ws(
+    websocket: WebSocket,
+    subsystems: Optional[str] = None,
+    interval: Optional[float] = None
+):
+    """WebSocket variant of /stream (one JSON text message per push)"""
+    await websocket.accept()
+    try:
+        selected, push_interval = parse_stream_options(subsystems, interval)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    
+    await sampler.current()
+    try:
+        async for message in snapshot_broadcaster.messages(selected, push_interval):
+            if message is not None:
+                await websocket.send_text(message.decode())
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/history/{metric}", tags=["History"])
+async def get_metric_history(
+    metric: str,
+    range_: str = Query("1h", alias="range"),
+    step: str = "1m",
+    agg: str = "avg"
+):
+    """Get downsampled history of a sampled metric"""
+    if metric not in HISTORY_METRICS:
+        raise HTTPException(status_code=404, detail=f"Unknown metric '{metric}'. Available: {', '.join(HISTORY_METRICS)}")
+    if agg not in HISTORY_AGGREGATIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown aggregation '{agg}'. Available: {', '.join(HISTORY_AGGREGATIONS)}")
+    try:
+        range_seconds = parse_duration(range_)
+        step_seconds = parse_duration(step)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if range_seconds / step_seconds > HISTORY_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"range/step must not exceed {HISTORY_MAX_POINTS} points")
+    
+    try:
+        # Align buckets to the step so repeated queries return stable buckets
+        end = math.ceil(time.time() / step_seconds) * step_seconds
+        history = metrics_store if metrics_store is not None else metrics_history
+        try:
+            result = history.query(metric, end - range_seconds, end, step_seconds, agg)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {
+            "metric": metric,
+            "source": result.get("tier", "memory"),
+            "unit": HISTORY_METRICS[metric],
+            "range": range_seconds,
+            "step": step_seconds,
+            "agg": agg,
+            "timestamps": [datetime.fromtimestamp(t).isoformat() for t in result["starts"]],
+            "values": result["values"]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting metric history: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Statistics endpoints for WordPress integration
+# Document statistics
+# Tags tracked per (sosok, site) cell by the top-K sketch
+TAG_SKETCH_CAPACITY = 64
+POPULAR_TAGS_LIMIT = 5
+RECENT_UPLOADS_LIMIT = 10
+# Catalog changes kept for other workers to catch up from; a worker that
+# falls further behind reads the whole catalog again
+DOCUMENT_CHANGE_LOG_LIMIT = 100000
+
+# Catalog row layout
+DOCUMENT_COLUMNS = "file_id, filename, file_type, sosok, site, tags, sections, file_size, uploaded_at"
+(DOC_FILE_ID, DOC_FILENAME, DOC_FILE_TYPE, DOC_SOSOK, DOC_SITE,
+ DOC_TAGS, DOC_SECTIONS, DOC_FILE_SIZE, DOC_UPLOADED_AT) = range(9)
+
+def parse_upload_date(value: Optional[str]) -> float:
+    """Timestamp of a YYYYMMDD or ISO 8601 upload date (now when missing)"""
+    if not value:
+        return time.time()
+    if len(value) == 8 and value.isdigit():
+        return datetime.strptime(value, "%Y%m%d").timestamp()
+    return datetime.fromisoformat(value).timestamp()
+
+def split_tags(tags: str) -> List[str]:
+    return [tag.strip() for tag in tags.split(",") if tag.strip()]
+
+class TopKSketch:
+    """Space-Saving counter that keeps at most capacity tags.
+    
+    A tag arriving when the sketch is full replaces the smallest one and
+    inherits its count, so every frequent tag is kept and its count is
+    overestimated by at most the smallest count. Removals decrement the
+    tag if it is still tracked.
+    """
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+    
+    def add(self, tag: str):
+        counts = self.counts
+        if tag in counts:
+            counts[tag] += 1
+        elif len(counts) < self.capacity:
+            counts[tag] = 1
+        else:
+            smallest = min(counts, key=counts.get)
+            counts[tag] = counts.pop(smallest) + 1
+    
+    def remove(self, tag: str):
+        count = self.counts.get(tag)
+        if count is None:
+            return
+        if count <= 1:
+            del self.counts[tag]
+        else:
+            self.counts[tag] = count - 1
+
+class DayHistogram:
+    """Upload counts per day with lazily maintained prefix sums.
+    
+    counts[i] holds the uploads of day first_day + i (date ordinals) and
+    prefix[i] the sum of counts[:i], so any range of days costs two
+    lookups. Prefix sums are rebuilt only from the earliest day changed
+    since the last query, which for uploads arriving today is the last
+    element.
+    """
+    
+    __slots__ = ("first_day", "counts", "prefix", "_dirty_from")
+    
+    def __init__(self):
+        self.first_day: Optional[int] = None
+        self.counts = array("q")
+        self.prefix = array("q", [0])
+        self._dirty_from = 0
+    
+    def add(self, day: int, delta: int = 1):
+        if self.first_day is None:
+            self.first_day = day
+        elif day < self.first_day:
+            self.counts[0:0] = array("q", bytes(8 * (self.first_day - day)))
+            self.first_day = day
+            self._dirty_from = 0
+        index = day - self.first_day
+        if index >= len(self.counts):
+            self.counts.extend(array("q", bytes(8 * (index + 1 - len(self.counts)))))
+        self.counts[index] += delta
+        self._dirty_from = min(self._dirty_from, index)
+    
+    def _refresh(self):
+        counts, prefix = self.counts, self.prefix
+        if len(prefix) < len(counts) + 1:
+            prefix.extend(array("q", bytes(8 * (len(counts) + 1 - len(prefix)))))
+        running = prefix[self._dirty_from]
+        for index in range(self._dirty_from, len(counts)):
+            running += counts[index]
+            prefix[index + 1] = running
+        self._dirty_from = len(counts)
+    
+    def total(self, first: int, last: int) -> int:
+        """Uploads from day first to day last, inclusive"""
+        if self.first_day is None:
+            return 0
+        if self._dirty_from < len(self.counts):
+            self._refresh()
+        size = len(self.counts)
+        start = min(max(first - self.first_day, 0), size)
+        end = min(max(last - self.first_day + 1, 0), size)
+        return self.prefix[end] - self.prefix[start] if end > start else 0
+
+def upload_day(uploaded_at: float) -> int:
+    return datetime.fromtimestamp(uploaded_at).toordinal()
+
+def day_label(day: date) -> str:
+    """YYYYMMDD; strftime("%Y") doesn't zero-pad years before 1000"""
+    return f"{day.year:04d}{day.month:02d}{day.day:02d}"
+
+class DocumentCell:
+    """Running aggregates of the documents of one (sosok, site) pair"""
+    
+    __slots__ = ("documents", "sections", "by_type", "tags", "recent", "days")
+    
+    def __init__(self):
+        self.documents = 0
+        self.sections = 0
+        self.by_type: Dict[str, int] = {}
+        self.tags = TopKSketch(TAG_SKETCH_CAPACITY)
+        # Newest catalog rows, oldest first
+        self.recent = deque(maxlen=RECENT_UPLOADS_LIMIT)
+        self.days = DayHistogram()
+
+class DocumentStatistics:
+    """Document catalog in SQLite with aggregates kept in memory.
+    
+    The catalog is read once at startup; after that every recorded or
+    deleted document updates the counters of its (sosok, site) cell, so a
+    filtered query only touches the matching cells, never the documents.
+    Other workers sharing the catalog file commit too: every change is also
+    appended to document_changes, and when SQLite's data_version says
+    another connection committed, only the changes past the last one seen
+    are applied.
+    """
+    
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "file_id TEXT PRIMARY KEY, filename TEXT NOT NULL, file_type TEXT NOT NULL, "
+            "sosok TEXT NOT NULL, site TEXT NOT NULL, tags TEXT NOT NULL, "
+            "sections INTEGER NOT NULL, file_size INTEGER NOT NULL, uploaded_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_cell ON documents (sosok, site, uploaded_at)")
+        # removed is 1 for a row leaving the catalog, 0 for one entering it
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS document_changes ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, removed INTEGER NOT NULL, "
+            "file_id TEXT NOT NULL, filename TEXT NOT NULL, file_type TEXT NOT NULL, "
+            "sosok TEXT NOT NULL, site TEXT NOT NULL, tags TEXT NOT NULL, "
+            "sections INTEGER NOT NULL, file_size INTEGER NOT NULL, uploaded_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self.cells: Dict[tuple, DocumentCell] = {}
+        self._version: Optional[int] = None
+        # Last change applied to the aggregates; None forces a full read
+        self._seen: Optional[int] = None
+        self._sync()
+    
+    def _sync(self):
+        """Apply the changes other connections committed since the last call"""
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._version:
+            return
+        self._version = version
+        oldest = self._db.execute("SELECT MIN(seq) FROM document_changes").fetchone()[0]
+        if self._seen is None or (oldest is not None and oldest > self._seen + 1):
+            self._rebuild()
+            return
+        for seq, removed, *row in self._db.execute(
+            f"SELECT seq, removed, {DOCUMENT_COLUMNS} FROM document_changes WHERE seq > ? ORDER BY seq",
+            (self._seen,)
+        ).fetchall():
+            if removed:
+                self._remove(tuple(row))
+            else:
+                self._add(tuple(row))
+            self._seen = seq
+    
+    def _rebuild(self):
+        # One read transaction, so the watermark matches the rows read
+        started = not self._db.in_transaction
+        if started:
+            self._db.execute("BEGIN")
+        try:
+            self.cells.clear()
+            self._seen = self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM document_changes").fetchone()[0]
+            for row in self._db.execute(f"SELECT {DOCUMENT_COLUMNS} FROM documents ORDER BY uploaded_at"):
+                self._add(row)
+        finally:
+            if started:
+                self._db.commit()
+    
+    def _log(self, row: tuple, removed: bool):
+        self._seen = self._db.execute(
+            f"INSERT INTO document_changes (removed, {DOCUMENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (int(removed), *row)
+        ).lastrowid
+    
+    def _write(self, apply):
+        """Run apply(), which changes catalog and aggregates together, in one write transaction"""
+        # Taking the write lock up front means no other worker can commit
+        # between catching up and logging our own changes
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._sync()
+            result = apply()
+            self._db.execute("DELETE FROM document_changes WHERE seq <= ?", (self._seen - DOCUMENT_CHANGE_LOG_LIMIT,))
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            # The aggregates may hold part of the batch; read them again
+            self._seen = None
+            self._version = None
+            raise
+        return result
+    
+    def _add(self, row: tuple):
+        key = (row[DOC_SOSOK], row[DOC_SITE])
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = DocumentCell()
+        cell.documents += 1
+        cell.sections += row[DOC_SECTIONS]
+        cell.by_type[row[DOC_FILE_TYPE]] = cell.by_type.get(row[DOC_FILE_TYPE], 0) + 1
+        for tag in split_tags(row[DOC_TAGS]):
+            cell.tags.add(tag)
+        cell.days.add(upload_day(row[DOC_UPLOADED_AT]))
+        
+        recent = cell.recent
+        if row in recent:
+            # Already read by a refill that ran ahead of the changes being applied
+            pass
+        elif not recent or row[DOC_UPLOADED_AT] >= recent[-1][DOC_UPLOADED_AT]:
+            recent.append(row)
+        elif len(recent) < recent.maxlen or row[DOC_UPLOADED_AT] > recent[0][DOC_UPLOADED_AT]:
+            # A backdated upload that still belongs among the newest
+            rows = sorted([*recent, row], key=lambda r: r[DOC_UPLOADED_AT])
+            recent.clear()
+            recent.extend(rows[-recent.maxlen:])
+    
+    def _remove(self, row: tuple):
+        key = (row[DOC_SOSOK], row[DOC_SITE])
+        cell = self.cells[key]
+        cell.documents -= 1
+        cell.sections -= row[DOC_SECTIONS]
+        remaining = cell.by_type[row[DOC_FILE_TYPE]] - 1
+        if remaining:
+            cell.by_type[row[DOC_FILE_TYPE]] = remaining
+        else:
+            del cell.by_type[row[DOC_FILE_TYPE]]
+        for tag in split_tags(row[DOC_TAGS]):
+            cell.tags.remove(tag)
+        cell.days.add(upload_day(row[DOC_UPLOADED_AT]), -1)
+        
+        if cell.documents == 0:
+            del self.cells[key]
+        elif row in cell.recent:
+            # Refill from the catalog so the cell keeps its newest rows
+            cell.recent.clear()
+            cell.recent.extend(reversed(self._db.execute(
+                f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE sosok = ? AND site = ? "
+                "ORDER BY uploaded_at DESC LIMIT ?",
+                (key[0], key[1], RECENT_UPLOADS_LIMIT)
+            ).fetchall()))
+    
+    def _fetch(self, file_id: str) -> Optional[tuple]:
+        return self._db.execute(f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE file_id = ?", (file_id,)).fetchone()
+    
+    def record(self, documents: List[DocumentRecord]) -> int:
+        """Insert or replace documents in the catalog and the aggregates"""
+        # Parse everything first so a bad date rejects the whole batch
+        rows = [
+            (
+                document.file_id,
+                document.filename,
+                (document.file_type or os.path.splitext(document.filename)[1].lstrip(".") or "unknown").lower(),
+                document.sosok,
+                document.site,
+                ",".join(split_tags(document.tags)),
+                document.sections,
+                document.file_size,
+                parse_upload_date(document.upload_date)
+            )
+            for document in documents
+        ]
+        
+        def apply():
+            for row in rows:
+                previous = self._fetch(row[DOC_FILE_ID])
+                if previous is not None:
+                    # Out of the catalog first, so refilling recent uploads can't pick up the new row
+                    self._db.execute("DELETE FROM documents WHERE file_id = ?", (row[DOC_FILE_ID],))
+                    self._log(previous, True)
+                    self._remove(previous)
+                self._db.execute(f"INSERT INTO documents ({DOCUMENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+                self._log(row, False)
+                self._add(row)
+        
+        with self._lock:
+            self._write(apply)
+        return len(rows)
+    
+    def delete(self, file_id: str) -> bool:
+        def apply():
+            previous = self._fetch(file_id)
+            if previous is None:
+                return False
+            self._db.execute("DELETE FROM documents WHERE file_id = ?", (file_id,))
+            self._log(previous, True)
+            self._remove(previous)
+            return True
+        
+        with self._lock:
+            return self._write(apply)
+    
+    def _matching(self, sosok: Optional[str], site: Optional[str]) -> List[tuple]:
+        return [
+            (key, cell) for key, cell in self.cells.items()
+            if (sosok is None or key[0] == sosok) and (site is None or key[1] == site)
+        ]
+    
+    def uploads_by_date(self, buckets: List[tuple], sosok: Optional[str] = None, site: Optional[str] = None) -> List[int]:
+        """Upload counts per (first day, last day) bucket for the matching cells"""
+        with self._lock:
+            self._sync()
+            histograms = [cell.days for _, cell in self._matching(sosok, site)]
+            return [sum(histogram.total(first, last) for histogram in histograms) for first, last in buckets]
+    
+    def query(self, sosok: Optional[str] = None, site: Optional[str] = None) -> Dict:
+        """/statistics/ body for the documents matching the filters"""
+        with self._lock:
+            self._sync()
+            cells = self._matching(sosok, site)
+            by_type: Dict[str, int] = {}
+            by_sosok: Dict[str, int] = {}
+            by_site: Dict[str, int] = {}
+            tags: Dict[str, int] = {}
+            for (cell_sosok, cell_site), cell in cells:
+                by_sosok[cell_sosok] = by_sosok.get(cell_sosok, 0) + cell.documents
+                by_site[cell_site] = by_site.get(cell_site, 0) + cell.documents
+                for file_type, count in cell.by_type.items():
+                    by_type[file_type] = by_type.get(file_type, 0) + count
+                for tag, count in cell.tags.counts.items():
+                    tags[tag] = tags.get(tag, 0) + count
+            
+            total_documents = sum(cell.documents for _, cell in cells)
+            total_sections = sum(cell.sections for _, cell in cells)
+            recent = heapq.nlargest(
+                RECENT_UPLOADS_LIMIT,
+                (row for _, cell in cells for row in cell.recent),
+                key=lambda row: row[DOC_UPLOADED_AT]
+            )
+        
+        def ranked(counts: Dict[str, int]) -> Dict[str, int]:
+            return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+        
+        return {
+            "total_documents": total_documents,
+            "total_sections": total_sections,
+            "average_sections_per_document": round(total_sections / total_documents, 2) if total_documents else 0.0,
+            "documents_by_type": ranked(by_type),
+            "documents_by_sosok": ranked(by_sosok),
+            "documents_by_site": ranked(by_site),
+            "popular_tags": [
+                {"name": tag, "count": count}
+                for tag, count in heapq.nlargest(POPULAR_TAGS_LIMIT, tags.items(), key=lambda item: item[1])
+            ],
+            "recent_uploads": [
+                {
+                    "filename": row[DOC_FILENAME],
+                    "sosok": row[DOC_SOSOK],
+                    "site": row[DOC_SITE],
+                    "upload_date": day_label(datetime.fromtimestamp(row[DOC_UPLOADED_AT])),
+                    "tags": row[DOC_TAGS]
+                }
+                for row in recent
+            ]
+        }
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+document_statistics = DocumentStatistics(DOCUMENT_CATALOG)
+
+@app.get("/statistics/", tags=["Statistics"])
+async def get_statistics(
+    sosok: Optional[str] = None,
+    site: Optional[str] = None
+):
+    """Get document statistics"""
+    try:
+        # Administrators see every document; anyone else only their own sosok and site
+        if sosok == "관리자" and site == "관리자":
+            sosok = site = None
+        # Off the loop: the query waits for any batch record() is writing
+        return await asyncio.to_thread(document_statistics.query, sosok or None, site or None)
+    except Exception as e:
+        logger.error(f"Error getting statistics: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/statistics/documents", tags=["Statistics"])
+async def record_documents(documents: List[DocumentRecord]):
+    """Record uploaded (or updated) documents in the statistics catalog"""
+    try:
+        recorded = await asyncio.to_thread(document_statistics.record, documents)
+        return {"recorded": recorded}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error recording documents: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/statistics/documents/{file_id}", tags=["Statistics"])
+async def delete_document(file_id: str):
+    """Remove a deleted document from the statistics catalog"""
+    if not await asyncio.to_thread(document_statistics.delete, file_id):
+        raise HTTPException(status_code=404, detail=f"Document {file_id} not found")
+    return {"deleted": file_id}
+
+# Bucket sizes accepted by /statistics/uploads-by-date
+UPLOAD_BUCKETS = ["day", "week", "month"]
+# Upper bound on buckets returned by one query, and on the days it spans
+UPLOAD_MAX_BUCKETS = 3660
+UPLOAD_MAX_DAYS = 36600
+
+def parse_day(value: str) -> date:
+    """A YYYYMMDD or YYYY-MM-DD date"""
+    if len(value) == 8 and value.isdigit():
+        return datetime.strptime(value, "%Y%m%d").date()
+    return date.fromisoformat(value)
+
+def bucket_count(start: date, end: date, bucket: str) -> int:
+    """Number of buckets date_buckets() returns, without building them"""
+    if bucket == "week":
+        return (end - (start - timedelta(days=start.weekday()))).days // 7 + 1
+    if bucket == "month":
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return (end - start).days + 1
+
+def date_buckets(start: date, end: date, bucket: str) -> List[tuple]:
+    """(label date, first day, last day) per bucket, clipped to start and end"""
+    buckets = []
+    first = start
+    end_day = end.toordinal()
+    while True:
+        # Ordinals, so the bucket after 9999-12-31 is never computed
+        if bucket == "week":
+            last = first.toordinal() + 6 - first.weekday()
+        elif bucket == "month":
+            last = first.toordinal() + calendar.monthrange(first.year, first.month)[1] - first.day
+        else:
+            last = first.toordinal()
+        last = min(last, end_day)
+        buckets.append((first, first.toordinal(), last))
+        if last == end_day:
+            return buckets
+        first = date.fromordinal(last + 1)
+
+@app.get("/statistics/uploads-by-date", tags=["Statistics"])
+async def get_uploads_by_date(
+    days: int = Query(30, ge=1, le=UPLOAD_MAX_DAYS, description="Days up to end, when start is not given"),
+    sosok: Optional[str] = None,
+    site: Optional[str] = None,
+    start: Optional[str] = Query(None, description="First day, YYYYMMDD or YYYY-MM-DD"),
+    end: Optional[str] = Query(None, description="Last day, YYYYMMDD or YYYY-MM-DD (default today)"),
+    bucket: str = Query("day", description="day, week or month")
+):
+    """Get upload statistics by date"""
+    try:
+        last = parse_day(end) if end else date.today()
+        first = parse_day(start) if start else last - timedelta(days=days - 1)
+    except (ValueError, OverflowError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {str(e)}")
+    if first > last:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if bucket not in UPLOAD_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Unknown bucket: {bucket}. Available: {', '.join(UPLOAD_BUCKETS)}")
+    if bucket_count(first, last, bucket) > UPLOAD_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"At most {UPLOAD_MAX_BUCKETS} {bucket} buckets; narrow the range or use a larger bucket")
+    
+    try:
+        buckets = date_buckets(first, last, bucket)
+        # Same visibility as /statistics/
+        if sosok == "관리자" and site == "관리자":
+            sosok = site = None
+        counts = await asyncio.to_thread(
+            document_statistics.uploads_by_date,
+            [(first_day, last_day) for _, first_day, last_day in buckets], sosok or None, site or None
+        )
+        
+        return {
+            "dates": [day_label(label) for label, _, _ in buckets],
+            "counts": counts,
+            "total": sum(counts),
+            "bucket": bucket
+        }
+    except Exception as e:
+        logger.error(f"Error getting uploads by date: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Storage scanner
+# Extensions listed separately in size_by_type_mb; the rest are summed as "others"
+STORAGE_TYPES_LIMIT = 10
+
+class DirectoryRecord:
+    """What one listing of a directory found"""
+    
+    __slots__ = ("mtime_ns", "files", "subdirs")
+    
+    def __init__(self, mtime_ns: int, files: Dict[str, list], subdirs: List[str]):
+        self.mtime_ns = mtime_ns
+        # extension -> [file count, total bytes]
+        self.files = files
+        self.subdirs = subdirs
+
+def file_extension(name: str) -> str:
+    return os.path.splitext(name)[1].lstrip(".").lower() or "none"
+
+class StorageScanner:
+    """Incremental, parallel walk of the document directories.
+    
+    Directories are listed with os.scandir on a thread pool. Every
+    directory keeps a record of its mtime, its files' count and size per
+    extension, and its subdirectories; a directory whose mtime has not
+    changed is not listed again, only its subdirectories are checked.
+    Rewriting a file in place does not touch its directory's mtime, so a
+    full rescan runs every full_interval seconds. Totals are adjusted by
+    the difference of each changed record instead of being summed again.
+    """
+    
+    def __init__(self, roots: List[str], workers: int, interval: float, full_interval: float):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.workers = max(1, workers)
+        self.interval = interval
+        self.full_interval = full_interval
+        self._records: Dict[str, DirectoryRecord] = {}
+        self._totals: Dict[str, list] = {}
+        self._last_full: Optional[float] = None
+        self._pool = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self.scanning = False
+        self.progress: Dict[str, int] = {}
+        self.last_scan: Optional[Dict] = None
+        self.result: Optional[Dict] = None
+    
+    def start(self):
+        if self.roots and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+    
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.scan)
+            except Exception as e:
+                logger.error(f"Error scanning storage: {str(e)}")
+            await asyncio.sleep(self.interval)
+    
+    @staticmethod
+    def _list(path: str, cached: Optional[DirectoryRecord], full: bool) -> tuple:
+        """(path, record, listed) for one directory; record is None if it is gone"""
+        try:
+            mtime_ns = os.stat(path, follow_symlinks=False).st_mtime_ns
+            if cached is not None and not full and cached.mtime_ns == mtime_ns:
+                return path, cached, False
+            
+            files: Dict[str, list] = {}
+            subdirs = []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            extension = file_extension(entry.name)
+                            totals = files.get(extension)
+                            if totals is None:
+                                totals = files[extension] = [0, 0]
+                            totals[0] += 1
+                            totals[1] += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        # Removed while listing
+                        continue
+            return path, DirectoryRecord(mtime_ns, files, subdirs), True
+        except FileNotFoundError:
+            return path, None, True
+        except OSError as e:
+            # Unreadable for now; keep what was known about it
+            logger.warning(f"Error listing {path}: {str(e)}")
+            return path, cached, False
+    
+    def _apply(self, files: Dict[str, list], sign: int):
+        for extension, (count, size) in files.items():
+            totals = self._totals.get(extension)
+            if totals is None:
+                totals = self._totals[extension] = [0, 0]
+            totals[0] += sign * count
+            totals[1] += sign * size
+            if totals[0] <= 0:
+                del self._totals[extension]
+    
+    def scan(self):
+        """Walk every root once (blocking) and publish the new totals"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="storage-scan")
+        started = time.monotonic()
+        full = self._last_full is None or started - self._last_full >= self.full_interval
+        previous = self._records
+        records: Dict[str, DirectoryRecord] = {}
+        seen = set(self.roots)
+        self.scanning = True
+        self.progress = {"directories": 0, "listed": 0, "reused": 0, "files": 0, "pending": 0}
+        failed = True
+        
+        try:
+            pending = {self._pool.submit(self._list, root, previous.get(root), full) for root in self.roots}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, record, listed = future.result()
+                    if record is None:
+                        continue
+                    records[path] = record
+                    self.progress["directories"] += 1
+                    self.progress["listed" if listed else "reused"] += 1
+                    self.progress["files"] += sum(count for count, _ in record.files.values())
+                    for subdir in record.subdirs:
+                        if subdir not in seen:
+                            seen.add(subdir)
+                            pending.add(self._pool.submit(self._list, subdir, previous.get(subdir), full))
+                self.progress["pending"] = len(pending)
+            
+            with self._lock:
+                for path, record in records.items():
+                    old = previous.get(path)
+                    if old is not record:
+                        if old is not None:
+                            self._apply(old.files, -1)
+                        self._apply(record.files, 1)
+                for path in previous.keys() - records.keys():
+                    self._apply(previous[path].files, -1)
+                self._records = records
+                if full:
+                    self._last_full = started
+                self.result = self._summarize()
+                self.last_scan = {
+                    "finished_at": datetime.now().isoformat(),
+                    "duration_seconds": round(time.monotonic() - started, 3),
+                    "full": full,
+                    "directories": self.progress["directories"],
+                    "listed": self.progress["listed"],
+                    "reused": self.progress["reused"]
+                }
+            failed = False
+        finally:
+            self.scanning = False
+            self_timings.observe("storage_scan_duration", ("full" if full else "incremental",), time.monotonic() - started, failed)
+    
+    def _summarize(self) -> Dict:
+        total_size = sum(size for _, size in self._totals.values())
+        file_count = sum(count for count, _ in self._totals.values())
+        ranked = sorted(self._totals.items(), key=lambda item: item[1][1], reverse=True)
+        size_by_type = {extension: format_bytes(size, "MB") for extension, (_, size) in ranked[:STORAGE_TYPES_LIMIT]}
+        if len(ranked) > STORAGE_TYPES_LIMIT:
+            size_by_type["others"] = format_bytes(sum(size for _, (_, size) in ranked[STORAGE_TYPES_LIMIT:]), "MB")
+        return {
+            "total_size": total_size,
+            "total_size_gb": format_bytes(total_size),
+            "file_count": file_count,
+            "average_file_size": total_size // file_count if file_count else 0,
+            "size_by_type_mb": size_by_type,
+            "count_by_type": {extension: count for extension, (count, _) in ranked}
+        }
+    
+    def report(self) -> Dict:
+        with self._lock:
+            result = self.result or self._summarize()
+            if not self.roots:
+                status = "disabled"
+            elif self.scanning:
+                status = "scanning"
+            else:
+                status = "idle" if self.last_scan else "pending"
+            return {
+                **result,
+                "directories": self.roots,
+                "scan": {
+                    "status": status,
+                    "progress": dict(self.progress) if self.scanning else None,
+                    "last_scan": self.last_scan
+                }
+            }
+
+storage_scanner = StorageScanner(STORAGE_SCAN_DIRS, STORAGE_SCAN_WORKERS, STORAGE_SCAN_INTERVAL, STORAGE_FULL_SCAN_INTERVAL)
+
+@app.get("/statistics/storage", tags=["Statistics"])
 async def get_storage_statistics(
     sosok: Optional[str] = None,
     site: Optional[str] = None
@@ -684,27 +4280,280 @@ async def get_storage_statistics(
                 "message": "저장소 통계는 관리자만 볼 수 있습니다."
             }
         
-        # Return mock storage data
-        return {
-            "total_size": 107374182400,  # 100 GB in bytes
-            "total_size_gb": 100.0,
-            "file_count": 15234,
-            "average_file_size": 7048576,  # 7 MB average
-            "size_by_type_mb": {
-                "pdf": 45678.5,
-                "hwp": 23456.7,
-                "docx": 12345.8,
-                "pptx": 8901.2,
-                "txt": 3456.9,
-                "others": 6160.9
-            }
-        }
+        # Totals of the last completed scan; scanning happens in the background
+        return collector_report("storage", storage_scanner.report)
     except Exception as e:
         logger.error(f"Error getting storage statistics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Federation
+# ServerStatisticsResponse slot filled by each peer role
+FEDERATION_ROLES = ["ai_server", "vector_store"]
+
+class FederationPeer:
+    """A configured peer agent and the last state polled from it"""
+    
+    def __init__(self, name: str, role: str, url: str, timeout: float = 2.0,
+                 gpu_url: Optional[str] = None, collection: Optional[str] = None):
+        if role not in FEDERATION_ROLES:
+            raise ValueError(f"Unknown role {role!r} for peer {name!r}. Available: {', '.join(FEDERATION_ROLES)}")
+        self.name = name
+        self.role = role
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.gpu_url = gpu_url
+        self.collection = collection
+        # Last good values, kept while the peer is unreachable
+        self.info = None
+        self.online = False
+        self.last_success: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.latency = 0.0
+        self.failures = 0
+        self._etag: Optional[str] = None
+        self._body: Optional[Dict] = None
+        self._gpu: Optional[Dict] = None
+
+def parse_federation_peers(config: str) -> List[FederationPeer]:
+    """Peers from the FEDERATION_PEERS JSON list"""
+    if not config.strip():
+        return []
+    try:
+        return [FederationPeer(**entry) for entry in json.loads(config)]
+    except (TypeError, ValueError) as e:
+        logger.error(f"Invalid FEDERATION_PEERS, federation disabled: {str(e)}")
+        return []
+
+def ai_server_from_stats(stats: Dict, gpu: Optional[Dict]) -> AIServerInfo:
+    """AIServerInfo from the /all body of a peer running this API"""
+    system, cpu, memory, network = stats["system"], stats["cpu"], stats["memory"], stats["network"]
+    disks = stats.get("disk") or []
+    root = next((d for d in disks if d["mountpoint"] == "/"), disks[0] if disks else None)
+    
+    return AIServerInfo(
+        hostname=system["hostname"],
+        ip_address=system["ip_address"],
+        platform=f"{system['platform']} {system['platform_release']}",
+        python_version=system["python_version"],
+        uptime=parse_uptime_to_korean(system["uptime"]),
+        cpu=ServerCPUInfo(
+            percent=cpu["percent"],
+            count=cpu["count"] or cpu["count_logical"],
+            freq_current=cpu["freq_current"]
+        ),
+        memory=ServerMemoryInfo(
+            percent=memory["percent"],
+            total_gb=memory["total_gb"],
+            used_gb=memory["used_gb"]
+        ),
+        disk=ServerDiskInfo(
+            percent=root["percent"],
+            total_gb=root["total_gb"],
+            used_gb=root["used_gb"]
+        ) if root else ServerDiskInfo(percent=0.0, total_gb=0.0, used_gb=0.0),
+        network=ServerNetworkInfo(
+            bytes_sent_mb=network["bytes_sent_mb"],
+            bytes_recv_mb=network["bytes_recv_mb"]
+        ),
+        gpu=gpu,
+        top_processes=[
+            ServerProcessInfo(name=p["name"], cpu_percent=p["cpu_percent"], memory_mb=p["memory_mb"])
+            for p in stats.get("top_processes") or []
+        ]
+    )
+
+def vector_store_from_stats(stats: Dict, collection: Optional[str]) -> VectorStoreInfo:
+    """VectorStoreInfo from a JSON document carrying any of its fields"""
+    fields = {key: stats[key] for key in ("type", "unique_documents", "total_vectors", "collection") if key in stats}
+    if collection:
+        fields.setdefault("collection", collection)
+    return VectorStoreInfo(**fields)
+
+def offline_server_info(peer: FederationPeer):
+    """Placeholder for a peer that has never answered"""
+    if peer.role == "vector_store":
+        return VectorStoreInfo(status="offline", collection=peer.collection or "documents")
+    return AIServerInfo(
+        status="offline",
+        hostname=peer.name,
+        ip_address=urlsplit(peer.url).hostname or "-",
+        platform="-",
+        python_version="-",
+        uptime="-",
+        cpu=ServerCPUInfo(percent=0.0, count=0, freq_current=None),
+        memory=ServerMemoryInfo(percent=0.0, total_gb=0.0, used_gb=0.0),
+        disk=ServerDiskInfo(percent=0.0, total_gb=0.0, used_gb=0.0),
+        network=ServerNetworkInfo(bytes_sent_mb=0.0, bytes_recv_mb=0.0),
+        top_processes=[]
+    )
+
+class FederationPoller:
+    """Polls the configured peer agents concurrently in the background.
+    
+    All peers share one pooled httpx.AsyncClient. Each poll is bounded by
+    the peer's timeout and revalidates with the previous ETag, so a peer
+    whose snapshot has not changed answers 304. A peer that stops
+    answering keeps its last good values, reported as offline and, after
+    stale_after seconds, as stale. version changes with any peer's state,
+    so request handlers only read what the last poll left behind.
+    """
+    
+    def __init__(self, peers: List[FederationPeer], interval: float):
+        self.peers = peers
+        self.interval = interval
+        self.stale_after = max(STALE_AFTER, interval * 3)
+        self.version = 0
+        self._client = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if not self.peers or self._task is not None:
+            return
+        if httpx is None:
+            logger.error("FEDERATION_PEERS is set but httpx is not installed; peers are not polled")
+            return
+        connections = len(self.peers) * 2
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+            headers={"Accept": "application/json"}
+        )
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            await self.poll()
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+    
+    async def poll(self):
+        """Poll every peer once, concurrently"""
+        await asyncio.gather(*(self._poll_peer(peer) for peer in self.peers))
+    
+    async def _get(self, peer: FederationPeer, url: str, etag: Optional[str] = None):
+        headers = {"If-None-Match": etag} if etag else None
+        response = await self._client.get(url, headers=headers, timeout=peer.timeout)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+    
+    async def _poll_peer(self, peer: FederationPeer):
+        started = time.perf_counter()
+        was_online = peer.online
+        failed = False
+        try:
+            changed = await asyncio.wait_for(self._collect(peer), peer.timeout)
+        except Exception as e:
+            failed = True
+            peer.online = False
+            peer.failures += 1
+            peer.last_error = str(e) or type(e).__name__
+            if was_online:
+                logger.warning(f"Peer {peer.name} is offline: {peer.last_error}")
+                self.version += 1
+        else:
+            peer.online = True
+            peer.failures = 0
+            peer.last_error = None
+            peer.last_success = time.time()
+            if not was_online:
+                logger.info(f"Peer {peer.name} is online")
+            if changed or not was_online:
+                self.version += 1
+        peer.latency = time.perf_counter() - started
+        self_timings.observe("peer_fetch_duration", (peer.name,), peer.latency, failed)
+    
+    async def _collect(self, peer: FederationPeer) -> bool:
+        """Fetch a peer and rebuild its info; False when nothing changed"""
+        url = peer.url if peer.role == "vector_store" else f"{peer.url}/all"
+        if peer.gpu_url:
+            # The GPU endpoint is optional; its failure leaves the peer online
+            response, gpu = await asyncio.gather(
+                self._get(peer, url, peer._etag), self._get(peer, peer.gpu_url), return_exceptions=True
+            )
+            if isinstance(response, BaseException):
+                raise response
+            gpu = None if isinstance(gpu, BaseException) else gpu.json()
+        else:
+            response, gpu = await self._get(peer, url, peer._etag), None
+        
+        if response.status_code == 304 and gpu == peer._gpu:
+            return False
+        if response.status_code != 304:
+            peer._body = response.json()
+            peer._etag = response.headers.get("etag")
+        peer._gpu = gpu
+        
+        if peer.role == "vector_store":
+            peer.info = vector_store_from_stats(peer._body, peer.collection)
+        else:
+            peer.info = ai_server_from_stats(peer._body, gpu)
+        return True
+    
+    def server_info(self, role: str):
+        """Latest info of the peer with this role, or None when none is configured"""
+        peer = next((p for p in self.peers if p.role == role), None)
+        if peer is None:
+            return None
+        info = peer.info or offline_server_info(peer)
+        return info.model_copy(update={
+            "status": "online" if peer.online else "offline",
+            "last_seen": datetime.fromtimestamp(peer.last_success).isoformat() if peer.last_success else None,
+            "stale": peer.last_success is None or time.time() - peer.last_success > self.stale_after
+        })
+    
+    def report(self) -> List[Dict]:
+        now = time.time()
+        return [
+            {
+                "name": peer.name,
+                "role": peer.role,
+                "url": peer.url,
+                "status": "online" if peer.online else "offline",
+                "last_seen": datetime.fromtimestamp(peer.last_success).isoformat() if peer.last_success else None,
+                "age_seconds": round(now - peer.last_success, 3) if peer.last_success else None,
+                "latency_ms": round(peer.latency * 1000, 2),
+                "failures": peer.failures,
+                "last_error": peer.last_error
+            }
+            for peer in self.peers
+        ]
+
+federation = FederationPoller(parse_federation_peers(FEDERATION_PEERS), FEDERATION_INTERVAL)
+
+def federation_servers() -> Dict:
+    """Latest info per federation role, plus the poller's version"""
+    servers = {role: federation.server_info(role) for role in FEDERATION_ROLES}
+    servers["version"] = federation.version
+    return servers
+
+def render_server_statistics(snapshot: Dict) -> bytes:
+    """Admin /statistics/servers body for a snapshot"""
+    web_server = snapshot.get("web_server")
+    if web_server is None:
+        raise HTTPException(status_code=503, detail="web_server metrics are not available yet")
+    
+    servers = collector_report("servers", federation_servers)
+    return encode_json(ServerStatisticsResponse(
+        ai_server=servers["ai_server"],
+        web_server=web_server,
+        vector_store=servers["vector_store"]
+    ))
+
 @app.get("/statistics/servers", response_model=ServerStatisticsResponse, tags=["Statistics"])
 async def get_server_statistics(
+    request: Request,
     sosok: Optional[str] = None,
     site: Optional[str] = None
 ):
@@ -720,162 +4569,623 @@ async def get_server_statistics(
                 message="서버 통계는 관리자만 볼 수 있습니다."
             )
         
-        # Get current system stats
-        cpu_percent = psutil.cpu_percent(interval=1)
-        cpu_freq = psutil.cpu_freq()
-        memory = psutil.virtual_memory()
-        disk = get_main_disk_usage()
-        network = psutil.net_io_counters()
-        
-        # Create Web Server info with full system details
-        web_server = WebServerInfo(
-            name="WEB Server",
-            status="online",
-            hostname=socket.gethostname(),
-            ip_address=get_ip_address(),
-            os_info=get_os_info(),
-            platform=f"{platform.system()} {platform.release()}",
-            uptime=get_uptime_string(),
-            cpu=ServerCPUInfo(
-                percent=cpu_percent,
-                count=psutil.cpu_count(logical=False) or psutil.cpu_count(),
-                freq_current=round(cpu_freq.current, 2) if cpu_freq else None
-            ),
-            memory=ServerMemoryInfo(
-                percent=memory.percent,
-                total_gb=format_bytes(memory.total),
-                used_gb=format_bytes(memory.used)
-            ),
-            disk=disk,
-            network=ServerNetworkInfo(
-                bytes_sent_mb=format_bytes(network.bytes_sent, "MB"),
-                bytes_recv_mb=format_bytes(network.bytes_recv, "MB")
-            ),
-            top_processes=get_top_processes(5)
-        )
-        
-        # Mock AI Server info (in production, this would come from actual AI server)
-        # Updated to use Korean uptime format
-        boot_time_mock = datetime.now() - timedelta(days=10, hours=5, minutes=30, seconds=45)
-        uptime_mock = datetime.now() - boot_time_mock
-        days = uptime_mock.days
-        hours, remainder = divmod(uptime_mock.seconds, 3600)
-        minutes, seconds = divmod(remainder, 60)
-        
-        # Format as "X일 X시간 X분 X초"
-        ai_uptime_str = ""
-        if days > 0:
-            ai_uptime_str += f"{days}일 "
-        if hours > 0:
-            ai_uptime_str += f"{hours}시간 "
-        if minutes > 0:
-            ai_uptime_str += f"{minutes}분 "
-        if seconds > 0 or ai_uptime_str == "":
-            ai_uptime_str += f"{seconds}초"
-        ai_uptime_str = ai_uptime_str.strip()
-        
-        ai_server = AIServerInfo(
-            name="AI Server",
-            status="online",
-            hostname="ai-server",
-            ip_address="192.168.1.101",
-            platform="Linux",
-            python_version="3.11.5",
-            uptime=ai_uptime_str,
-            cpu=ServerCPUInfo(
-                percent=35.5,
-                count=8,
-                freq_current=2400.0
-            ),
-            memory=ServerMemoryInfo(
-                percent=62.3,
-                total_gb=32.0,
-                used_gb=19.9
-            ),
-            disk=ServerDiskInfo(
-                percent=45.8,
-                total_gb=500.0,
-                used_gb=229.0
-            ),
-            network=ServerNetworkInfo(
-                bytes_sent_mb=1024.5,
-                bytes_recv_mb=2048.7
-            ),
-            gpu={
-                "available": True,
-                "count": 1,
-                "devices": [{
-                    "index": 0,
-                    "name": "NVIDIA GeForce RTX 3090",
-                    "utilization": 85,
-                    "memory": {
-                        "total": 24576,
-                        "used": 18432,
-                        "free": 6144,
-                        "percent": 75.0
-                    },
-                    "temperature": 72,
-                    "power": {
-                        "draw": 320.5,
-                        "limit": 350.0
-                    }
-                }]
-            },
-            top_processes=[
-                ServerProcessInfo(name="python", cpu_percent=25.5, memory_mb=2048),
-                ServerProcessInfo(name="uvicorn", cpu_percent=8.2, memory_mb=512),
-                ServerProcessInfo(name="chromadb", cpu_percent=5.1, memory_mb=1024)
-            ]
-        )
-        
-        # Mock Vector Store info
-        vector_store = VectorStoreInfo(
-            name="Vector Store",
-            status="online",
-            type="ChromaDB",
-            unique_documents=15234,
-            total_vectors=45678,
-            collection="documents"
-        )
-        
         # Return full server information
-        return ServerStatisticsResponse(
-            ai_server=ai_server,
-            web_server=web_server,
-            vector_store=vector_store
-        )
+        # Peer updates between samples change the body as well
+        return await snapshot_response(request, "servers", render_server_statistics, str(collector_report("servers", federation_servers)["version"]))
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting server statistics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/all", tags=["System"], summary="Get all system statistics")
-async def get_all_system_stats():
-    """Get all system statistics including uptime in Korean format"""
+# Rules evaluated when ALERT_RULES is not set
+DEFAULT_ALERT_RULES = [
+    "cpu.percent > 90 for 5m",
+    "memory.percent > 95 for 5m",
+    "disk / > 95%",
+    "temperature > 80°C for 1m",
+    "peer ai_server offline for 1m",
+]
+# Share of the threshold a value must move back past before a firing alert resolves
+ALERT_HYSTERESIS = 0.05
+# Alert state changes kept for /alerts
+ALERT_HISTORY_LIMIT = 100
+
+THRESHOLD_RULE = re.compile(
+    r"^(?P<metric>.+?)\s*(?P<op>>=|<=|>|<)\s*(?P<threshold>-?\d+(?:\.\d+)?)\s*(?:%|°C|C)?"
+    r"(?:\s+for\s+(?P<duration>\S+))?(?:\s+clear\s+(?P<clear>-?\d+(?:\.\d+)?))?$"
+)
+PEER_RULE = re.compile(r"^peer\s+(?P<peer>\S+)\s+offline(?:\s+for\s+(?P<duration>\S+))?$")
+ALERT_OPERATORS = {
+    ">": lambda value, threshold: value > threshold,
+    ">=": lambda value, threshold: value >= threshold,
+    "<": lambda value, threshold: value < threshold,
+    "<=": lambda value, threshold: value <= threshold,
+}
+
+def alert_metric_value(metric: str, snapshot: Dict, history_values: Dict[str, float]) -> Optional[float]:
+    """Current value of an alert metric: a history metric, "disk <mountpoint>"
+    or "<snapshot key>.<field>"; None when the snapshot has no value for it"""
+    if metric in history_values:
+        value = history_values[metric]
+        return None if math.isnan(value) else value
+    if metric.startswith("disk "):
+        mountpoint = metric[5:].strip()
+        disk = next((d for d in snapshot.get("disk") or [] if d.mountpoint == mountpoint), None)
+        if disk is None and mountpoint == "/" and snapshot.get("main_disk") is not None:
+            # In a container the overlay root is filtered out of the partitions
+            return snapshot["main_disk"].percent
+        return disk.percent if disk is not None and not disk.timed_out else None
+    key, _, field = metric.partition(".")
+    value = getattr(snapshot.get(key), field, None) if field else None
+    return float(value) if isinstance(value, (int, float)) else None
+
+class AlertRule:
+    """A parsed alert rule and its evaluation state.
+    
+    The state is constant-size: the condition must hold continuously for
+    duration seconds (tracked as the time it started to hold) before the
+    alert fires, and a firing alert resolves only once the value is back
+    past the clear threshold, so a value hovering at the threshold does not
+    flap. Each transition to firing or resolved is reported exactly once.
+    """
+    
+    def __init__(self, rule: str, name: Optional[str] = None, severity: str = "warning"):
+        self.rule = rule.strip()
+        self.name = name or self.rule
+        self.severity = severity
+        self.peer: Optional[str] = None
+        self.metric: Optional[str] = None
+        
+        peer_match = PEER_RULE.match(self.rule)
+        threshold_match = THRESHOLD_RULE.match(self.rule) if peer_match is None else None
+        if peer_match is not None:
+            self.peer = peer_match["peer"]
+            duration = peer_match["duration"]
+        elif threshold_match is not None:
+            self.metric = threshold_match["metric"].strip()
+            self.operator = threshold_match["op"]
+            self.threshold = float(threshold_match["threshold"])
+            if threshold_match["clear"] is not None:
+                self.clear = float(threshold_match["clear"])
+            else:
+                margin = abs(self.threshold) * ALERT_HYSTERESIS
+                self.clear = self.threshold - margin if self.operator.startswith(">") else self.threshold + margin
+            duration = threshold_match["duration"]
+        else:
+            raise ValueError(f"Invalid alert rule: {rule!r}")
+        self.duration = parse_duration(duration) if duration else 0.0
+        
+        self.state = "inactive"
+        self.value: Optional[float] = None
+        self.pending_since: Optional[float] = None
+        self.firing_since: Optional[float] = None
+    
+    def condition(self, snapshot: Dict, history_values: Dict[str, float]) -> Optional[bool]:
+        """Whether the rule's condition holds, or None when it can't be evaluated"""
+        if self.peer is not None:
+            peer = next((p for p in federation.peers if self.peer in (p.role, p.name)), None)
+            if peer is None or (not peer.online and peer.failures == 0):
+                # Not configured, or not polled yet
+                return None
+            self.value = 0.0 if peer.online else 1.0
+            return not peer.online
+        
+        self.value = alert_metric_value(self.metric, snapshot, history_values)
+        if self.value is None:
+            return None
+        if self.state == "firing":
+            # Hysteresis: stay firing until the value is back past the clear threshold
+            return ALERT_OPERATORS[self.operator](self.value, self.clear)
+        return ALERT_OPERATORS[self.operator](self.value, self.threshold)
+    
+    def evaluate(self, snapshot: Dict, history_values: Dict[str, float], now: float) -> Optional[str]:
+        """Advance the state machine; "firing" or "resolved" on a transition"""
+        holds = self.condition(snapshot, history_values)
+        if holds is None:
+            return None
+        if not holds:
+            self.pending_since = None
+            if self.state == "firing":
+                self.state, self.firing_since = "inactive", None
+                return "resolved"
+            self.state = "inactive"
+            return None
+        if self.state == "firing":
+            return None
+        if self.pending_since is None:
+            self.pending_since = now
+        if now - self.pending_since >= self.duration:
+            self.state, self.firing_since = "firing", now
+            return "firing"
+        self.state = "pending"
+        return None
+    
+    def report(self) -> Dict:
+        return {
+            "name": self.name,
+            "rule": self.rule,
+            "severity": self.severity,
+            "state": self.state,
+            "value": None if self.value is None else round(self.value, 2),
+            "pending_since": datetime.fromtimestamp(self.pending_since).isoformat() if self.pending_since else None,
+            "firing_since": datetime.fromtimestamp(self.firing_since).isoformat() if self.firing_since else None
+        }
+
+def parse_alert_rules(config: str) -> List[AlertRule]:
+    """Rules from the ALERT_RULES JSON list, or DEFAULT_ALERT_RULES when unset"""
+    try:
+        entries = json.loads(config) if config.strip() else DEFAULT_ALERT_RULES
+        return [AlertRule(entry) if isinstance(entry, str) else AlertRule(**entry) for entry in entries]
+    except (TypeError, ValueError) as e:
+        logger.error(f"Invalid ALERT_RULES, alerting disabled: {str(e)}")
+        return []
+
+class WebhookNotifier:
+    """Delivers alert notifications to every webhook in the background.
+    
+    Notifications are queued by the sampler listener, so evaluation never
+    waits on the network, and POSTed as JSON through one pooled httpx
+    client. A failed attempt (connection error, timeout or non-2xx answer)
+    is retried with exponential backoff up to attempts times. When the
+    queue is full the oldest notification is dropped.
+    """
+    
+    def __init__(self, urls: List[str], timeout: float, attempts: int, queue_size: int = 1000):
+        self.urls = urls
+        self.timeout = timeout
+        self.attempts = max(1, attempts)
+        self.queue_size = queue_size
+        self.counts = {"sent": 0, "retried": 0, "failed": 0, "dropped": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._client = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is not None or not self.urls:
+            return
+        if httpx is None:
+            logger.error("ALERT_WEBHOOKS is set but httpx is not installed; alerts are not delivered")
+            return
+        self._queue = asyncio.Queue(self.queue_size)
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=len(self.urls) * 2, max_keepalive_connections=len(self.urls))
+        )
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    def notify(self, payload: Dict):
+        if self._queue is None:
+            return
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.counts["dropped"] += 1
+        self._queue.put_nowait(payload)
+    
+    async def _deliver(self, url: str, body: bytes):
+        for attempt in range(self.attempts):
+            try:
+                response = await self._client.post(url, content=body, headers={"Content-Type": "application/json"})
+                response.raise_for_status()
+                self.counts["sent"] += 1
+                return
+            except Exception as e:
+                if attempt + 1 == self.attempts:
+                    self.counts["failed"] += 1
+                    logger.warning(f"Error delivering alert to {url}: {str(e) or type(e).__name__}")
+                    return
+                self.counts["retried"] += 1
+                await asyncio.sleep(0.5 * 2 ** attempt)
+    
+    async def _run(self):
+        while True:
+            payload = await self._queue.get()
+            body = encode_json(payload)
+            await asyncio.gather(*(self._deliver(url, body) for url in self.urls))
+
+class AlertEngine:
+    """Evaluates every alert rule on each sampler snapshot.
+    
+    Rules are evaluated on the event loop right after the sample is
+    published, at O(1) cost and state per rule. Only transitions reach the
+    notifier, so an alert that keeps firing is announced once, and once
+    more when it resolves.
+    """
+    
+    def __init__(self, rules: List[AlertRule], notifier: WebhookNotifier):
+        self.rules = rules
+        self.notifier = notifier
+        self.history = deque(maxlen=ALERT_HISTORY_LIMIT)
+        self.hostname = socket.gethostname()
+    
+    def evaluate(self, snapshot: Dict):
+        """Sampler listener"""
+        if not self.rules:
+            return
+        history_values = history_recorder.extract(snapshot)
+        now = time.time()
+        for rule in self.rules:
+            transition = rule.evaluate(snapshot, history_values, now)
+            if transition is None:
+                continue
+            event = {
+                "host": self.hostname,
+                "name": rule.name,
+                "rule": rule.rule,
+                "severity": rule.severity,
+                "state": transition,
+                "value": None if rule.value is None else round(rule.value, 2),
+                "at": datetime.fromtimestamp(now).isoformat()
+            }
+            self.history.append(event)
+            if transition == "firing":
+                logger.warning(f"Alert firing: {rule.name} (value {event['value']})")
+            else:
+                logger.info(f"Alert resolved: {rule.name}")
+            self.notifier.notify(event)
+    
+    def report(self) -> Dict:
+        return {
+            "alerts": [rule.report() for rule in self.rules],
+            "history": list(reversed(self.history)),
+            "notifications": dict(self.notifier.counts, webhooks=len(self.notifier.urls))
+        }
+
+alert_notifier = WebhookNotifier(ALERT_WEBHOOKS, ALERT_WEBHOOK_TIMEOUT, ALERT_WEBHOOK_ATTEMPTS)
+alert_engine = AlertEngine(parse_alert_rules(ALERT_RULES), alert_notifier)
+sampler.add_listener(alert_engine.evaluate, collector_only=True)
+
+@app.get("/alerts", tags=["General"])
+async def get_alerts(state: Optional[str] = Query(None, description="inactive, pending or firing")):
+    """Get every alert rule with its state, plus recent firing and resolved events"""
+    report = collector_report("alerts", alert_engine.report)
+    if state is None:
+        return report
+    return dict(report, alerts=[alert for alert in report["alerts"] if alert["state"] == state])
+
+# Shared snapshot
+SHARED_REPORTS = {
+    "alerts": lambda: alert_engine.report(),
+    "peers": lambda: federation.report(),
+    "servers": federation_servers,
+    "storage": lambda: storage_scanner.report()
+}
+
+SHARED_MAGIC = b"SYSMON02"
+# magic, sequence (odd while the collector is writing), sampled_at,
+# payload length, CRC-32 of everything after the header, snapshot id
+SHARED_HEADER = struct.Struct("<8sQdII32s")
+SHARED_SEQUENCE = struct.Struct("<Q")
+SHARED_SEQUENCE_OFFSET = 8
+# The snapshot's history values in HISTORY_METRICS order, NaN when missing
+SHARED_HISTORY = struct.Struct(f"<{len(HISTORY_METRICS)}d")
+# key, offset and length of its JSON fragment
+SHARED_SLOT = struct.Struct("<24sII")
+# Slot order: snapshot keys, then the reports of collector-only state
+SHARED_KEYS = list(SNAPSHOT_COLLECTORS) + ["web_server", "top_processes"] + [f"report:{name}" for name in SHARED_REPORTS]
+SHARED_SLOTS_OFFSET = SHARED_HEADER.size + SHARED_HISTORY.size
+SHARED_PAYLOAD_OFFSET = SHARED_SLOTS_OFFSET + SHARED_SLOT.size * len(SHARED_KEYS)
+# Models rebuilt from a fragment when a reader needs the objects rather
+# than the JSON; the other keys are plain JSON
+SHARED_MODELS = {
+    key: TypeAdapter(Optional[model]) for key, model in {
+        "system": SystemInfo,
+        "cpu": CPUInfo,
+        "cpu_breakdown": CPUBreakdownInfo,
+        "memory": MemoryInfo,
+        "disk": List[DiskInfo],
+        "main_disk": ServerDiskInfo,
+        "disk_io": List[DiskIOInfo],
+        "network": NetworkInfo,
+        "network_interfaces": List[NetworkInterfaceInfo],
+        "web_server": WebServerInfo
+    }.items()
+}
+# Seconds between a reader's checks of the sequence, and between its attempts
+# to take over collection
+SHARED_POLL_INTERVAL = 0.05
+SHARED_ELECTION_INTERVAL = 1.0
+# Seconds a reader waits at startup for the collector's first snapshot
+SHARED_STARTUP_TIMEOUT = 10.0
+# Torn reads retried before waiting for the next poll
+SHARED_READ_ATTEMPTS = 10
+
+def collector_report(name: str, report: Callable[[], Any]) -> Any:
+    """State only the collector keeps: live there, from the shared snapshot elsewhere"""
+    snapshot = sampler.snapshot
+    if sampler.collecting or snapshot is None or name not in (snapshot.get("shared") or {}):
+        return report()
+    return snapshot["shared"][name]
+
+def open_shared_memory(name: str, create: bool = False, size: int = 0) -> shared_memory.SharedMemory:
+    """Attach to (or create) a segment that outlives this process.
+    
+    Before Python 3.13 every attaching process registers the segment with
+    its resource tracker, which unlinks it on exit from under the other
+    workers.
+    """
     try:
-        # Get all system info
-        system_info = await get_system_info()
-        cpu_info = await get_cpu_info()
-        memory_info = await get_memory_info()
-        disk_info = await get_disk_info()
-        network_info = await get_network_info()
-        top_processes = await get_processes(limit=5)
-        
-        # Convert uptime in system_info if it exists
-        if hasattr(system_info, 'uptime') and system_info.uptime:
-            system_info.uptime = parse_uptime_to_korean(system_info.uptime)
+        return shared_memory.SharedMemory(name, create=create, size=size, track=False)
+    except TypeError:
+        segment = shared_memory.SharedMemory(name, create=create, size=size)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+class SharedSnapshotView(dict):
+    """A snapshot read from the shared segment.
+    
+    Responses are served from the JSON fragments as they are. A value is
+    decoded from its fragment only the first time something needs the
+    object, such as the Prometheus renderer or a process filter, and only
+    in the worker that needs it.
+    """
+    
+    def __missing__(self, key: str):
+        fragment = self["encoded"].get(key)
+        if fragment is None:
+            raise KeyError(key)
+        adapter = SHARED_MODELS.get(key)
+        try:
+            value = adapter.validate_json(fragment) if adapter is not None else json.loads(fragment)
+        except ValueError as e:
+            logger.error(f"Error decoding shared {key}: {str(e)}")
+            value = None
+        self[key] = value
+        return value
+    
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+class SharedSnapshot:
+    """One collector process sampling for every worker through shared memory.
+    
+    Workers elect the collector with an exclusive lock on a file. The lock
+    dies with its holder, so another worker takes over within
+    SHARED_ELECTION_INTERVAL when the collector goes away. The collector
+    writes each snapshot into a fixed layout: a header, the history values
+    as doubles, one slot per key, then the JSON fragments the slots point
+    at. A seqlock guards it: the sequence is odd while a write is in
+    progress, and a reader retries when the sequence moved under it or the
+    checksum doesn't match. Readers copy the fragments out only when the
+    sequence changed and serve them as response bodies, so the host pays
+    for one collection pass and one serialization per interval however
+    many workers serve requests.
+    """
+    
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.role = "starting"
+        # Last sequence written or read
+        self.sequence = 0
+        self.writes = 0
+        self.skipped = 0
+        self.reads = 0
+        self.torn_reads = 0
+        self.oversized = 0
+        self._segment: Optional[shared_memory.SharedMemory] = None
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+        self._lock_fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Future] = None
+        self._ready = asyncio.Event()
+    
+    def _elect(self) -> bool:
+        """Take the collector lock if nobody holds it"""
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    
+    def _attach(self) -> Optional[shared_memory.SharedMemory]:
+        try:
+            return open_shared_memory(self.name)
+        except FileNotFoundError:
+            # The collector hasn't created it yet
+            return None
+    
+    def _promote(self):
+        """Become the collector, reusing the segment a previous one left"""
+        if self._segment is None:
+            try:
+                self._segment = open_shared_memory(self.name, create=True, size=self.size)
+            except FileExistsError:
+                self._segment = open_shared_memory(self.name)
+        self.sequence = SHARED_SEQUENCE.unpack_from(self._segment.buf, SHARED_SEQUENCE_OFFSET)[0]
+        self.role = "collector"
+        sampler.collecting = True
+        start_collection()
+        logger.info(f"Worker {os.getpid()} collects for shared snapshot {self.name}")
+    
+    async def start(self):
+        if self._elect():
+            self._promote()
+            return
+        
+        self.role = "reader"
+        sampler.collecting = False
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), SHARED_STARTUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"No snapshot in {self.name} after {SHARED_STARTUP_TIMEOUT}s, sampling locally until one arrives")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.role == "collector":
+            await stop_collection()
+        if self._writing is not None:
+            await self._writing
+            self._writing = None
+        if self._lock_fd is not None:
+            # Closing releases the lock for the next collector
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        if self._segment is not None:
+            # Never unlinked: the other workers keep using it
+            self._segment.close()
+            self._segment = None
+    
+    async def _run(self):
+        next_election = time.monotonic() + SHARED_ELECTION_INTERVAL
+        while True:
+            try:
+                if self._segment is None:
+                    self._segment = self._attach()
+                if self._segment is not None and self.changed():
+                    snapshot = await asyncio.to_thread(self.read)
+                    if snapshot is not None:
+                        sampler.install(snapshot)
+                        self._ready.set()
+            except Exception as e:
+                logger.error(f"Error reading shared snapshot {self.name}: {str(e)}")
+            
+            if time.monotonic() >= next_election:
+                next_election = time.monotonic() + SHARED_ELECTION_INTERVAL
+                if self._elect():
+                    self._task = None
+                    self._promote()
+                    return
+            await asyncio.sleep(SHARED_POLL_INTERVAL)
+    
+    def changed(self) -> bool:
+        return SHARED_SEQUENCE.unpack_from(self._segment.buf, SHARED_SEQUENCE_OFFSET)[0] != self.sequence
+    
+    def write(self, snapshot: Dict):
+        """Sampler listener of the collector; serializing happens in a worker thread"""
+        if self._segment is None:
+            return
+        if self._writing is not None and not self._writing.done():
+            # Still writing the previous snapshot; readers skip this one
+            self.skipped += 1
+            return
+        # Live collector state is read on the event loop, where it changes
+        reports = {name: report() for name, report in SHARED_REPORTS.items()}
+        history = history_recorder.extract(snapshot)
+        self._writing = asyncio.ensure_future(asyncio.to_thread(self._write, snapshot, history, reports))
+    
+    def _write(self, snapshot: Dict, history: Dict[str, float], reports: Dict[str, Any]):
+        try:
+            fragments = [
+                encode_json(reports[key[len("report:"):]]) if key.startswith("report:") else encode_snapshot_value(snapshot, key)
+                for key in SHARED_KEYS
+            ]
+            end = SHARED_PAYLOAD_OFFSET + sum(len(fragment) for fragment in fragments)
+            buf = self._segment.buf
+            if end > len(buf):
+                self.oversized += 1
+                if self.oversized == 1:
+                    logger.error(f"Snapshot of {end} bytes does not fit shared snapshot {self.name} ({len(buf)} bytes), raise SHARED_SNAPSHOT_SIZE")
+                return
+            
+            sequence = (self.sequence + 1) | 1
+            SHARED_SEQUENCE.pack_into(buf, SHARED_SEQUENCE_OFFSET, sequence)
+            SHARED_HISTORY.pack_into(buf, SHARED_HEADER.size, *(history.get(name, math.nan) for name in HISTORY_METRICS))
+            offset = SHARED_PAYLOAD_OFFSET
+            for index, (key, fragment) in enumerate(zip(SHARED_KEYS, fragments)):
+                SHARED_SLOT.pack_into(buf, SHARED_SLOTS_OFFSET + index * SHARED_SLOT.size, key.encode(), offset, len(fragment))
+                buf[offset:offset + len(fragment)] = fragment
+                offset += len(fragment)
+            checksum = zlib.crc32(buf[SHARED_HEADER.size:end])
+            SHARED_HEADER.pack_into(
+                buf, 0, SHARED_MAGIC, sequence, snapshot["sampled_at"], end - SHARED_PAYLOAD_OFFSET, checksum, snapshot["id"].encode()
+            )
+            SHARED_SEQUENCE.pack_into(buf, SHARED_SEQUENCE_OFFSET, sequence + 1)
+            self.sequence = sequence + 1
+            self.writes += 1
+        except Exception as e:
+            logger.error(f"Error writing shared snapshot {self.name}: {str(e)}")
+    
+    def read(self) -> Optional[SharedSnapshotView]:
+        """The collector's latest snapshot, or None when there's no new one"""
+        buf = self._segment.buf
+        for attempt in range(SHARED_READ_ATTEMPTS):
+            sequence = SHARED_SEQUENCE.unpack_from(buf, SHARED_SEQUENCE_OFFSET)[0]
+            if sequence == self.sequence:
+                return None
+            snapshot = self._copy(buf) if sequence % 2 == 0 else None
+            if snapshot is not None and SHARED_SEQUENCE.unpack_from(buf, SHARED_SEQUENCE_OFFSET)[0] == sequence:
+                # Only parsed once the copy is known to be whole
+                snapshot["shared"] = {name: json.loads(fragment) for name, fragment in snapshot["shared"].items()}
+                self.sequence = sequence
+                self.reads += 1
+                return snapshot
+            self.torn_reads += 1
+            time.sleep(0.001 * (attempt + 1))
+        return None
+    
+    def _copy(self, buf: memoryview) -> Optional[SharedSnapshotView]:
+        """Header fields and fragments of the segment, or None when they don't check out"""
+        magic, _, sampled_at, length, checksum, snapshot_id = SHARED_HEADER.unpack_from(buf)
+        end = SHARED_PAYLOAD_OFFSET + length
+        if magic != SHARED_MAGIC or end > len(buf) or zlib.crc32(buf[SHARED_HEADER.size:end]) != checksum:
+            return None
+        
+        history = SHARED_HISTORY.unpack_from(buf, SHARED_HEADER.size)
+        encoded = {}
+        reports = {}
+        for index, key in enumerate(SHARED_KEYS):
+            name, offset, size = SHARED_SLOT.unpack_from(buf, SHARED_SLOTS_OFFSET + index * SHARED_SLOT.size)
+            if name.rstrip(b"\0") != key.encode() or offset + size > end:
+                # Torn, or written by a build with another key set
+                return None
+            fragment = bytes(buf[offset:offset + size])
+            if key.startswith("report:"):
+                reports[key[len("report:"):]] = fragment
+            else:
+                encoded[key] = fragment
         
+        return SharedSnapshotView(
+            id=snapshot_id.rstrip(b"\0").decode(errors="replace"),
+            sampled_at=sampled_at,
+            history={name: value for name, value in zip(HISTORY_METRICS, history) if not math.isnan(value)},
+            shared=reports,
+            encoded=encoded,
+            bodies={}
+        )
+    
+    def report(self) -> Dict:
         return {
-            "system": system_info,
-            "cpu": cpu_info,
-            "memory": memory_info,
-            "disk": disk_info,
-            "network": network_info,
-            "top_processes": top_processes
+            "name": self.name,
+            "role": self.role,
+            "pid": os.getpid(),
+            "sequence": self.sequence,
+            "writes": self.writes,
+            "skipped": self.skipped,
+            "reads": self.reads,
+            "torn_reads": self.torn_reads,
+            "oversized": self.oversized
         }
-    except Exception as e:
-        logger.error(f"Error getting all stats: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+
+shared_snapshot = SharedSnapshot(SHARED_SNAPSHOT, SHARED_SNAPSHOT_SIZE) if SHARED_SNAPSHOT else None
+if shared_snapshot is not None:
+    # After every other listener, so the shared reports include this sample
+    sampler.add_listener(shared_snapshot.write, collector_only=True)
 
 if __name__ == "__main__":
     import uvicorn